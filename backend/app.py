@@ -1,13 +1,44 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, send_file, url_for, g
 from flask_cors import CORS
 import os
 import io
 import base64
-from PIL import Image
+import json
+from functools import wraps
+from PIL import Image, ImageOps, UnidentifiedImageError
 from dotenv import load_dotenv
 from datetime import datetime
+import time
 import uuid
 
+# Before the model imports - they read their settings at import time
+load_dotenv()
+
+from models.bounded_cache import all_cache_stats, image_content_hash
+from models.shared_cache import shared_cache
+from models.job_queue import job_queue, JobQueueFull, FINAL_STATES
+from models.progress import ProgressReporter, stream_events
+from models.image_decode import decode_scaled
+from models.image_handles import ingest_image, load_image, get_image_info
+from models.blob_store import upload_store, result_store, extension_for, mimetype_for_blob
+from models.http_caching import make_etag, CACHE_IMMUTABLE, CACHE_REVALIDATE
+from models.metrics import (
+    REGISTRY, CONTENT_TYPE, HTTP_REQUESTS, HTTP_DURATION, HTTP_IN_FLIGHT, HTTP_THREADS, DECODE_SECONDS,
+    INPUT_MEGAPIXELS, CACHE_LOOKUPS, JOBS_ACTIVE, JOB_WORKERS, JOBS_TOTAL
+)
+from models.memory_accounting import MemoryUsage
+from models.request_profiler import profiling_allowed, run_profiled, load_profile, load_pstats
+from models.stack_sampler import stack_sampler, start_sampler, collapsed, speedscope
+from models.tracing import (
+    start_trace, end_trace, current_trace, trace_context_from_headers, load_chrome_trace, span, log, WARNING, ERROR
+)
+from models.image_encoding import (
+    resolve_encoder, encode_image, mimetype_for, negotiate_response, metadata_header, multipart_parts
+)
+from models.result_cache import (
+    result_cache, make_result_key, pack_result, unpack_result, ENGINE_VERSION
+)
+
 # Import ULTRA-FAST AI modules
 try:
     from models.ultra_fast_super_resolution import enhance_super_resolution
@@ -18,6 +49,7 @@ try:
     from models.gemini_chat import chat_with_gemini
     from models.openai_chatbot import chat_with_ai
     from models.auto_image_analyzer import analyze_image_auto
+    from models.intensity_scrub import start_scrub_session, get_scrub_session
     try:
         from models.wikipedia_integration import get_wikipedia_info
     except:
@@ -36,8 +68,6 @@ except Exception as e:
     import traceback
     traceback.print_exc()
 
-load_dotenv()
-
 app = Flask(__name__)
 CORS(app)
 
@@ -49,6 +79,103 @@ PROCESSED_FOLDER = 'processed'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PROCESSED_FOLDER, exist_ok=True)
 
+# Artifact detection only needs aspect ratio and colour statistics
+AUTO_ANALYZE_EDGE = int(os.getenv('AUTO_ANALYZE_EDGE', 1024))
+
+# Gallery cards and comparison strips
+THUMBNAIL_EDGE = int(os.getenv('THUMBNAIL_EDGE', 320))
+
+ANALYSIS_OUTPUTS = ('edge_detection', 'heat_map', 'detail_enhancement', 'luminance_analysis', 'texture_map')
+
+# What PIL raises for corrupt, truncated or unsupported image data
+IMAGE_DECODE_ERRORS = (OSError, SyntaxError, ValueError, Image.DecompressionBombError)
+
+# Request threads per worker (gunicorn --threads), for the saturation ratio
+WEB_THREADS = int(os.getenv('WEB_THREADS', 8))
+
+# Known label values - anything else is reported as 'other'
+PROCESS_TYPES = ('super-resolution', 'restoration')
+PROCESSING_MODES = ('auto', 'fast', 'balanced', 'quality', 'ultra')
+
+@app.before_request
+def start_request_trace():
+    trace_id, forced = trace_context_from_headers(request.headers, request.args)
+    # Forced traces are stored whatever the sample rate - admins only
+    forced = forced and profiling_allowed(request.headers, app.debug)
+    g.trace = start_trace(request.endpoint or 'unmatched', trace_id, True if forced else None)
+
+@app.after_request
+def add_trace_headers(response):
+    trace = g.get('trace')
+    if trace is not None:
+        response.headers['Server-Timing'] = trace.server_timing()
+        response.headers['X-Trace-Id'] = trace.trace_id
+        response.headers['Timing-Allow-Origin'] = '*'
+        exposed = response.headers.get('Access-Control-Expose-Headers')
+        response.headers['Access-Control-Expose-Headers'] = ', '.join(
+            filter(None, [exposed, 'Server-Timing', 'X-Trace-Id'])
+        )
+    return response
+
+@app.teardown_request
+def finish_request_trace(error=None):
+    trace = g.get('trace')
+    if trace is not None:
+        end_trace(trace)
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    HTTP_IN_FLIGHT.inc()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or 'unmatched'
+    HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    
+    labels = {}
+    if endpoint in ('process_image', 'submit_job'):
+        process_type = request.form.get('process_type', 'super-resolution')
+        mode = request.form.get('mode', 'auto')
+        labels = {
+            'process_type': process_type if process_type in PROCESS_TYPES else 'other',
+            'mode': mode if mode in PROCESSING_MODES else 'other'
+        }
+    started = g.get('request_started')
+    if started is not None:
+        HTTP_DURATION.observe(time.perf_counter() - started, endpoint=endpoint, **labels)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    # Streamed responses (SSE) count as in flight until the stream closes
+    HTTP_IN_FLIGHT.dec()
+
+def collect_service_metrics():
+    """Copy cache and job statistics of this worker into metrics"""
+    HTTP_THREADS.set(WEB_THREADS)
+    
+    results = result_cache.stats()
+    for outcome in ('memory_hits', 'shared_hits', 'coalesced', 'misses'):
+        CACHE_LOOKUPS.set_total(results[outcome], cache='results', result=outcome)
+    shared = dict(shared_cache.stats_counters)
+    for outcome in ('hits', 'misses'):
+        CACHE_LOOKUPS.set_total(shared[outcome], cache='shared', result=outcome)
+    for name, stats in all_cache_stats().items():
+        for outcome in ('hits', 'misses'):
+            CACHE_LOOKUPS.set_total(stats[outcome], cache=name, result=outcome)
+    
+    jobs = job_queue.stats()
+    JOBS_ACTIVE.set(jobs['active'])
+    JOB_WORKERS.set(jobs['workers'])
+    for status in ('submitted', 'rejected', 'done', 'failed', 'cancelled'):
+        JOBS_TOTAL.set_total(jobs[status], status=status)
+
+REGISTRY.add_collector(collect_service_metrics)
+
+# Always-on stack sampling (pool processes forked from this worker sample themselves)
+start_sampler()
+
 @app.route('/')
 def home():
     return jsonify({
@@ -66,104 +193,879 @@ def health_check():
         'ai_status': 'ready' if AI_MODELS_LOADED else 'basic'
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics of every worker and job process on this host"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+def profile_requested():
+    """profile=1 in the query string or form, X-Profile: 1, or {"profile": true} in JSON"""
+    if request.headers.get('X-Profile') == '1' or request.values.get('profile') == '1':
+        return True
+    data = request.get_json(silent=True)
+    return isinstance(data, dict) and data.get('profile') is True
+
+def memory_requested():
+    """memory=1 in the query string or form, or X-Memory: 1"""
+    return request.headers.get('X-Memory') == '1' or request.values.get('memory') == '1'
+
+def profiled(view):
+    """
+    Run the view under the request profiler when asked to (admin / debug
+    only - see models/request_profiler.py). The report is added to JSON
+    responses as 'profile'; every response gets X-Profile-Id.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not profile_requested():
+            return view(*args, **kwargs)
+        if not profiling_allowed(request.headers, app.debug):
+            return jsonify({'error': 'Profiling requires an admin token or a debug build'}), 403
+        
+        g.profiling = True
+        result, report = run_profiled(lambda: app.make_response(view(*args, **kwargs)))
+        response = result
+        response.headers['X-Profile-Id'] = report['id']
+        exposed = response.headers.get('Access-Control-Expose-Headers')
+        response.headers['Access-Control-Expose-Headers'] = ', '.join(filter(None, [exposed, 'X-Profile-Id']))
+        if response.is_json and not response.is_streamed:
+            data = response.get_json()
+            if isinstance(data, dict):
+                data['profile'] = report
+                response.set_data(json.dumps(data))
+        return response
+    return wrapper
+
+@app.route('/api/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """A stored request profile (?format=pstats for the raw data, for snakeviz)"""
+    if not profiling_allowed(request.headers, app.debug):
+        return jsonify({'error': 'Profiling requires an admin token or a debug build'}), 403
+    
+    if request.args.get('format') == 'pstats':
+        data = load_pstats(profile_id)
+        if data is None:
+            return jsonify({'error': 'Unknown or expired profile'}), 404
+        response = Response(data, mimetype='application/octet-stream')
+        response.headers['Content-Disposition'] = f'attachment; filename=profile-{profile_id}.pstats'
+        return response
+    
+    report = load_profile(profile_id)
+    if report is None:
+        return jsonify({'error': 'Unknown or expired profile'}), 404
+    return jsonify(report)
+
+@app.route('/api/debug/flamegraph', methods=['GET'])
+def flamegraph():
+    """
+    Sampled stacks of every worker and pool process on this host
+    
+    ?format=collapsed (default, for flamegraph.pl / speedscope / inferno),
+    speedscope (JSON for speedscope.app) or stats (sampler overhead per
+    process). ?idle=1 includes threads that were waiting for work.
+    """
+    if not profiling_allowed(request.headers, app.debug):
+        return jsonify({'error': 'Profiling requires an admin token or a debug build'}), 403
+    
+    output_format = request.args.get('format', 'collapsed')
+    if output_format not in ('collapsed', 'speedscope', 'stats'):
+        return jsonify({'error': f"Unknown format '{output_format}'"}), 400
+    
+    stacks, processes = stack_sampler.merged(idle=request.args.get('idle') == '1')
+    if output_format == 'stats':
+        return jsonify({'processes': processes, 'stacks': len(stacks)})
+    if output_format == 'speedscope':
+        response = jsonify(speedscope(stacks))
+        response.headers['Content-Disposition'] = 'attachment; filename=flamegraph.speedscope.json'
+        return response
+    return Response(collapsed(stacks), mimetype='text/plain')
+
+@app.route('/api/traces/<trace_id>', methods=['GET'])
+def get_trace(trace_id):
+    """
+    A sampled request trace as Chrome trace-event JSON (chrome://tracing,
+    ui.perfetto.dev). Send `X-Trace: 1` or `?trace=1` to force sampling and
+    take the id from the X-Trace-Id response header. Both need an admin
+    token or a debug build (see profiling_allowed).
+    """
+    if not profiling_allowed(request.headers, app.debug):
+        return jsonify({'error': 'Traces require an admin token or a debug build'}), 403
+    trace = load_chrome_trace(trace_id)
+    if trace is None:
+        return jsonify({'error': 'Unknown, expired or unsampled trace'}), 404
+    response = jsonify(trace)
+    if request.args.get('download') == '1':
+        response.headers['Content-Disposition'] = f'attachment; filename=trace-{trace_id}.json'
+    return response
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss statistics for the result cache, the shared tier and every bounded model cache"""
+    return jsonify({
+        'results': result_cache.stats(),
+        'shared': shared_cache.stats(),
+        'caches': all_cache_stats(),
+        'blobs': {'uploads': upload_store.stats(), 'results': result_store.stats()}
+    })
+
+def upload_stream():
+    """
+    The request's encoded image as a stream, or None when none was sent
+    
+    Accepts a raw image/* (or application/octet-stream) body, a multipart
+    'image' file, or the legacy JSON {'image': <base64 data URL>}.
+    """
+    if request.mimetype.startswith('image/') or request.mimetype == 'application/octet-stream':
+        return request.stream
+    if 'image' in request.files:
+        return request.files['image'].stream
+    
+    data = request.get_json(silent=True) or {}
+    image_data = data.get('image')
+    if not image_data:
+        return None
+    return io.BytesIO(base64.b64decode(image_data.split(',')[1] if ',' in image_data else image_data))
+
+def open_uploaded_image(max_edge=None):
+    """
+    Decode the request's image once, straight from the upload stream
+    
+    max_edge: decode at reduced resolution (see models/image_decode.py)
+    Returns a loaded PIL Image, or None when no image was sent.
+    """
+    stream = upload_stream()
+    if stream is None:
+        return None
+    # Decodes now, while the request body is still readable
+    return decode_scaled(stream, max_edge)
+
+def request_image_handle():
+    """image_handle from the query string, form or JSON body"""
+    return request.values.get('image_handle') or (request.get_json(silent=True) or {}).get('image_handle')
+
+def request_input_image():
+    """
+    Full-size input of a processing request: an 'image' file upload or an
+    'image_handle' field from /api/images
+    
+    Returns:
+        (image, image_ref, error) - image_ref is what a pool process needs
+        to get the image again (the handle, or the encoded bytes); error
+        is a ready (response, status) tuple when there is no usable image
+    """
+    handle = request_image_handle()
+    if handle:
+        image = load_image(handle)
+        if image is None:
+            return None, None, (jsonify({'error': 'Unknown or expired image handle'}), 404)
+        INPUT_MEGAPIXELS.observe(image.width * image.height / 1e6, endpoint=request.endpoint)
+        return image, handle, None
+    
+    if 'image' not in request.files:
+        return None, None, (jsonify({'error': 'No image file provided'}), 400)
+    
+    file = request.files['image']
+    if file.filename == '':
+        return None, None, (jsonify({'error': 'No selected file'}), 400)
+    
+    image_bytes = file.read()
+    image = decode_rgb(image_bytes)
+    INPUT_MEGAPIXELS.observe(image.width * image.height / 1e6, endpoint=request.endpoint)
+    return image, image_bytes, None
+
+@app.route('/api/images', methods=['POST'])
+def ingest_image_endpoint():
+    """
+    Upload an image once and get a handle for every other endpoint
+    
+    Same body formats as /api/auto-analyze. Pass the returned handle as
+    image_handle (process-image, jobs, scrub, auto-analyze) or as
+    imageHandle / imageUrl in chat contexts.
+    """
+    try:
+        stream = upload_stream()
+        if stream is None:
+            return jsonify({'error': 'No image provided'}), 400
+        
+        handle, info, status = ingest_image(stream)
+        return jsonify({'status': status, **info}), 201 if status == 'created' else 200
+    except UnidentifiedImageError:
+        return jsonify({'error': 'Unsupported or corrupt image'}), 400
+    except Exception as e:
+        log(f"Ingest error: {e}", ERROR)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/images/<handle>', methods=['GET'])
+def image_info_endpoint(handle):
+    """Size, format and pyramid levels of a stored image"""
+    info = get_image_info(handle)
+    if info is None:
+        return jsonify({'error': 'Unknown or expired image handle'}), 404
+    return jsonify(info)
+
+@app.route('/api/blobs', methods=['POST'])
+def store_blob_endpoint():
+    """
+    Store an uploaded image file as-is and get its short URL
+    
+    Send a raw image/* body or a multipart 'image' file. The bytes are not
+    re-encoded, but they are verified first (400 if corrupt), and the blob
+    gets the type of its content, not the declared one (415 if that is not
+    a type blobs are served as). Identical uploads return the same URL.
+    """
+    if request.mimetype.startswith('image/'):
+        data, mimetype = request.get_data(), request.mimetype
+    elif 'image' in request.files:
+        file = request.files['image']
+        data, mimetype = file.read(), file.mimetype
+    else:
+        return jsonify({'error': 'No image provided'}), 400
+    
+    try:
+        extension_for(mimetype)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 415
+    if not data:
+        return jsonify({'error': 'Empty upload'}), 400
+    
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image_format = 'JPEG' if image.format == 'MPO' else image.format  # Camera JPEGs
+            image.verify()
+    except IMAGE_DECODE_ERRORS:
+        return jsonify({'error': 'Unsupported or corrupt image'}), 400
+    try:
+        extension = extension_for(Image.MIME.get(image_format))
+    except ValueError:
+        return jsonify({'error': f"Unsupported blob type '{image_format}'"}), 415
+    
+    blob_id = upload_store.put(data, extension)
+    return jsonify({'id': blob_id, 'url': blob_url(blob_id), 'size': len(data)}), 201
+
+def find_blob(blob_id):
+    """Path of a stored result or upload, or None"""
+    return result_store.path(blob_id) or upload_store.path(blob_id)
+
+def conditional_response(etag, build, cache_control=CACHE_IMMUTABLE):
+    """
+    304 when the client already holds this ETag, otherwise build() - on a
+    match nothing is decoded, processed or encoded. Error responses from
+    build() are returned without the ETag, so they are never cached.
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = app.make_response(build())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+@app.route('/blobs/<blob_id>', methods=['GET'])
+def get_blob(blob_id):
+    """
+    Serve a stored upload or result (sendfile; contents never change, so
+    the content hash is the ETag and clients may cache forever).
+    ?download=1 adds an attachment disposition.
+    """
+    path = find_blob(blob_id)
+    if path is None:
+        return jsonify({'error': 'Unknown or evicted blob'}), 404
+    
+    blob_hash, extension = os.path.splitext(blob_id)
+    download = request.args.get('download') == '1'
+    response = send_file(
+        os.path.abspath(path),
+        mimetype=mimetype_for_blob(blob_id),
+        as_attachment=download,
+        download_name=f"heri-science-{blob_hash[:12]}{extension}" if download else None,
+        etag=blob_hash,
+        conditional=True
+    )
+    response.headers['Cache-Control'] = CACHE_IMMUTABLE
+    return response
+
+@app.route('/blobs/<blob_id>/thumbnail', methods=['GET'])
+def get_blob_thumbnail(blob_id):
+    """JPEG thumbnail of a stored image (?edge=<px>, default THUMBNAIL_EDGE)"""
+    path = find_blob(blob_id)
+    if path is None:
+        return jsonify({'error': 'Unknown or evicted blob'}), 404
+    
+    try:
+        edge = int(request.args.get('edge', THUMBNAIL_EDGE))
+    except ValueError:
+        edge = 0
+    if not 16 <= edge <= 2048:
+        return jsonify({'error': 'edge must be between 16 and 2048'}), 400
+    
+    etag = make_etag(os.path.splitext(blob_id)[0], 'thumbnail', edge, ENGINE_VERSION)
+    
+    def compute_thumbnail():
+        with open(path, 'rb') as source:
+            thumbnail = decode_scaled(source, edge, 'RGB')
+        return pack_result({'format': 'jpeg'}, encode_image(thumbnail, 'jpeg', 'fast'))
+    
+    def build():
+        try:
+            record, _ = result_cache.get_or_compute(f'thumbnail:{etag}', compute_thumbnail)
+        except IMAGE_DECODE_ERRORS as e:
+            return jsonify({'error': f'Image could not be decoded: {e}'}), 422
+        return Response(unpack_result(record)[1], mimetype='image/jpeg')
+    
+    return conditional_response(etag, build)
+
+@app.route('/blobs/<blob_id>/analysis/<output>', methods=['GET'])
+def get_blob_analysis(blob_id, output):
+    """
+    One analysis output (edge_detection, heat_map, detail_enhancement,
+    luminance_analysis, texture_map) of a stored image as a JPEG
+    """
+    if output not in ANALYSIS_OUTPUTS:
+        return jsonify({'error': f"Unknown analysis output (use {', '.join(ANALYSIS_OUTPUTS)})"}), 404
+    if not AI_MODELS_LOADED:
+        return jsonify({'error': 'Analysis models not loaded'}), 503
+    path = find_blob(blob_id)
+    if path is None:
+        return jsonify({'error': 'Unknown or evicted blob'}), 404
+    
+    blob_hash = os.path.splitext(blob_id)[0]
+    etag = make_etag(blob_hash, 'analysis', output, ENGINE_VERSION)
+    
+    def compute_outputs():
+        # All five come from one decode, so they are cached together
+        with open(path, 'rb') as source:
+            outputs = generate_all_analysis_outputs(source.read())
+        missing = [name for name in ANALYSIS_OUTPUTS if name not in outputs]
+        if missing:
+            raise ValueError(f"Analysis failed ({', '.join(missing)})")
+        
+        offsets, chunks, offset = {}, [], 0
+        for name, data_url in outputs.items():
+            chunk = base64.b64decode(data_url.split(',', 1)[1])
+            offsets[name] = (offset, len(chunk))
+            chunks.append(chunk)
+            offset += len(chunk)
+        return pack_result({'outputs': offsets}, b''.join(chunks))
+    
+    def build():
+        key = f"analysis:{make_etag(blob_hash, 'analysis', ENGINE_VERSION)}"
+        try:
+            record, _ = result_cache.get_or_compute(key, compute_outputs)
+        except IMAGE_DECODE_ERRORS as e:
+            return jsonify({'error': f'Image could not be analyzed: {e}'}), 422
+        header, data = unpack_result(record)
+        offset, length = header['outputs'][output]
+        return Response(data[offset:offset + length], mimetype='image/jpeg')
+    
+    return conditional_response(etag, build)
+
 @app.route('/api/auto-analyze', methods=['POST'])
 def auto_analyze_image():
     """
     Automatically analyze uploaded image and provide Wikipedia info
+    
+    Send the image as a raw image/* body, a multipart 'image' file,
+    (legacy) a base64 data URL in JSON - see upload_stream() - or an
+    image_handle from /api/images.
     """
     try:
-        data = request.json
-        image_data = data.get('image')
+        handle = request_image_handle()
+        if handle:
+            image = load_image(handle, AUTO_ANALYZE_EDGE)
+            if image is None:
+                return jsonify({'error': 'Unknown or expired image handle'}), 404
+        else:
+            image = open_uploaded_image(AUTO_ANALYZE_EDGE)
         
-        if not image_data:
+        if image is None:
             return jsonify({'error': 'No image provided'}), 400
+        width, height = image.info['source_size']
+        INPUT_MEGAPIXELS.observe(width * height / 1e6, endpoint=request.endpoint)
         
-        # Decode base64 image
-        image_bytes = base64.b64decode(image_data.split(',')[1] if ',' in image_data else image_data)
-        
-        # Auto-analyze image
-        analysis = analyze_image_auto(image_bytes)
+        # Auto-analyze image (one decoded image shared by analyzer and detector)
+        analysis = analyze_image_auto(image)
         
         return jsonify({
             'success': True,
             'analysis': analysis
         })
+    except UnidentifiedImageError:
+        return jsonify({'error': 'Unsupported or corrupt image'}), 400
     except Exception as e:
-        print(f"Auto-analysis error: {e}")
+        log(f"Auto-analysis error: {e}", ERROR)
         return jsonify({'error': str(e)}), 500
 
+def run_processing(image, process_type, intensity, mode, progress=None):
+    """Run the SR / restoration pipeline -> (processed_image, metadata, message)"""
+    with span(process_type, 'pipeline', mode=mode, intensity=intensity):
+        return _run_pipeline(image, process_type, intensity, mode, progress)
+
+def _run_pipeline(image, process_type, intensity, mode, progress):
+    if process_type == 'super-resolution':
+        if AI_MODELS_LOADED:
+            processed_image, metadata = enhance_super_resolution(image, intensity, mode, progress=progress)
+            mode_name = metadata.get('processing_mode', 'AUTO')
+            time_str = metadata.get('processing_time', '?')
+            message = f'✨ Super-Resolution Complete! Mode: {mode_name} | Time: {time_str}'
+        else:
+            new_size = (image.width * 2, image.height * 2)
+            processed_image = image.resize(new_size, Image.Resampling.LANCZOS)
+            metadata = {'technique': 'Lanczos upscaling', 'processing_mode': 'FAST', 'processing_time': '0.5s'}
+            message = 'Image enhanced with super-resolution'
+    else:
+        if AI_MODELS_LOADED:
+            processed_image, metadata = restore_artifact_image(image, intensity, mode, progress=progress)
+            mode_name = metadata.get('processing_mode', 'AUTO')
+            time_str = metadata.get('processing_time', '?')
+            message = f'🔧 Restoration Complete! Mode: {mode_name} | Time: {time_str}'
+        else:
+            from PIL import ImageEnhance
+            enhancer = ImageEnhance.Sharpness(image)
+            processed_image = enhancer.enhance(2.0)
+            metadata = {'technique': 'Basic enhancement', 'processing_mode': 'FAST', 'processing_time': '0.3s'}
+            message = 'Image restored successfully'
+    
+    return processed_image, metadata, message
+
+def decode_rgb(image_bytes):
+    """Decode an uploaded image, apply its EXIF orientation and convert to RGB"""
+    with DECODE_SECONDS.time(kind='full'), span('decode', 'image', kind='full'):
+        image = Image.open(io.BytesIO(image_bytes))
+        image.load()
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+    return image
+
+def encode_result(processed_image, metadata, message, output_format='jpeg', preset='balanced'):
+    """Encode once with the chosen preset - the encoded bytes are what gets cached"""
+    return pack_result({
+        'message': message,
+        'metadata': metadata,
+        'processed_size': f"{processed_image.width}x{processed_image.height}",
+        'format': output_format
+    }, encode_image(processed_image, output_format, preset))
+
+def result_payload(record):
+    """Response fields for a cached result record"""
+    result, image_bytes = unpack_result(record)
+    img_str = base64.b64encode(image_bytes).decode()
+    return {
+        'processedImageUrl': f"data:{mimetype_for(result.get('format', 'jpeg'))};base64,{img_str}",
+        'message': result['message'],
+        'metadata': result['metadata'],
+        'processed_size': result['processed_size']
+    }
+
+def result_key_for(image, process_type, intensity, mode, output_format='jpeg', preset='balanced'):
+    """Identical resubmissions (same pixels + parameters) share one cache entry"""
+    return make_result_key(
+        image_content_hash(image),
+        process_type,
+        mode,
+        intensity,
+        engine=ENGINE_VERSION if AI_MODELS_LOADED else 'basic',
+        encoder=f'{output_format}-{preset}'
+    )
+
+def blob_url(blob_id):
+    """Absolute short URL of a stored blob"""
+    return url_for('get_blob', blob_id=blob_id, _external=True)
+
+def result_url_payload(record):
+    """Response fields for a result record, with the image written to the blob store"""
+    result, image_bytes = unpack_result(record)
+    blob_id = result_store.put(image_bytes, extension_for(mimetype_for(result.get('format', 'jpeg'))))
+    return {
+        'processedImageUrl': blob_url(blob_id),
+        'blob_id': blob_id,
+        'message': result['message'],
+        'metadata': result['metadata'],
+        'processed_size': result['processed_size']
+    }
+
+def result_response(record, response_mode, **fields):
+    """
+    Send a result record as JSON with a data URL, as JSON with a short blob
+    URL, as the raw encoded image (metadata in the X-Result-Metadata header)
+    or as multipart/mixed
+    """
+    if response_mode == 'json':
+        response = jsonify({'status': 'success', **result_payload(record), **fields})
+    elif response_mode == 'url':
+        response = jsonify({'status': 'success', **result_url_payload(record), **fields})
+    else:
+        result, image_bytes = unpack_result(record)
+        mimetype = mimetype_for(result.get('format', 'jpeg'))
+        fields = {
+            'status': 'success',
+            'message': result['message'],
+            'metadata': result['metadata'],
+            'processed_size': result['processed_size'],
+            **fields
+        }
+        
+        if response_mode == 'binary':
+            response = Response(image_bytes, mimetype=mimetype)
+            response.headers['X-Result-Metadata'] = metadata_header(fields)
+            response.headers['Access-Control-Expose-Headers'] = 'X-Result-Metadata'
+        else:
+            chunks, content_type, content_length = multipart_parts(fields, image_bytes, mimetype)
+            response = Response(chunks, content_type=content_type)
+            response.headers['Content-Length'] = str(content_length)
+    
+    response.vary.add('Accept')
+    return response
+
+def progress_reporter(progress_id, process_type):
+    """Stage event publisher for a request or job (None = stdout only)"""
+    if not progress_id:
+        return None
+    return ProgressReporter(
+        progress_id,
+        total_stages=6 if process_type == 'super-resolution' else 8,
+        pipeline=process_type,
+        preview=True
+    )
+
+def process_job(image_ref, process_type, intensity, mode, progress_id=None,
+                output_format='jpeg', preset='balanced', trace_context=None):
+    """
+    Job pool entry point - decode, process and encode in the pool process
+    
+    image_ref: encoded image bytes, or an image handle (loaded from the
+    shared tier, so only the handle is sent to the pool)
+    trace_context: (trace_id, sampled) of the submitting request - the job
+    is recorded as the 'job' segment of that trace
+    """
+    trace = start_trace('process_job', *trace_context, segment='job') if trace_context else None
+    progress = progress_reporter(progress_id, process_type)
+    try:
+        if isinstance(image_ref, str):
+            image = load_image(image_ref)
+            if image is None:
+                raise ValueError('Image handle expired - please upload again')
+        else:
+            image = decode_rgb(image_ref)
+        with MemoryUsage(process_type, mode, image):
+            return encode_result(
+                *run_processing(image, process_type, intensity, mode, progress), output_format, preset
+            )
+    except Exception as e:
+        if progress:
+            progress.fail(str(e))
+        raise
+    finally:
+        if trace is not None:
+            end_trace(trace)
+
 @app.route('/api/process-image', methods=['POST'])
+@profiled
 def process_image():
-    """Process image with advanced AI"""
+    """
+    Process image with advanced AI
+    
+    The input is an 'image' file or an image_handle from /api/images.
+    Optional fields (form or query): format (jpeg/webp/png), preset
+    (fast/balanced/small), response (json/url/binary/multipart -
+    defaults from the Accept header, then json), profile=1 (see
+    profiled()) and memory=1 (a 'memory' report in the result fields, see
+    models/memory_accounting.py). Profiled and memory=1 requests always
+    run the pipeline; both are admin / debug only.
+    """
+    progress = None
+    
+    def reject(message, status):
+        # A client following progress_id gets the error too
+        if progress:
+            progress.fail(message)
+        return jsonify({'error': message}), status
+    
     try:
-        if 'image' not in request.files:
-            return jsonify({'error': 'No image file provided'}), 400
-        
-        file = request.files['image']
         process_type = request.form.get('process_type', 'super-resolution')
+        progress_id = request.form.get('progress_id')  # Optional channel for /api/progress/<id>
+        # Opened before anything can fail, so every exit ends the channel
+        progress = progress_reporter(progress_id, process_type)
         intensity = float(request.form.get('intensity', 0.75))  # Get intensity from frontend (0.0-1.0)
         mode = request.form.get('mode', 'auto')  # Get processing mode (auto, fast, balanced, quality, ultra)
         
-        if file.filename == '':
-            return jsonify({'error': 'No selected file'}), 400
+        if process_type not in ('super-resolution', 'restoration'):
+            return reject('Invalid process type', 400)
         
-        # Read image
-        image_bytes = file.read()
-        image = Image.open(io.BytesIO(image_bytes))
+        memory_debug = memory_requested()
+        if memory_debug and not profiling_allowed(request.headers, app.debug):
+            return reject('Memory reports require an admin token or a debug build', 403)
         
-        # Convert to RGB
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        try:
+            output_format, preset = resolve_encoder(request.values.get('format'), request.values.get('preset'))
+            response_mode = negotiate_response(request.values.get('response'), request.headers.get('Accept'))
+        except ValueError as e:
+            return reject(str(e), 400)
         
-        # Process with MULTI-MODEL ENGINE
-        if process_type == 'super-resolution':
-            if AI_MODELS_LOADED:
-                processed_image, metadata = enhance_super_resolution(image, intensity, mode)
-                mode_name = metadata.get('processing_mode', 'AUTO')
-                time_str = metadata.get('processing_time', '?')
-                message = f'✨ Super-Resolution Complete! Mode: {mode_name} | Time: {time_str}'
-            else:
-                new_size = (image.width * 2, image.height * 2)
-                processed_image = image.resize(new_size, Image.Resampling.LANCZOS)
-                metadata = {'technique': 'Lanczos upscaling', 'processing_mode': 'FAST', 'processing_time': '0.5s'}
-                message = 'Image enhanced with super-resolution'
-                
-        elif process_type == 'restoration':
-            if AI_MODELS_LOADED:
-                processed_image, metadata = restore_artifact_image(image, intensity, mode)
-                mode_name = metadata.get('processing_mode', 'AUTO')
-                time_str = metadata.get('processing_time', '?')
-                message = f'🔧 Restoration Complete! Mode: {mode_name} | Time: {time_str}'
-            else:
-                from PIL import ImageEnhance
-                enhancer = ImageEnhance.Sharpness(image)
-                processed_image = enhancer.enhance(2.0)
-                metadata = {'technique': 'Basic enhancement', 'processing_mode': 'FAST', 'processing_time': '0.3s'}
-                message = 'Image restored successfully'
+        # Read image (upload or handle)
+        image, _, error = request_input_image()
+        if error:
+            return reject(error[0].get_json()['error'], error[1])
+        
+        cache_key = result_key_for(image, process_type, intensity, mode, output_format, preset)
+        
+        # A profiled request already traces allocations (in the profile)
+        memory = MemoryUsage(process_type, mode, image, trace_allocations=memory_debug and not g.get('profiling'))
+        
+        def compute_result():
+            with memory:
+                return encode_result(
+                    *run_processing(image, process_type, intensity, mode, progress), output_format, preset
+                )
+        
+        if g.get('profiling') or memory_debug:
+            record, cache_status = compute_result(), 'bypass'
+            result_cache.put(cache_key, record)
         else:
+            record, cache_status = result_cache.get_or_compute(cache_key, compute_result)
+        
+        if progress and cache_status not in ('miss', 'bypass'):
+            progress.finish(cache_status)
+        
+        response = result_response(
+            record,
+            response_mode,
+            original_size=f"{image.width}x{image.height}",
+            cache=cache_status,
+            **({'memory': memory.report()} if memory_debug else {})
+        )
+        # Identity of the result (input hash, parameters, engine, encoder)
+        response.set_etag(make_etag(cache_key, response_mode))
+        return response
+    
+    except Exception as e:
+        log(f"Error: {e}", ERROR)
+        import traceback
+        traceback.print_exc()
+        return reject(str(e), 500)
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue an image processing job (same form fields as /api/process-image)
+    
+    Returns 202 with a job id to poll at /api/jobs/<id>; 200 with status
+    'done' when the result is already cached.
+    """
+    try:
+        process_type = request.form.get('process_type', 'super-resolution')
+        intensity = float(request.form.get('intensity', 0.75))
+        mode = request.form.get('mode', 'auto')
+        
+        if process_type not in ('super-resolution', 'restoration'):
+            return jsonify({'error': 'Invalid process type'}), 400
+        
+        try:
+            output_format, preset = resolve_encoder(request.values.get('format'), request.values.get('preset'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        image, image_ref, error = request_input_image()
+        if error:
+            return error
+        cache_key = result_key_for(image, process_type, intensity, mode, output_format, preset)
+        info = {
+            'process_type': process_type,
+            'intensity': intensity,
+            'mode': mode,
+            'format': output_format,
+            'preset': preset,
+            'original_size': f"{image.width}x{image.height}",
+            'result_key': cache_key
+        }
+        
+        if result_cache.get(cache_key) is not None:
+            job = job_queue.create(status='done', cache='hit', **info)
+            return jsonify(job_response(job))
+        
+        job_id = uuid.uuid4().hex  # doubles as the progress channel
+        job = job_queue.submit(
+            process_job,
+            (image_ref, process_type, intensity, mode, job_id, output_format, preset,
+             (current_trace().trace_id, current_trace().sampled)),
+            job_id=job_id,
+            on_done=lambda record: result_cache.put(cache_key, record),
+            cache='miss',
+            **info
+        )
+        return jsonify(job_response(job)), 202
+    
+    except JobQueueFull as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    
+    except Exception as e:
+        log(f"Error: {e}", ERROR)
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+def job_response(job):
+    """
+    Public view of a job record, with the result once it is done (as a
+    data URL, or a blob URL when the request asks for response=url)
+    """
+    response = {key: value for key, value in job.items() if key != 'result_key'}
+    response['job_id'] = response.pop('id')
+    response['status_url'] = f"/api/jobs/{job['id']}"
+    response['events_url'] = f"/api/progress/{job['id']}"
+    
+    if job['status'] == 'done':
+        record = result_cache.get(job['result_key'])
+        if record is None:
+            response['status'] = 'expired'
+            response['error'] = 'Result no longer cached - please resubmit'
+        elif request.values.get('response') == 'url':
+            response.update(result_url_payload(record))
+        else:
+            response.update(result_payload(record))
+    return response
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job status (answerable by any worker) and the result when done"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    if job['status'] != 'done':
+        return jsonify(job_response(job))
+    
+    # A finished job's result never changes - polling clients revalidate for free
+    etag = make_etag(job['result_key'], request.values.get('response', 'json'))
+    return conditional_response(etag, lambda: jsonify(job_response(job)), CACHE_REVALIDATE)
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a queued job, or discard the result of a running one"""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job_response(job))
+
+@app.route('/api/jobs/stats', methods=['GET'])
+def job_stats():
+    """Job counters for this worker process"""
+    return jsonify(job_queue.stats())
+
+@app.route('/api/progress/<channel_id>', methods=['GET'])
+def progress_stream(channel_id):
+    """
+    Server-Sent Events for a job id or a /api/process-image progress_id
+    
+    Each 'progress' event carries the stage, its name, elapsed time, an ETA
+    and (for completed stages) a low-resolution preview. The stream ends
+    after a 'finished' / 'failed' event, or with an 'end' event when a job
+    finishes without running the pipeline (cache hit, cancelled in queue)
+    or the id names no job and no request opens it (status 'unknown').
+    """
+    after = request.headers.get('Last-Event-ID') or request.args.get('after', 0)
+    try:
+        after = int(after)
+    except ValueError:
+        after = 0
+    
+    def job_final_status():
+        job = job_queue.get(channel_id)
+        if job is not None and job['status'] in FINAL_STATES:
+            return job['status']
+        return None
+    
+    response = Response(
+        stream_with_context(stream_events(
+            channel_id, after, job_final_status, exists=lambda: job_queue.get(channel_id) is not None
+        )),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def preview_data_url(image, quality=85):
+    """Encode a scrub preview as a JPEG data URL"""
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG", quality=quality, optimize=False)
+    return f"data:image/jpeg;base64,{base64.b64encode(buffered.getvalue()).decode()}"
+
+@app.route('/api/scrub/start', methods=['POST'])
+def scrub_start():
+    """
+    Prepare an image for interactive intensity scrubbing
+    
+    Runs the intensity-independent stages and the anchor intensities once;
+    /api/scrub/render then answers each slider move from the session.
+    """
+    try:
+        if not AI_MODELS_LOADED:
+            return jsonify({'error': 'Scrubbing requires the AI pipelines'}), 503
+        
+        process_type = request.form.get('process_type', 'super-resolution')
+        intensity = float(request.form.get('intensity', 0.75))
+        
+        if process_type not in ('super-resolution', 'restoration'):
             return jsonify({'error': 'Invalid process type'}), 400
         
-        # Convert to base64 (FAST JPEG!)
-        buffered = io.BytesIO()
-        processed_image.save(buffered, format="JPEG", quality=90, optimize=False)
-        img_str = base64.b64encode(buffered.getvalue()).decode()
-        processed_url = f"data:image/jpeg;base64,{img_str}"
+        image, _, error = request_input_image()
+        if error:
+            return error
+        
+        start = datetime.now()
+        session_id, session, status = start_scrub_session(image, process_type)
         
         return jsonify({
             'status': 'success',
-            'processedImageUrl': processed_url,
-            'message': message,
-            'metadata': metadata,
+            'session_id': session_id,
+            'session': status,
+            'anchors': session.intensities,
+            'preview_size': f"{session.size[0]}x{session.size[1]}",
             'original_size': f"{image.width}x{image.height}",
-            'processed_size': f"{processed_image.width}x{processed_image.height}"
+            'processedImageUrl': preview_data_url(session.render(intensity)),
+            'intensity': intensity,
+            'setup_time': f"{(datetime.now() - start).total_seconds():.2f}s"
         })
     
     except Exception as e:
-        print(f"Error: {e}")
+        log(f"Error: {e}", ERROR)
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/scrub/render', methods=['POST'])
+def scrub_render():
+    """Render a scrub session at one intensity (one blend + encode)"""
+    try:
+        data = request.json or {}
+        session_id = data.get('session_id')
+        intensity = float(data.get('intensity', 0.75))
+        
+        if not session_id:
+            return jsonify({'error': 'No session_id provided'}), 400
+        
+        start = datetime.now()
+        session = get_scrub_session(session_id) if AI_MODELS_LOADED else None
+        if session is None:
+            return jsonify({'error': 'Scrub session expired, call /api/scrub/start again'}), 404
+        
+        processed_url = preview_data_url(session.render(intensity))
+        
+        return jsonify({
+            'status': 'success',
+            'processedImageUrl': processed_url,
+            'intensity': intensity,
+            'render_time': f"{(datetime.now() - start).total_seconds() * 1000:.0f}ms"
+        })
+    
+    except Exception as e:
+        log(f"Error: {e}", ERROR)
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/analyze-artifact', methods=['POST'])
 def analyze_artifact_endpoint():
     """Analyze artifact using AI"""
@@ -189,10 +1091,11 @@ def analyze_artifact_endpoint():
         return jsonify(analysis)
     
     except Exception as e:
-        print(f"Error: {e}")
+        log(f"Error: {e}", ERROR)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/historical-info', methods=['POST'])
+@profiled
 def get_historical_info_endpoint():
     """Get historical information using AI + Wikipedia"""
     try:
@@ -223,7 +1126,7 @@ def get_historical_info_endpoint():
                         'thumbnail': wiki_data.get('thumbnail', '')
                     }
             except Exception as wiki_error:
-                print(f"Wikipedia fetch error: {wiki_error}")
+                log(f"Wikipedia fetch error: {wiki_error}", WARNING)
                 # Continue without Wikipedia info
         
         # Get AI analysis - ALWAYS use conversational AI (NO API KEYS NEEDED!)
@@ -253,17 +1156,18 @@ def get_historical_info_endpoint():
         })
     
     except Exception as e:
-        print(f"Error: {e}")
+        log(f"Error: {e}", ERROR)
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/scifi-story-generate', methods=['POST'])
+@profiled
 def generate_scifi_story():
     """Generate sci-fi story concepts from artifacts"""
     try:
         data = request.json
-        image_url = data.get('imageUrl', '')
+        image_url = data.get('imageHandle') or data.get('imageUrl', '')  # handle from /api/images, or URL
         prompt = data.get('prompt', 'Generate a creative sci-fi story concept')
         session_id = data.get('sessionId')
         genres = data.get('genres', ['science-fiction'])
@@ -333,10 +1237,11 @@ Make it creative, engaging, and seamlessly blend the selected genres. Focus on "
         })
     
     except Exception as e:
-        print(f"Error generating sci-fi story: {e}")
+        log(f"Error generating sci-fi story: {e}", ERROR)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/scifi-chat', methods=['POST'])
+@profiled
 def scifi_chat():
     """Chat interface for sci-fi story development"""
     try:
@@ -390,10 +1295,11 @@ Keep responses engaging, creative, and focused on science fiction storytelling.
         })
     
     except Exception as e:
-        print(f"Error in sci-fi chat: {e}")
+        log(f"Error in sci-fi chat: {e}", ERROR)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/gemini-chat', methods=['POST'])
+@profiled
 def gemini_chat_endpoint():
     """Direct Gemini chat endpoint with image analysis support"""
     try:
@@ -410,7 +1316,7 @@ def gemini_chat_endpoint():
         })
     
     except Exception as e:
-        print(f"Error in Gemini chat: {e}")
+        log(f"Error in Gemini chat: {e}", ERROR)
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
@@ -420,5 +1326,9 @@ if __name__ == '__main__':
     print(f"AI Models: {'[OK] Loaded' if AI_MODELS_LOADED else '[WARN] Fallback mode'}")
     print("Server starting on http://localhost:5000")
     print("="*50 + "\n")
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    try:
+        app.run(debug=True, host='0.0.0.0', port=5000)
+    finally:
+        # Under gunicorn, gunicorn.conf.py's worker_exit hook does this
+        job_queue.drain()
 
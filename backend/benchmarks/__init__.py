@@ -0,0 +1,38 @@
+"""
+Benchmarks
+Reproducible engine benchmarks with a machine-readable history
+
+models/ holds seven interchangeable implementations of super-resolution
+and restoration (ultra_fast_*, optimized_*, fast_*, final_*, working_*,
+simple_* and advanced_*). Instead of hand-written "Performance
+Benchmarks" comment blocks, this suite measures them all the same way:
+1. Synthetic scans (benchmarks/synthetic.py) at several sizes and aspect
+   ratios - deterministic, so every run sees the same pixels
+2. Every engine and mode: latency percentiles, MP/s, peak image buffer
+   and traced memory, and output equivalence against the served engine
+3. Each run is appended to a JSONL history; `compare` diffs two runs and
+   exits non-zero on regressions, so it can gate a deploy
+4. `pareto` measures real PSNR / SSIM on degraded inputs against time
+   (benchmarks/quality.py)
+5. `load` drives every API route with realistic flows under a given
+   gunicorn worker configuration, against local Gemini / Wikipedia stubs
+   (benchmarks/loadtest.py, benchmarks/stubs.py); `stubs` serves the
+   stubs alone, for a backend started by hand. --record / --replay run
+   the backend against cassettes of real upstream answers instead
+   (models/outbound.py) - offline, with recorded, scaled or synthetic
+   latency
+
+Usage (from backend/):
+    python -m benchmarks run                      # everything, default sizes
+    python -m benchmarks run --engine ultra_fast --size 4000x3000 --label tiling
+    python -m benchmarks compare                  # previous run vs latest
+    python -m benchmarks compare main-baseline -1 --threshold 0.05
+    python -m benchmarks list
+    python -m benchmarks pareto --operation restoration --json pareto.json
+    python -m benchmarks load --workers 4 --threads 8 --duration 120 --json load.json
+    python -m benchmarks load --mix chat --gemini-latency lognormal:1.5,0.6 --gemini-errors 0.05
+    python -m benchmarks load --target http://localhost:5000 --mix process:3,job:1,chat:1
+    python -m benchmarks load --upstream live --record cassettes --mix chat --unique-text 0
+    python -m benchmarks load --replay cassettes --replay-latency scaled:4 --mix chat --unique-text 0
+    python -m benchmarks stubs --port 8701
+"""
@@ -0,0 +1,429 @@
+"""
+Benchmark command line - see benchmarks/__init__.py
+"""
+
+from models.outbound import ReplayLatency
+from .engines import load_engines, OPERATIONS, FAMILIES, MODES
+from .loadtest import (
+    FLOWS, MIXES, UPLOAD_SIZES, UploadImages, parse_weights, run_load, summarize as summarize_load,
+    launch_server, wait_until_ready, stop_server, server_log_errors
+)
+from .history import DEFAULT_HISTORY, new_run, append_run, load_runs, select_run, compare_runs, describe, environment
+from .quality import run_quality, summarize, DEGRADATIONS, INTENSITIES, DEFAULT_QUALITY_SIZE
+from .stubs import StubServer, DEFAULT_GEMINI_LATENCY, DEFAULT_WIKIPEDIA_LATENCY, ANSWER_WORDS
+from .suite import run_suite
+from .synthetic import parse_size, DEFAULT_SIZES, SIZES
+import argparse
+import json
+import os
+import requests
+import shutil
+import socket
+import sys
+import tempfile
+import time
+import uuid
+
+
+def _ms(seconds) -> str:
+    return '-' if seconds is None else f'{seconds * 1000:.1f}'
+
+
+def _mb(size) -> str:
+    return '-' if size is None else f'{size / 1024 / 1024:.1f}'
+
+
+def _equivalence(row: dict) -> str:
+    if 'identical' not in row:
+        return 'reference' if 'error' not in row else '-'
+    if row['identical']:
+        return 'identical'
+    if row['mean_abs_diff'] is None:
+        return 'size differs'
+    return f"diff {row['mean_abs_diff']:.2f}/{row['max_abs_diff']}"
+
+
+def print_row(row: dict):
+    name = f"{row['operation']:<16} {row['engine']:<10} {row['mode']:<8} {row['size']:<10}"
+    if 'error' in row:
+        print(f"{name} ERROR {row['error']}")
+        return
+    print(f"{name} p50 {_ms(row['p50']):>8}ms  p90 {_ms(row['p90']):>8}ms  p99 {_ms(row['p99']):>8}ms  "
+          f"{row['mp_per_s']:>7} MP/s  buffers {_mb(row['peak_image_bytes']):>7}MB  "
+          f"traced {_mb(row['traced_peak_bytes']):>6}MB  {_equivalence(row)}"
+          f"{'' if row['deterministic'] else '  NONDETERMINISTIC'}")
+
+
+def command_run(args) -> int:
+    sizes = [parse_size(size) for size in (args.size or DEFAULT_SIZES)]
+    engines = load_engines(tuple(args.operation or ()), tuple(args.engine or ()))
+    modes = tuple(args.mode or MODES)
+    config = {
+        'sizes': {name: list(size) for name, size in sizes},
+        'engines': sorted({engine.family for engine in engines}),
+        'operations': sorted({engine.operation for engine in engines}),
+        'modes': list(modes),
+        'intensity': args.intensity,
+        'repeat': args.repeat,
+        'warm': args.warm
+    }
+    
+    rows = run_suite(engines, sizes, args.intensity, args.repeat, modes, args.warm, on_row=print_row)
+    if args.no_save:
+        return 0
+    run = new_run(config, rows, args.label)
+    append_run(run, args.history)
+    print(f"\nSaved run {describe(run)}\n  to {args.history}")
+    return 0
+
+
+def command_compare(args) -> int:
+    runs = load_runs(args.history)
+    try:
+        base = select_run(runs, args.base)
+        new = select_run(runs, args.new)
+    except ValueError as e:
+        print(f"[BENCH] {e}")
+        return 2
+    
+    print(f"base: {describe(base)}\nnew:  {describe(new)}\n")
+    comparisons, regressions, warnings = compare_runs(base, new, args.threshold)
+    for warning in warnings:
+        print(f"[WARN] {warning}")
+    
+    removed = 0
+    for comparison in comparisons:
+        name = ' '.join(f'{part:<10}' for part in comparison['key'])
+        old, row = comparison['base'], comparison['new']
+        if row is None:
+            removed += 1
+            continue
+        if old is None:
+            print(f"{name} new")
+            continue
+        latency = comparison['latency_change']
+        change = '' if latency is None else f'{latency:+.1%}'
+        flag = f"  REGRESSION: {', '.join(comparison['regressions'])}" if comparison['regressions'] else ''
+        print(f"{name} p50 {_ms(old.get('p50')):>8} -> {_ms(row.get('p50')):>8}ms {change:>8}  "
+              f"buffers {_mb(old.get('peak_image_bytes'))} -> {_mb(row.get('peak_image_bytes'))}MB{flag}")
+    
+    if removed:
+        print(f"({removed} base row(s) not in the new run)")
+    print(f"\n{regressions} regression(s) at threshold {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def print_quality_row(row: dict):
+    intensity = '-' if row['intensity'] is None else f"{row['intensity']:.2f}"
+    name = f"{row['operation']:<16} {row['engine']:<10} {row['mode']:<8} {intensity:<5} {row['degradation']:<10}"
+    if 'error' in row:
+        print(f"{name} ERROR {row['error']}")
+        return
+    print(f"{name} p50 {_ms(row['p50']):>8}ms  PSNR {row['psnr']:>7.2f}  SSIM {row['ssim']:.4f}"
+          f"{'  (resized)' if row['resized'] else ''}")
+
+
+def command_pareto(args) -> int:
+    _, size = parse_size(args.size) if args.size else (None, DEFAULT_QUALITY_SIZE)
+    engines = load_engines(tuple(args.operation or ()), tuple(args.engine or ()))
+    config = {
+        'size': list(size),
+        'engines': sorted({engine.family for engine in engines}),
+        'modes': list(args.mode or MODES),
+        'intensities': list(args.intensity or INTENSITIES),
+        'degradations': list(args.degradation or DEGRADATIONS),
+        'repeat': args.repeat,
+        'metric': args.metric
+    }
+    rows = run_quality(
+        engines, size, tuple(config['intensities']), tuple(config['modes']), tuple(config['degradations']),
+        args.repeat, on_row=print_quality_row if args.verbose else None
+    )
+    summary = summarize(rows, args.metric)
+    
+    for operation, points in summary.items():
+        print(f"\n{operation} - averaged over {', '.join(config['degradations'])} (* = Pareto frontier on {args.metric})")
+        for point in points:
+            intensity = '-' if point['intensity'] is None else f"{point['intensity']:.2f}"
+            throughput = '-' if point['mp_per_s'] is None else f"{point['mp_per_s']:.2f}"
+            print(f"  {'*' if point['frontier'] else ' '} {point['engine']:<10} {point['mode']:<8} {intensity:<5} "
+                  f"p50 {_ms(point['p50']):>8}ms  {throughput:>7} MP/s  "
+                  f"PSNR {point['psnr']:>7.2f}  SSIM {point['ssim']:.4f}")
+    
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump({'environment': environment(), 'config': config, 'rows': rows, 'summary': summary}, output, indent=1)
+        print(f"\nWrote {args.json}")
+    return 0
+
+
+def _stub_server(args, port: int = 0) -> StubServer:
+    return StubServer(
+        port=port,
+        gemini_latency=args.gemini_latency,
+        gemini_errors=args.gemini_errors,
+        wikipedia_latency=args.wikipedia_latency,
+        wikipedia_errors=args.wikipedia_errors,
+        answer_words=args.answer_words,
+        seed=args.seed
+    ).start()
+
+
+def _print_stub_stats(stats: dict):
+    for name, service in stats.items():
+        print(f"  {name:<10} {service['requests']:>6} requests  {service['injected_errors']:>4} injected errors  "
+              f"latency {service['latency']}  {service['by_call']}")
+
+
+def command_stubs(args) -> int:
+    try:
+        server = _stub_server(args, args.port)
+    except ValueError as e:
+        print(f"[BENCH] {e}")
+        return 2
+    print(f"Stubs on {server.url} - start the backend with:")
+    for name, value in server.env().items():
+        print(f"  export {name}={value}")
+    print("Ctrl-C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    _print_stub_stats(server.stats())
+    return 0
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def _cassette_counts(base_url: str) -> list:
+    """The backend's recorded / replayed / missed call counters (as of its last metrics flush)"""
+    try:
+        text = requests.get(f'{base_url}/metrics', timeout=10).text
+    except requests.RequestException:
+        return []
+    return [line for line in text.splitlines() if line.startswith('heri_external_cassette_total{')]
+
+
+def print_load_row(row: dict):
+    statuses = ' '.join(f'{status}:{count}' for status, count in sorted(row['statuses'].items()))
+    print(f"{row['endpoint']:<36} {row['count']:>6} {row['throughput']:>8.2f}/s  p50 {_ms(row['p50']):>8}ms  "
+          f"p95 {_ms(row['p95']):>8}ms  p99 {_ms(row['p99']):>8}ms  max {_ms(row['max']):>8}ms  "
+          f"errors {row['error_rate']:>6.1%}  [{statuses}]")
+
+
+def command_load(args) -> int:
+    try:
+        mix = parse_weights(args.mix, FLOWS, MIXES)
+        upload_sizes = parse_weights(args.upload_sizes, SIZES)
+        ReplayLatency(args.replay_latency)
+        if args.target:
+            stubs = _stub_server(args, args.stub_port) if args.stub_port else None
+        else:
+            stubs = _stub_server(args) if args.upstream == 'stubs' and not args.replay else None
+    except ValueError as e:
+        print(f"[BENCH] {e}")
+        return 2
+    if args.target and (args.record or args.replay):
+        print("[BENCH] --record / --replay configure a launched backend - start the target with OUTBOUND_MODE instead")
+        return 2
+    if args.replay and args.unique_text:
+        print("[WARN] Unique prompts are never in a cassette - use --unique-text 0 when recording and replaying")
+    
+    admin_token = args.admin_token or (uuid.uuid4().hex if not args.target else None)
+    server, workdir, log_errors = None, None, None
+    base_url = args.target
+    try:
+        if not args.target:
+            port = args.port or _free_port()
+            base_url = f'http://127.0.0.1:{port}'
+            workdir = tempfile.mkdtemp(prefix='heri-load-')
+            env = {**(stubs.env() if stubs else {}), 'ADMIN_TOKEN': admin_token}
+            if args.record:
+                env.update(OUTBOUND_MODE='record', OUTBOUND_CASSETTES=os.path.abspath(args.record))
+            if args.replay:
+                env.update(OUTBOUND_MODE='replay', OUTBOUND_CASSETTES=os.path.abspath(args.replay),
+                           OUTBOUND_LATENCY=args.replay_latency)
+            print(f"Starting the backend ({args.workers} workers x {args.threads} threads) in {workdir}")
+            server = launch_server(port, args.workers, args.threads, env, workdir, args.server_command)
+            if not wait_until_ready(base_url, server, args.startup_timeout):
+                print(f"[BENCH] The backend did not become ready - see {os.path.join(workdir, 'server.log')}")
+                args.keep = True
+                return 2
+        elif stubs:
+            print(f"Stubs on {stubs.url} - the target must run with {stubs.env()}")
+        
+        print(f"Preparing uploads ({', '.join(upload_sizes)}, {args.variants} variant(s) each)")
+        uploads = UploadImages(upload_sizes, args.variants)
+        print(f"Load: {args.concurrency} users, mix {mix}, {args.warmup:g}s warm-up + {args.duration:g}s against {base_url}\n")
+        recorder, elapsed, flows_run = run_load(
+            base_url, mix, args.concurrency, args.duration, args.warmup, args.think_time, uploads,
+            args.unique_text, admin_token, args.seed
+        )
+        cassette_counts = _cassette_counts(base_url) if args.record or args.replay else None
+    finally:
+        if server is not None:
+            stop_server(server)
+            log_errors = server_log_errors(workdir)
+        if stubs is not None:
+            stubs.stop()
+        if workdir and not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    rows = summarize_load(recorder.samples, elapsed)
+    for row in rows:
+        print_load_row(row)
+    print(f"\nFlows run: {flows_run}")
+    stub_stats = stubs.stats() if stubs else None
+    if stub_stats:
+        print("Stubs:")
+        _print_stub_stats(stub_stats)
+    if cassette_counts is not None:
+        print(f"Cassettes ({'recording to ' + args.record if args.record else 'replaying ' + args.replay}):")
+        for line in cassette_counts or ['  no outbound calls']:
+            print(f"  {line}")
+    if log_errors is not None:
+        print('Server log:' + ('' if log_errors else ' clean'))
+        for label, messages in log_errors.items():
+            for message, count in sorted(messages.items(), key=lambda item: -item[1]):
+                print(f"  {label:<16} {count:>6}  {message}")
+    
+    if args.json:
+        config = {
+            'target': args.target,
+            'workers': None if args.target else args.workers,
+            'threads': None if args.target else args.threads,
+            'mix': mix,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'warmup': args.warmup,
+            'think_time': args.think_time,
+            'upload_sizes': upload_sizes,
+            'variants': args.variants,
+            'unique_text': args.unique_text,
+            'gemini_latency': args.gemini_latency,
+            'gemini_errors': args.gemini_errors,
+            'wikipedia_latency': args.wikipedia_latency,
+            'wikipedia_errors': args.wikipedia_errors,
+            'upstream': 'replay' if args.replay else 'stubs' if stubs else 'live',
+            'record': args.record,
+            'replay': args.replay,
+            'replay_latency': args.replay_latency if args.replay else None,
+            'seed': args.seed
+        }
+        with open(args.json, 'w') as output:
+            json.dump({'environment': environment(), 'config': config, 'elapsed': round(elapsed, 3),
+                       'rows': rows, 'flows': flows_run, 'stubs': stub_stats, 'cassettes': cassette_counts,
+                       'server_log': log_errors},
+                      output, indent=1)
+        print(f"\nWrote {args.json}")
+    return 0
+
+
+def command_list(args) -> int:
+    for index, run in enumerate(load_runs(args.history)):
+        print(f"{index:>4}  {describe(run)}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Engine micro-benchmarks')
+    parser.add_argument('--history', default=DEFAULT_HISTORY, help='JSONL history file')
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    run = commands.add_parser('run', help='benchmark engines and append the run to the history')
+    run.add_argument('--operation', action='append', choices=list(OPERATIONS))
+    run.add_argument('--engine', action='append', choices=FAMILIES, help='engine family (repeatable)')
+    run.add_argument('--mode', action='append', choices=MODES)
+    run.add_argument('--size', action='append', help=f"{', '.join(SIZES)} or WIDTHxHEIGHT (repeatable)")
+    run.add_argument('--repeat', type=int, default=5, help='timed runs per combination (default 5)')
+    run.add_argument('--intensity', type=float, default=0.75)
+    run.add_argument('--warm', action='store_true', help='keep memoization caches between runs')
+    run.add_argument('--label', help='name to compare against later (e.g. main-baseline)')
+    run.add_argument('--no-save', action='store_true', help='print only')
+    run.set_defaults(handler=command_run)
+    
+    compare = commands.add_parser('compare', help='compare two runs; exit 1 on regressions')
+    compare.add_argument('base', nargs='?', default='-2', help='index, id prefix or label (default -2)')
+    compare.add_argument('new', nargs='?', default='-1', help='index, id prefix or label (default -1)')
+    compare.add_argument('--threshold', type=float, default=0.10, help='relative change that counts (default 0.10)')
+    compare.set_defaults(handler=command_compare)
+    
+    pareto = commands.add_parser('pareto', help='measured PSNR / SSIM vs time on degraded inputs')
+    pareto.add_argument('--operation', action='append', choices=list(OPERATIONS))
+    pareto.add_argument('--engine', action='append', choices=FAMILIES, help='engine family (repeatable)')
+    pareto.add_argument('--mode', action='append', choices=MODES)
+    pareto.add_argument('--intensity', action='append', type=float, help='(repeatable, default 0.25 0.5 0.75 1.0)')
+    pareto.add_argument('--degradation', action='append', choices=list(DEGRADATIONS))
+    pareto.add_argument('--size', help='clean image size (default 800x600)')
+    pareto.add_argument('--repeat', type=int, default=3, help='timed runs per point (default 3)')
+    pareto.add_argument('--metric', choices=('ssim', 'psnr'), default='ssim', help='frontier quality axis')
+    pareto.add_argument('--json', help='write rows and frontier to this file')
+    pareto.add_argument('--verbose', action='store_true', help='print every measurement')
+    pareto.set_defaults(handler=command_pareto)
+    
+    stub_options = argparse.ArgumentParser(add_help=False)
+    stub_options.add_argument('--gemini-latency', default=DEFAULT_GEMINI_LATENCY,
+                              help=f'none, fixed:S, uniform:LOW,HIGH, normal:MEAN,SD or lognormal:MEDIAN,SIGMA '
+                                   f'(default {DEFAULT_GEMINI_LATENCY})')
+    stub_options.add_argument('--gemini-errors', type=float, default=0.0, help='fraction answered 429 / 503')
+    stub_options.add_argument('--wikipedia-latency', default=DEFAULT_WIKIPEDIA_LATENCY,
+                              help=f'(default {DEFAULT_WIKIPEDIA_LATENCY})')
+    stub_options.add_argument('--wikipedia-errors', type=float, default=0.0, help='fraction answered 429 / 503')
+    stub_options.add_argument('--answer-words', type=int, default=ANSWER_WORDS, help='length of Gemini answers')
+    stub_options.add_argument('--seed', type=int, default=0)
+    
+    stubs = commands.add_parser('stubs', parents=[stub_options], help='serve the Gemini / Wikipedia stand-ins')
+    stubs.add_argument('--port', type=int, default=8701)
+    stubs.set_defaults(handler=command_stubs)
+    
+    load = commands.add_parser('load', parents=[stub_options],
+                               help='load-test the API (launches gunicorn with the stubs unless --target)')
+    load.add_argument('--target', help='URL of an already running backend (not launched)')
+    load.add_argument('--stub-port', type=int, default=0, help='with --target: also serve stubs on this port')
+    load.add_argument('--workers', type=int, default=4, help='workers of the launched backend (default 4, as deployed)')
+    load.add_argument('--threads', type=int, default=8, help='threads per worker (default 8)')
+    load.add_argument('--port', type=int, help='port of the launched backend (default: a free one)')
+    load.add_argument('--server-command', help='launch command template: {python} {workers} {threads} {port} {backend}')
+    load.add_argument('--startup-timeout', type=float, default=180.0)
+    load.add_argument('--keep', action='store_true', help="keep the launched backend's scratch directory")
+    load.add_argument('--mix', default='default', help=f"{', '.join(MIXES)} or flow:weight,... ({', '.join(FLOWS)})")
+    load.add_argument('--concurrency', type=int, default=16, help='closed-loop users (default 16)')
+    load.add_argument('--duration', type=float, default=60.0, help='measured seconds (default 60)')
+    load.add_argument('--warmup', type=float, default=10.0, help='unreported seconds first (default 10)')
+    load.add_argument('--think-time', type=float, default=0.0, help='mean pause between flows in seconds')
+    load.add_argument('--upload-sizes', default=','.join(f'{name}:{weight}' for name, weight in UPLOAD_SIZES.items()),
+                      help=f"size:weight,... of {', '.join(SIZES)}")
+    load.add_argument('--variants', type=int, default=4, help='distinct images per upload size')
+    load.add_argument('--unique-text', type=float, default=0.5, help='fraction of prompts made cache misses')
+    load.add_argument('--upstream', choices=('stubs', 'live'), default='stubs',
+                      help='what the launched backend calls: the local stubs (default) or the real services')
+    load.add_argument('--record', metavar='DIR', help="record the launched backend's outbound calls to cassettes in DIR")
+    load.add_argument('--replay', metavar='DIR', help='the launched backend replays outbound calls from DIR (no stubs)')
+    load.add_argument('--replay-latency', default='recorded',
+                      help='recorded (default), scaled:F, offset:S or a synthetic latency spec')
+    load.add_argument('--admin-token', help="the target's ADMIN_TOKEN (enables the debug flow)")
+    load.add_argument('--json', help='write the per-endpoint results to this file')
+    load.set_defaults(handler=command_load)
+    
+    listing = commands.add_parser('list', help='runs in the history')
+    listing.set_defaults(handler=command_list)
+    
+    args = parser.parse_args(argv)
+    if args.command in ('run', 'pareto') and args.repeat < 1:
+        parser.error('--repeat must be at least 1')
+    if args.command == 'load' and (args.concurrency < 1 or args.variants < 1):
+        parser.error('--concurrency and --variants must be at least 1')
+    if args.command == 'load' and args.record and args.replay:
+        parser.error('--record and --replay are exclusive')
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
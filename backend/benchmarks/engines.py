@@ -0,0 +1,67 @@
+"""
+Benchmark Engines
+Every interchangeable super-resolution and restoration implementation
+
+All families expose the same entry points (enhance_super_resolution /
+restore_artifact_image returning (image, metadata)); only the advanced_*
+ones take no mode. The served family (app.py) is the reference that the
+others' outputs are compared against.
+"""
+
+import importlib
+
+# operation -> (module suffix, entry point)
+OPERATIONS = {
+    'super-resolution': ('super_resolution', 'enhance_super_resolution'),
+    'restoration': ('restoration', 'restore_artifact_image')
+}
+
+FAMILIES = ('ultra_fast', 'optimized', 'fast', 'final', 'working', 'simple', 'advanced')
+
+# The family app.py serves
+REFERENCE_FAMILY = 'ultra_fast'
+
+# Entry points without a mode argument
+MODELESS_FAMILIES = ('advanced',)
+
+MODES = ('fast', 'balanced', 'quality', 'ultra')
+
+
+class Engine:
+    """
+    One implementation of one operation
+    """
+    
+    def __init__(self, operation: str, family: str, function):
+        self.operation = operation
+        self.family = family
+        self.function = function
+        self.modeless = family in MODELESS_FAMILIES
+    
+    def modes(self, selected: tuple = MODES) -> tuple:
+        """Modes to run ('-' for engines without modes)"""
+        return ('-',) if self.modeless else selected
+    
+    def run(self, image, intensity: float, mode: str):
+        """Processed image (metadata is dropped)"""
+        if self.modeless:
+            return self.function(image, intensity)[0]
+        return self.function(image, intensity, mode)[0]
+
+
+def load_engine(operation: str, family: str) -> Engine:
+    suffix, entry_point = OPERATIONS[operation]
+    module = importlib.import_module(f'models.{family}_{suffix}')
+    return Engine(operation, family, getattr(module, entry_point))
+
+
+def load_engines(operations: tuple = None, families: tuple = None) -> list:
+    """Engines for the selected operations and families (unimportable ones are skipped)"""
+    engines = []
+    for operation in operations or OPERATIONS:
+        for family in families or FAMILIES:
+            try:
+                engines.append(load_engine(operation, family))
+            except (ImportError, AttributeError) as e:
+                print(f"[BENCH] Skipping {family} {operation}: {e}")
+    return engines
@@ -0,0 +1,160 @@
+"""
+Benchmark History
+Append-only JSONL of runs, and comparison between two of them
+
+One line per run: id, timestamp, label, environment (git commit, Python,
+Pillow, CPU count, platform, engine version), configuration and result
+rows. Rows of two runs are matched on (operation, engine, mode, size).
+
+A row is a regression when:
+1. p50 latency grew by more than the threshold and by more than
+   MIN_SECONDS (timer noise on tiny images)
+2. Peak image buffer bytes grew by more than the threshold
+3. It was identical to the reference output and no longer is, or stopped
+   being deterministic
+4. It errors now and didn't before
+"""
+
+from models.result_cache import ENGINE_VERSION
+import json
+import os
+import platform
+import subprocess
+import time
+import uuid
+
+DEFAULT_HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history.jsonl')
+
+# Latency changes smaller than this are noise, whatever the percentage
+MIN_SECONDS = 0.005
+
+# Environment fields that make timings incomparable when they differ
+HOST_FIELDS = ('platform', 'machine', 'cpu_count', 'python', 'pillow')
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment() -> dict:
+    import PIL
+    return {
+        'commit': _git_commit(),
+        'engine_version': ENGINE_VERSION,
+        'python': platform.python_version(),
+        'pillow': PIL.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def new_run(config: dict, rows: list, label: str = None) -> dict:
+    return {
+        'id': uuid.uuid4().hex[:12],
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'label': label,
+        'environment': environment(),
+        'config': config,
+        'results': rows
+    }
+
+
+def append_run(run: dict, path: str = DEFAULT_HISTORY):
+    with open(path, 'a') as history:
+        history.write(json.dumps(run, separators=(',', ':')) + '\n')
+
+
+def load_runs(path: str = DEFAULT_HISTORY) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path) as history:
+        return [json.loads(line) for line in history if line.strip()]
+
+
+def select_run(runs: list, reference: str) -> dict:
+    """A run by index (-1 = latest), id prefix or label (latest with that label)"""
+    try:
+        return runs[int(reference)]
+    except ValueError:
+        pass
+    except IndexError:
+        raise ValueError(f"No run at index {reference} ({len(runs)} in history)")
+    for run in reversed(runs):
+        if run['id'].startswith(reference) or run.get('label') == reference:
+            return run
+    raise ValueError(f"No run matches '{reference}'")
+
+
+def _key(row: dict) -> tuple:
+    return (row['operation'], row['engine'], row['mode'], row['size'])
+
+
+def _change(base, new):
+    if not base or new is None:
+        return None
+    return new / base - 1
+
+
+def compare_runs(base: dict, new: dict, threshold: float = 0.10) -> tuple:
+    """
+    Row-by-row comparison
+    
+    Returns:
+        (comparisons, regressions, warnings) - each comparison is a dict
+        with both rows, the relative changes and its regression reasons
+    """
+    warnings = []
+    for field in HOST_FIELDS:
+        if base['environment'].get(field) != new['environment'].get(field):
+            warnings.append(f"{field} differs ({base['environment'].get(field)} -> "
+                            f"{new['environment'].get(field)}) - timings are not comparable")
+    
+    base_rows = {_key(row): row for row in base['results']}
+    comparisons = []
+    regressions = 0
+    for row in new['results']:
+        old = base_rows.pop(_key(row), None)
+        reasons = []
+        latency = memory = None
+        if old is None:
+            pass  # new row
+        elif 'error' in row:
+            if 'error' not in old:
+                reasons.append('now fails')
+        elif 'error' not in old:
+            latency = _change(old['p50'], row['p50'])
+            memory = _change(old['peak_image_bytes'], row['peak_image_bytes'])
+            if latency is not None and latency > threshold and row['p50'] - old['p50'] > MIN_SECONDS:
+                reasons.append(f'p50 +{latency:.0%}')
+            if memory is not None and memory > threshold:
+                reasons.append(f'memory +{memory:.0%}')
+            if old.get('identical') and row.get('identical') is False:
+                reasons.append('no longer identical to reference')
+            if old.get('deterministic') and not row.get('deterministic'):
+                reasons.append('no longer deterministic')
+        regressions += bool(reasons)
+        comparisons.append({
+            'key': _key(row), 'base': old, 'new': row,
+            'latency_change': latency, 'memory_change': memory, 'regressions': reasons
+        })
+    for key, old in base_rows.items():
+        comparisons.append({
+            'key': key, 'base': old, 'new': None,
+            'latency_change': None, 'memory_change': None, 'regressions': []
+        })
+    return comparisons, regressions, warnings
+
+
+def describe(run: dict) -> str:
+    environment = run['environment']
+    label = f" [{run['label']}]" if run.get('label') else ''
+    return (f"{run['id']}{label} {run['timestamp']} commit={environment.get('commit')} "
+            f"python={environment.get('python')} pillow={environment.get('pillow')} "
+            f"cpus={environment.get('cpu_count')} rows={len(run['results'])}")
@@ -0,0 +1,627 @@
+"""
+Load Test
+Realistic user flows against every route of app.py, with per-endpoint latency
+
+The engine suite times one pipeline in isolation; this drives the whole
+server - gunicorn workers, thread pools, job pool, shared caches and the
+external Gemini / Wikipedia calls (local stubs, benchmarks/stubs.py):
+1. Flows (FLOWS) are what a frontend session does: upload then process,
+   queue a job and follow it (polling or the SSE progress stream), drag
+   the intensity slider, multi-turn chat, story generation and follow-ups,
+   artifact lookups with Wikipedia, blob thumbnails and analysis outputs,
+   monitoring scrapes, and (with an admin token) profiles, traces and
+   flamegraphs. Together they reach every route
+2. A mix (MIXES, or 'flow:weight,...') weights the flows. Uploads are
+   synthetic scans of weighted sizes (UPLOAD_SIZES), drawn from --variants
+   images per size, so re-uploads hit the dedup path at a controllable
+   rate. --unique-text is the fraction of chat prompts and artifact
+   queries made unique - guaranteed misses in the shared llm / wikipedia
+   caches
+3. --concurrency closed-loop users run flows back to back (with optional
+   exponential think time) for --duration seconds; requests that start
+   during --warmup are not reported
+4. Every HTTP request is recorded under its route (e.g. 'POST
+   /api/process-image'): count, throughput, p50 / p95 / p99 / max latency
+   and error rate (status >= 400 or no response). Followed jobs are also
+   recorded end to end as 'job: submit to done'
+5. Failures that never reach a client - shared-cache lock contention, pool
+   jobs that fail after their 202, worker timeouts - are counted from the
+   launched server's log (server_log_errors()), so a run with no HTTP
+   errors can still be told apart from a clean one
+
+launch_server() starts gunicorn with the worker configuration under test
+in a scratch directory - fresh uploads, stores and shared caches - with
+the stub environment, so nothing reaches Google or Wikipedia (or with
+OUTBOUND_MODE=record / replay, see models/outbound.py).
+"""
+
+from .suite import percentile
+from .synthetic import SIZES, synthetic_image
+import io
+import os
+import random
+import re
+import requests
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Upload size -> weight (named sizes from benchmarks/synthetic.py)
+UPLOAD_SIZES = {'vga': 6, 'hd': 3, 'scan-12mp': 1}
+
+# Per-request timeout; pipelines on large scans can take this long
+REQUEST_TIMEOUT = 300
+
+# A followed job that isn't done by then counts as failed
+JOB_TIMEOUT = 600
+JOB_POLL_INTERVAL = 0.5
+
+DEFAULT_SERVER_COMMAND = ('{python} -m gunicorn -c {backend}/gunicorn.conf.py -w {workers} --threads {threads} '
+                          '--graceful-timeout 120 -b 127.0.0.1:{port} --pythonpath {backend} app:app')
+
+PROCESS_TYPES = ('super-resolution', 'restoration')
+PROCESS_MODES = ('auto', 'auto', 'fast', 'balanced', 'quality')
+ANALYSIS_OUTPUTS = ('edge_detection', 'heat_map', 'detail_enhancement', 'luminance_analysis', 'texture_map')
+
+ARTIFACTS = (
+    ('amphora', 'Greek'),
+    ('terracotta warrior', 'Chinese'),
+    ('scarab amulet', 'Egyptian'),
+    ('bronze mirror', 'Etruscan'),
+    ('jade mask', 'Maya'),
+    ('cuneiform tablet', 'Sumerian'),
+    ('runestone', 'Norse'),
+    ('oil lamp', 'Roman'),
+    ('Buddha statue', 'Gandhara'),
+    ('ceremonial axe', 'Bronze Age')
+)
+
+QUESTIONS = (
+    'How old is this {artifact} likely to be?',
+    'How did {civilization} craftsmen make a {artifact}?',
+    'What was a {artifact} used for in {civilization} society?',
+    'How should a {artifact} like this be conserved?',
+    'Which museums hold {civilization} {artifact}s?'
+)
+
+STORY_REQUESTS = (
+    'Develop the protagonist and their motivation',
+    'Describe the world and the society around the artifact',
+    'Suggest a plot twist for the ending',
+    'What technology could explain the artifact?'
+)
+
+GENRES = ('science-fiction', 'cyberpunk', 'space-opera', 'time-travel', 'steampunk', 'solarpunk', 'alien-contact')
+
+
+class Recorder:
+    """Every request's outcome, from all users (requests started in the warm-up are dropped)"""
+    
+    def __init__(self, warmup_until: float = 0.0):
+        self.warmup_until = warmup_until
+        self.samples = []
+        self.lock = threading.Lock()
+    
+    def add(self, name: str, start: float, latency: float, status: int, size: int = 0):
+        if start < self.warmup_until:
+            return
+        with self.lock:
+            self.samples.append((name, latency, status, size))
+
+
+class UploadImages:
+    """Encoded synthetic scans: `variants` per size, drawn by size weight"""
+    
+    def __init__(self, sizes: dict = None, variants: int = 4, quality: int = 90):
+        self.sizes = sizes or UPLOAD_SIZES
+        self.images = {}
+        for name in self.sizes:
+            width, height = SIZES[name]
+            self.images[name] = []
+            for seed in range(variants):
+                buffer = io.BytesIO()
+                synthetic_image(width, height, seed).save(buffer, 'JPEG', quality=quality)
+                self.images[name].append(buffer.getvalue())
+    
+    def pick(self, rng: random.Random) -> bytes:
+        name = rng.choices(list(self.sizes), weights=list(self.sizes.values()))[0]
+        return rng.choice(self.images[name])
+
+
+class SharedState:
+    """Image handles uploaded by any user, reused by later flows"""
+    
+    def __init__(self, keep: int = 64):
+        self.keep = keep
+        self.handles = []
+        self.lock = threading.Lock()
+    
+    def add_handle(self, handle: str):
+        with self.lock:
+            self.handles.append(handle)
+            del self.handles[:-self.keep]
+    
+    def handle(self, rng: random.Random):
+        with self.lock:
+            return rng.choice(self.handles) if self.handles else None
+
+
+class User:
+    """
+    One closed-loop virtual user: its HTTP session and random stream, and
+    the requests that flows make through it
+    """
+    
+    def __init__(self, base_url: str, recorder: Recorder, state: SharedState, uploads: UploadImages,
+                 rng: random.Random, unique_text: float = 0.5, admin_token: str = None):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.state = state
+        self.uploads = uploads
+        self.rng = rng
+        self.unique_text = unique_text
+        self.admin_token = admin_token
+        self.http = requests.Session()
+    
+    def call(self, name: str, method: str, path: str, **kwargs):
+        """One recorded request; None when there was no response at all"""
+        kwargs.setdefault('timeout', REQUEST_TIMEOUT)
+        start = time.time()
+        try:
+            response = self.http.request(method, self.base_url + path, **kwargs)
+            size = len(response.content)
+        except requests.RequestException:
+            self.recorder.add(name, start, time.time() - start, 0)
+            return None
+        self.recorder.add(name, start, time.time() - start, response.status_code, size)
+        return response
+    
+    @staticmethod
+    def payload(response) -> dict:
+        """JSON body of a successful response, else {}"""
+        if response is None or response.status_code >= 400:
+            return {}
+        try:
+            data = response.json()
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+    
+    def upload(self):
+        response = self.call('POST /api/images', 'POST', '/api/images', data=self.uploads.pick(self.rng),
+                             headers={'Content-Type': 'image/jpeg'})
+        handle = self.payload(response).get('handle')
+        if handle:
+            self.state.add_handle(handle)
+        return handle
+    
+    def image_handle(self):
+        """A recently uploaded image (most of the time), or a new upload"""
+        if self.rng.random() < 0.8:
+            handle = self.state.handle(self.rng)
+            if handle:
+                return handle
+        return self.upload()
+    
+    def text(self, template: str) -> tuple:
+        """A question about a random artifact - unique (never cached) with probability unique_text"""
+        artifact, civilization = self.rng.choice(ARTIFACTS)
+        text = template.format(artifact=artifact, civilization=civilization)
+        if self.rng.random() < self.unique_text:
+            text += f' (ref {uuid.uuid4().hex[:8]})'
+        return text, artifact, civilization
+
+
+def flow_browse(user: User):
+    user.call('GET /', 'GET', '/')
+    user.call('GET /api/health', 'GET', '/api/health')
+
+
+def flow_upload(user: User):
+    handle = user.upload()
+    if handle:
+        user.call('GET /api/images/<handle>', 'GET', f'/api/images/{handle}')
+
+
+def flow_process(user: User):
+    """Process a stored image; half the time as a blob URL that is then fetched"""
+    handle = user.image_handle()
+    if not handle:
+        return
+    response_mode = user.rng.choice(('json', 'url'))
+    response = user.call('POST /api/process-image', 'POST', '/api/process-image', data={
+        'image_handle': handle,
+        'process_type': user.rng.choice(PROCESS_TYPES),
+        'mode': user.rng.choice(PROCESS_MODES),
+        'intensity': user.rng.choice((0.25, 0.5, 0.75, 1.0)),
+        'response': response_mode
+    })
+    blob_id = user.payload(response).get('blob_id')
+    if blob_id:
+        user.call('GET /blobs/<id>', 'GET', f'/blobs/{blob_id}')
+
+
+def flow_job(user: User):
+    """
+    Queue a job and follow it to the end - by polling or on the progress
+    stream; one in ten is cancelled instead
+    """
+    handle = user.image_handle()
+    if not handle:
+        return
+    start = time.time()
+    response = user.call('POST /api/jobs', 'POST', '/api/jobs', data={
+        'image_handle': handle,
+        'process_type': user.rng.choice(PROCESS_TYPES),
+        'mode': user.rng.choice(PROCESS_MODES),
+        'intensity': user.rng.choice((0.25, 0.5, 0.75, 1.0))
+    })
+    job = user.payload(response)
+    if not job.get('job_id'):
+        return
+    job_id = job['job_id']
+    if job['status'] == 'done':
+        user.recorder.add('job: submit to done', start, time.time() - start, 200)
+        return
+    
+    if user.rng.random() < 0.1:
+        user.call('DELETE /api/jobs/<id>', 'DELETE', f'/api/jobs/{job_id}')
+        return
+    
+    if user.rng.random() < 0.5:
+        # The stream ends by itself after the job's last event
+        user.call('GET /api/progress/<id>', 'GET', f'/api/progress/{job_id}', timeout=JOB_TIMEOUT)
+    
+    status = None
+    while time.time() - start < JOB_TIMEOUT:
+        response = user.call('GET /api/jobs/<id>', 'GET', f'/api/jobs/{job_id}')
+        status = user.payload(response).get('status')
+        if status is None or status in ('done', 'failed', 'cancelled', 'expired'):
+            break
+        time.sleep(JOB_POLL_INTERVAL)
+    user.recorder.add('job: submit to done', start, time.time() - start, 200 if status == 'done' else 500)
+
+
+def flow_scrub(user: User):
+    """Start a scrub session and drag the slider through a few intensities"""
+    handle = user.image_handle()
+    if not handle:
+        return
+    response = user.call('POST /api/scrub/start', 'POST', '/api/scrub/start', data={
+        'image_handle': handle,
+        'process_type': user.rng.choice(PROCESS_TYPES),
+        'intensity': 0.75
+    })
+    session_id = user.payload(response).get('session_id')
+    if not session_id:
+        return
+    for _ in range(user.rng.randint(3, 8)):
+        user.call('POST /api/scrub/render', 'POST', '/api/scrub/render',
+                  json={'session_id': session_id, 'intensity': round(user.rng.random(), 2)})
+
+
+def flow_analyze(user: User):
+    """Automatic analysis (with its Wikipedia lookup) of a stored image"""
+    handle = user.image_handle()
+    if handle:
+        user.call('POST /api/auto-analyze', 'POST', '/api/auto-analyze', json={'image_handle': handle})
+
+
+def flow_blob(user: User):
+    """Store an upload as a blob, fetch it, its thumbnail (sometimes revalidated) and an analysis output"""
+    response = user.call('POST /api/blobs', 'POST', '/api/blobs', data=user.uploads.pick(user.rng),
+                         headers={'Content-Type': 'image/jpeg'})
+    blob_id = user.payload(response).get('id')
+    if not blob_id:
+        return
+    user.call('GET /blobs/<id>', 'GET', f'/blobs/{blob_id}')
+    response = user.call('GET /blobs/<id>/thumbnail', 'GET', f'/blobs/{blob_id}/thumbnail')
+    etag = response.headers.get('ETag') if response is not None else None
+    if etag and user.rng.random() < 0.3:
+        user.call('GET /blobs/<id>/thumbnail', 'GET', f'/blobs/{blob_id}/thumbnail', headers={'If-None-Match': etag})
+    output = user.rng.choice(ANALYSIS_OUTPUTS)
+    user.call('GET /blobs/<id>/analysis/<output>', 'GET', f'/blobs/{blob_id}/analysis/{output}')
+
+
+def flow_artifact(user: User):
+    handle = user.image_handle()
+    if handle:
+        user.call('POST /api/analyze-artifact', 'POST', '/api/analyze-artifact', json={'image_url': handle})
+
+
+def flow_chat(user: User):
+    """A short Gemini conversation, about an uploaded image a third of the time"""
+    context = {}
+    if user.rng.random() < 0.3:
+        handle = user.image_handle()
+        if handle:
+            context = {'hasImage': True, 'imageHandle': handle}
+    for _ in range(user.rng.randint(1, 3)):
+        message, _, _ = user.text(user.rng.choice(QUESTIONS))
+        user.call('POST /api/gemini-chat', 'POST', '/api/gemini-chat', json={'message': message, 'context': context})
+
+
+def flow_historical(user: User):
+    """Historical information - Wikipedia lookups, then Gemini"""
+    query, artifact, civilization = user.text(user.rng.choice(QUESTIONS))
+    if user.rng.random() < user.unique_text:
+        artifact = f'{artifact} {uuid.uuid4().hex[:6]}'
+    user.call('POST /api/historical-info', 'POST', '/api/historical-info', json={
+        'query': query,
+        'artifact_context': {'artifact_type': artifact, 'civilization': civilization},
+        'use_wikipedia': True
+    })
+
+
+def flow_story(user: User):
+    """A story concept from an uploaded image, then a few development turns"""
+    handle = user.image_handle()
+    if not handle:
+        return
+    genres = user.rng.sample(GENRES, user.rng.randint(1, 3))
+    prompt, _, _ = user.text('Write a story about this {civilization} {artifact}')
+    response = user.call('POST /api/scifi-story-generate', 'POST', '/api/scifi-story-generate', json={
+        'imageHandle': handle,
+        'prompt': prompt,
+        'genres': genres
+    })
+    story = user.payload(response).get('storyIdea')
+    if not story:
+        return
+    messages = [{'role': 'assistant', 'content': story}]
+    for _ in range(user.rng.randint(1, 2)):
+        message, _, _ = user.text(user.rng.choice(STORY_REQUESTS))
+        response = user.call('POST /api/scifi-chat', 'POST', '/api/scifi-chat', json={
+            'message': message,
+            'context': {'previousMessages': messages, 'genres': genres}
+        })
+        messages += [{'role': 'user', 'content': message},
+                     {'role': 'assistant', 'content': user.payload(response).get('response', '')}]
+
+
+def flow_monitor(user: User):
+    """What a metrics scraper and a dashboard poll"""
+    user.call('GET /metrics', 'GET', '/metrics')
+    user.call('GET /api/cache/stats', 'GET', '/api/cache/stats')
+    user.call('GET /api/jobs/stats', 'GET', '/api/jobs/stats')
+
+
+def flow_debug(user: User):
+    """A profiled, traced chat turn, its profile and trace, and the host flamegraph (admin token)"""
+    headers = {'X-Admin-Token': user.admin_token, 'X-Trace': '1'}
+    message, _, _ = user.text(user.rng.choice(QUESTIONS))
+    response = user.call('POST /api/gemini-chat', 'POST', '/api/gemini-chat', params={'profile': '1'},
+                         headers=headers, json={'message': message, 'context': {}})
+    if response is None:
+        return
+    profile_id = response.headers.get('X-Profile-Id')
+    trace_id = response.headers.get('X-Trace-Id')
+    if profile_id:
+        user.call('GET /api/profiles/<id>', 'GET', f'/api/profiles/{profile_id}', headers=headers)
+    if trace_id:
+        user.call('GET /api/traces/<id>', 'GET', f'/api/traces/{trace_id}', headers=headers)
+    user.call('GET /api/debug/flamegraph', 'GET', '/api/debug/flamegraph', params={'format': 'stats'}, headers=headers)
+
+
+FLOWS = {
+    'browse': flow_browse,
+    'upload': flow_upload,
+    'process': flow_process,
+    'job': flow_job,
+    'scrub': flow_scrub,
+    'analyze': flow_analyze,
+    'blob': flow_blob,
+    'artifact': flow_artifact,
+    'chat': flow_chat,
+    'historical': flow_historical,
+    'story': flow_story,
+    'monitor': flow_monitor,
+    'debug': flow_debug
+}
+
+# Flows that need an admin token
+ADMIN_FLOWS = ('debug',)
+
+# Mix name -> flow weights
+MIXES = {
+    # A frontend session: mostly chat and processing of a few uploads
+    'default': {'browse': 3, 'upload': 8, 'process': 12, 'job': 8, 'scrub': 5, 'analyze': 8, 'blob': 6,
+                'artifact': 2, 'chat': 22, 'historical': 10, 'story': 8, 'monitor': 2},
+    'images': {'upload': 25, 'blob': 20, 'process': 25, 'job': 15, 'scrub': 10, 'analyze': 5},
+    'chat': {'chat': 50, 'historical': 25, 'story': 25},
+    # Every flow (and so every route) equally often
+    'all': {name: 1 for name in FLOWS}
+}
+
+
+def parse_weights(text: str, known, default_weights: dict = None) -> dict:
+    """
+    'name:weight,name,...' (weight 1 when omitted), or a key of
+    default_weights
+    """
+    if default_weights and text in default_weights:
+        return dict(default_weights[text])
+    weights = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        name, _, weight = item.partition(':')
+        if name not in known:
+            raise ValueError(f"Unknown '{name}' (use one of {', '.join(known)})")
+        try:
+            weights[name] = float(weight) if weight else 1.0
+        except ValueError:
+            raise ValueError(f"Weight of '{name}' must be a number")
+        if weights[name] < 0:
+            raise ValueError(f"Weight of '{name}' must not be negative")
+    if not any(weights.values()):
+        raise ValueError(f"'{text}' selects nothing")
+    return weights
+
+
+def run_load(base_url: str, mix: dict, concurrency: int = 16, duration: float = 60.0, warmup: float = 0.0,
+             think_time: float = 0.0, uploads: UploadImages = None, unique_text: float = 0.5,
+             admin_token: str = None, seed: int = 0) -> tuple:
+    """
+    Run `concurrency` users on the mix for warmup + duration seconds
+    
+    Flows still running at the deadline finish (and are reported).
+    
+    Returns:
+        (recorder, measured seconds, flows run by name)
+    """
+    if not admin_token:
+        mix = {name: weight for name, weight in mix.items() if name not in ADMIN_FLOWS}
+    uploads = uploads or UploadImages()
+    start = time.time()
+    recorder = Recorder(start + warmup)
+    state = SharedState()
+    deadline = start + warmup + duration
+    flows_run = {name: 0 for name in mix}
+    names, weights = list(mix), list(mix.values())
+    
+    def user_loop(index: int):
+        rng = random.Random(f'{seed}:{index}')
+        user = User(base_url, recorder, state, uploads, rng, unique_text, admin_token)
+        while time.time() < deadline:
+            name = rng.choices(names, weights=weights)[0]
+            flow_start = time.time()
+            try:
+                FLOWS[name](user)
+            except Exception as e:
+                # A flow choking on an unexpected response is a failure of that flow
+                recorder.add(f'flow {name}: {type(e).__name__}', flow_start, time.time() - flow_start, 0)
+            with recorder.lock:
+                flows_run[name] += 1
+            if think_time:
+                time.sleep(min(rng.expovariate(1 / think_time), max(0.0, deadline - time.time())))
+    
+    users = [threading.Thread(target=user_loop, args=(index,), name=f'load-user-{index}', daemon=True)
+             for index in range(concurrency)]
+    for thread in users:
+        thread.start()
+    for thread in users:
+        thread.join()
+    return recorder, max(time.time() - recorder.warmup_until, 1e-9), flows_run
+
+
+def summarize(samples: list, elapsed: float) -> list:
+    """
+    Per-endpoint statistics of (name, latency, status, size) samples, and a
+    'TOTAL' row last
+    
+    Returns:
+        rows - count, throughput (req/s), error rate, status counts and
+        latency percentiles in seconds
+    """
+    groups = {}
+    for sample in samples:
+        groups.setdefault(sample[0], []).append(sample)
+    
+    def row(name, group):
+        latencies = [latency for _, latency, _, _ in group]
+        statuses = {}
+        for _, _, status, _ in group:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        errors = sum(1 for _, _, status, _ in group if status == 0 or status >= 400)
+        return {
+            'endpoint': name,
+            'count': len(group),
+            'throughput': round(len(group) / elapsed, 3),
+            'errors': errors,
+            'error_rate': round(errors / len(group), 4),
+            'statuses': statuses,
+            'p50': round(percentile(latencies, 0.5), 5),
+            'p95': round(percentile(latencies, 0.95), 5),
+            'p99': round(percentile(latencies, 0.99), 5),
+            'max': round(max(latencies), 5),
+            'mean': round(sum(latencies) / len(latencies), 5),
+            'bytes': sum(size for _, _, _, size in group)
+        }
+    
+    rows = [row(name, group) for name, group in sorted(groups.items())]
+    # Job lifetimes overlap their own requests - they aren't part of the total
+    requests_only = [sample for sample in samples if not sample[0].startswith(('job:', 'flow '))]
+    if requests_only:
+        rows.append(row('TOTAL', requests_only))
+    return rows
+
+
+def launch_server(port: int, workers: int, threads: int, env: dict, workdir: str, command: str = None):
+    """
+    Start the backend in workdir (its uploads, stores and shared caches
+    start empty there) with the extra environment
+    
+    command: template with {python} {workers} {threads} {port} {backend}
+    (default: gunicorn as deployed)
+    
+    Returns:
+        the server process (output in workdir/server.log)
+    """
+    argv = shlex.split((command or DEFAULT_SERVER_COMMAND).format(
+        python=shlex.quote(sys.executable), workers=workers, threads=threads, port=port,
+        backend=shlex.quote(BACKEND_DIR)
+    ))
+    log_file = open(os.path.join(workdir, 'server.log'), 'wb')
+    return subprocess.Popen(
+        argv, cwd=workdir, stdout=log_file, stderr=subprocess.STDOUT,
+        env={**os.environ, 'WEB_WORKERS': str(workers), 'WEB_THREADS': str(threads), **env},
+        start_new_session=True
+    )
+
+
+# Server log lines that mean a run was not clean: label -> pattern whose
+# group is the message (ids stripped, so repeats count together)
+SERVER_LOG_ERRORS = {
+    'shared cache': re.compile(r'Shared cache (\w+ error: .*)'),
+    'failed jobs': re.compile(r'Job \w+ failed: (.*)'),
+    'worker timeouts': re.compile(r'(WORKER TIMEOUT)'),
+    'tracebacks': re.compile(r'^(Traceback) \(most recent call last\)')
+}
+
+
+def server_log_errors(workdir: str) -> dict:
+    """Errors in workdir/server.log as {label: {message: count}} (empty = clean)"""
+    errors = {}
+    try:
+        with open(os.path.join(workdir, 'server.log'), errors='replace') as lines:
+            for line in lines:
+                for label, pattern in SERVER_LOG_ERRORS.items():
+                    match = pattern.search(line)
+                    if match:
+                        messages = errors.setdefault(label, {})
+                        messages[match.group(1)] = messages.get(match.group(1), 0) + 1
+    except FileNotFoundError:
+        pass
+    return errors
+
+
+def wait_until_ready(base_url: str, process=None, timeout: float = 180.0) -> bool:
+    """Poll /api/health until it answers 200 (False on timeout or if the process exits)"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            if requests.get(f"{base_url.rstrip('/')}/api/health", timeout=5).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def stop_server(process, timeout: float = 30.0):
+    """Graceful stop (SIGTERM to the whole process group), then SIGKILL"""
+    if process.poll() is not None:
+        return
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
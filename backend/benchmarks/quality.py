@@ -0,0 +1,224 @@
+"""
+Quality Benchmark
+Measured PSNR / SSIM against wall time - a Pareto frontier per operation
+
+The psnr / ssim in the engines' metadata are table lookups plus
+intensity, so they can't say whether ULTRA's extra seconds buy anything
+over QUALITY. Here quality is measured:
+1. A clean synthetic scan is degraded in controlled ways (DEGRADATIONS) -
+   noise, blur, fading, JPEG artifacts, downsampling. Super-resolution
+   inputs are always downsampled by SCALE first, so its output lines up
+   with the clean image
+2. Every engine x mode x intensity processes every degradation, timed
+   like the suite (benchmarks/suite.py - cold caches, p50 of REPEAT runs)
+3. PSNR and SSIM of the output against the clean image, on BT.601 luma.
+   SSIM uses 7x7 windows (Wang et al. constants, sample covariance - the
+   scikit-image defaults), computed for every window at once from
+   summed-area tables
+4. Per (engine, mode, intensity), quality and time are averaged over the
+   degradations. A point is on the frontier when no other point is at
+   least as good on the quality metric and at least as fast, and
+   strictly better on one
+
+The 'input' baseline (the degraded image itself; Lanczos-upscaled for
+super-resolution) shows whether processing helps at all.
+"""
+
+from PIL import Image, ImageEnhance, ImageFilter
+from .engines import MODES
+from .suite import measure
+from .synthetic import synthetic_image
+import io
+import numpy as np
+
+# Super-resolution factor of every engine
+SCALE = 2
+
+# SSIM window edge and constants (dynamic range 255)
+SSIM_WINDOW = 7
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
+# Identical images would have infinite PSNR
+PSNR_MAX = 100.0
+
+INTENSITIES = (0.25, 0.5, 0.75, 1.0)
+
+DEFAULT_QUALITY_SIZE = (800, 600)
+
+_LUMA = np.array([0.299, 0.587, 0.114])
+
+
+def _noise(image, seed: int = 0):
+    pixels = np.asarray(image, dtype=np.float64)
+    noisy = pixels + np.random.default_rng(seed).normal(0, 12, pixels.shape)
+    return Image.fromarray(np.clip(noisy + 0.5, 0, 255).astype(np.uint8))
+
+
+def _blur(image):
+    return image.filter(ImageFilter.GaussianBlur(2))
+
+
+def _fading(image):
+    faded = ImageEnhance.Color(ImageEnhance.Contrast(image).enhance(0.6)).enhance(0.5)
+    return Image.blend(faded, Image.new('RGB', image.size, (204, 182, 140)), 0.15)
+
+
+def _jpeg(image):
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=20)
+    return Image.open(io.BytesIO(buffer.getvalue())).convert('RGB')
+
+
+def _downsample(image):
+    small = image.reduce(SCALE)
+    return small.resize(image.size, Image.Resampling.BILINEAR)
+
+
+# name -> function(clean image) -> degraded image of the same size
+DEGRADATIONS = {
+    'noise': _noise,
+    'blur': _blur,
+    'fading': _fading,
+    'jpeg': _jpeg,
+    'downsample': _downsample
+}
+
+
+def degraded_input(clean, degradation: str, operation: str):
+    """Engine input for a degradation (super-resolution: degraded, then downsampled by SCALE)"""
+    image = DEGRADATIONS[degradation](clean)
+    if operation == 'super-resolution':
+        image = image.reduce(SCALE) if degradation != 'downsample' else clean.reduce(SCALE)
+    return image
+
+
+def _luma(image) -> np.ndarray:
+    return np.asarray(image.convert('RGB'), dtype=np.float64) @ _LUMA
+
+
+def psnr(output, reference) -> float:
+    """Peak signal-to-noise ratio in dB on luma (capped at PSNR_MAX for identical images)"""
+    mse = np.mean((_luma(output) - _luma(reference)) ** 2)
+    return PSNR_MAX if mse == 0 else min(PSNR_MAX, float(10 * np.log10(255 ** 2 / mse)))
+
+
+def _window_sums(values: np.ndarray, window: int) -> np.ndarray:
+    """Sum over every window x window block ('valid' windows) via a summed-area table"""
+    table = np.zeros((values.shape[0] + 1, values.shape[1] + 1))
+    table[1:, 1:] = values.cumsum(0).cumsum(1)
+    return (table[window:, window:] - table[:-window, window:]
+            - table[window:, :-window] + table[:-window, :-window])
+
+
+def ssim(output, reference, window: int = SSIM_WINDOW) -> float:
+    """Mean structural similarity on luma over all window x window windows"""
+    x, y = _luma(output), _luma(reference)
+    count = window * window
+    mean_x = _window_sums(x, window) / count
+    mean_y = _window_sums(y, window) / count
+    # Sample (co)variances, as in scikit-image
+    correction = count / (count - 1)
+    var_x = (_window_sums(x * x, window) / count - mean_x ** 2) * correction
+    var_y = (_window_sums(y * y, window) / count - mean_y ** 2) * correction
+    covariance = (_window_sums(x * y, window) / count - mean_x * mean_y) * correction
+    
+    numerator = (2 * mean_x * mean_y + SSIM_C1) * (2 * covariance + SSIM_C2)
+    denominator = (mean_x ** 2 + mean_y ** 2 + SSIM_C1) * (var_x + var_y + SSIM_C2)
+    return float(np.mean(numerator / denominator))
+
+
+def score(output, clean) -> dict:
+    """PSNR / SSIM of an output against the clean image (resized to match if needed)"""
+    resized = output.size != clean.size
+    if resized:
+        output = output.resize(clean.size, Image.Resampling.LANCZOS)
+    return {'psnr': round(psnr(output, clean), 3), 'ssim': round(ssim(output, clean), 5), 'resized': resized}
+
+
+def pareto_frontier(points: list, metric: str = 'ssim') -> list:
+    """Points not dominated on (p50 lower, metric higher) - sorted by time"""
+    frontier = []
+    for point in sorted(points, key=lambda point: (point['p50'], -point[metric])):
+        if not frontier or point[metric] > frontier[-1][metric]:
+            frontier.append(point)
+    return frontier
+
+
+def run_quality(engines: list, size: tuple = DEFAULT_QUALITY_SIZE, intensities: tuple = INTENSITIES,
+                modes: tuple = MODES, degradations: tuple = tuple(DEGRADATIONS), repeat: int = 3,
+                on_row=None) -> list:
+    """
+    Measure every engine x mode x intensity on every degradation
+    
+    Returns:
+        rows - one per (operation, engine, mode, intensity, degradation),
+        including the 'input' baseline (p50 0)
+    """
+    width, height = size
+    clean = synthetic_image(width - width % SCALE, height - height % SCALE)
+    rows = []
+    for operation in dict.fromkeys(engine.operation for engine in engines):
+        for degradation in degradations:
+            image = degraded_input(clean, degradation, operation)
+            baseline = image.resize(clean.size, Image.Resampling.LANCZOS) if image.size != clean.size else image
+            row = {'operation': operation, 'engine': 'input', 'mode': '-', 'intensity': None,
+                   'degradation': degradation, 'p50': 0.0, 'mp_per_s': None, **score(baseline, clean)}
+            rows.append(row)
+            if on_row:
+                on_row(row)
+            
+            for engine in engines:
+                if engine.operation != operation:
+                    continue
+                for mode in engine.modes(modes):
+                    for intensity in intensities:
+                        row = {'operation': operation, 'engine': engine.family, 'mode': mode,
+                               'intensity': intensity, 'degradation': degradation}
+                        try:
+                            measured, output = measure(engine, image, intensity, mode, repeat)
+                            row.update({'p50': measured['p50'], 'mp_per_s': measured['mp_per_s'],
+                                        **score(output, clean)})
+                        except Exception as e:
+                            row['error'] = f'{type(e).__name__}: {e}'
+                        rows.append(row)
+                        if on_row:
+                            on_row(row)
+    return rows
+
+
+def summarize(rows: list, metric: str = 'ssim') -> dict:
+    """
+    Average each (engine, mode, intensity) over the degradations and mark
+    the frontier
+    
+    Returns:
+        {operation: [point, ...]} - points sorted by p50, with 'frontier'
+    """
+    groups = {}
+    for row in rows:
+        if 'error' in row:
+            continue
+        key = (row['operation'], row['engine'], row['mode'], row['intensity'])
+        groups.setdefault(key, []).append(row)
+    
+    summary = {}
+    for (operation, engine, mode, intensity), group in groups.items():
+        throughputs = [row['mp_per_s'] for row in group if row['mp_per_s']]
+        summary.setdefault(operation, []).append({
+            'engine': engine,
+            'mode': mode,
+            'intensity': intensity,
+            'degradations': len(group),
+            'p50': round(sum(row['p50'] for row in group) / len(group), 5),
+            'mp_per_s': round(sum(throughputs) / len(throughputs), 3) if throughputs else None,
+            'psnr': round(sum(row['psnr'] for row in group) / len(group), 3),
+            'ssim': round(sum(row['ssim'] for row in group) / len(group), 5)
+        })
+    
+    for points in summary.values():
+        frontier = {id(point) for point in pareto_frontier(points, metric)}
+        for point in points:
+            point['frontier'] = id(point) in frontier
+        points.sort(key=lambda point: point['p50'])
+    return summary
@@ -0,0 +1,299 @@
+"""
+Load-Test Stubs
+Local stand-ins for the Gemini API and MediaWiki
+
+A load test must not spend Gemini quota or hammer en.wikipedia.org, but
+the backend's latency under load is dominated by those calls. One local
+HTTP server answers both, shaped like the real services:
+1. Gemini - POST /<version>/models/<model>:generateContent, the REST call
+   behind genai.GenerativeModel.generate_content (the backend switches to
+   the REST transport when GEMINI_API_ENDPOINT is set). The answer is
+   ANSWER_WORDS words of plausible prose, varied by the prompt
+2. MediaWiki - GET /w/api.php with action=opensearch (titles derived from
+   the search) and action=query (an extract, full URL and thumbnail per
+   title), in the formats the backend parses
+3. Each service has its own latency distribution (LatencyModel, shared
+   with replay in models/outbound.py) and error rate. Errors are what the
+   real services return under load: 429 / 503 with the service's error
+   body
+4. GET /stats - requests, injected errors and injected latency per service
+
+Threaded, with HTTP/1.1 keep-alive, so the stubs never become the
+bottleneck of the backend they stand in for.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from models.outbound import LatencyModel
+from urllib.parse import urlparse, parse_qs, quote
+import json
+import random
+import re
+import threading
+import time
+import zlib
+
+# Typical latency of the real services (LatencyModel specs)
+DEFAULT_GEMINI_LATENCY = 'lognormal:0.9,0.4'
+DEFAULT_WIKIPEDIA_LATENCY = 'lognormal:0.12,0.5'
+
+# Length of a stub Gemini answer
+ANSWER_WORDS = 180
+
+_GENERATE = re.compile(r'^/v\d\w*/models/([\w.\-]+):generateContent$')
+
+_SENTENCES = (
+    "The artifact's form suggests a ceremonial rather than everyday use.",
+    "Tool marks along the edges point to skilled workshop production.",
+    "Similar pieces appear in burial contexts across the region.",
+    "Weathering of the surface is consistent with long burial in dry soil.",
+    "Its decoration echoes motifs found on contemporary pottery and textiles.",
+    "Trade routes of the period would explain the imported raw material.",
+    "Later repairs show the object was valued long after it was made.",
+    "Comparable examples are held in several major museum collections.",
+    "The proportions follow conventions documented in period workshops.",
+    "Residue analysis could confirm what the vessel once contained.",
+    "A story could open with the artifact humming to life in a sealed vault.",
+    "The protagonist, an archivist, realizes the inscription is a star map.",
+    "Corporate salvagers want the relic for the energy it quietly stores.",
+    "Every owner of the object dreams of the same drowned city.",
+    "The twist: the artifact was sent back in time as a warning."
+)
+
+_ERRORS = {
+    'gemini': (
+        (429, {'error': {'code': 429, 'message': 'Resource has been exhausted (e.g. check quota).',
+                         'status': 'RESOURCE_EXHAUSTED'}}),
+        (503, {'error': {'code': 503, 'message': 'The model is overloaded. Please try again later.',
+                         'status': 'UNAVAILABLE'}})
+    ),
+    'wikipedia': (
+        (429, {'error': {'code': 'ratelimited', 'info': 'You have exceeded your rate limit.'}}),
+        (503, {'error': {'code': 'internal_api_error', 'info': 'Service temporarily unavailable.'}})
+    )
+}
+
+
+class _Service:
+    """Latency, error rate and counters of one stubbed service"""
+    
+    def __init__(self, latency: str, error_rate: float):
+        if not 0 <= error_rate <= 1:
+            raise ValueError('Error rates must be between 0 and 1')
+        self.latency = LatencyModel(latency)
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self.delay = 0.0
+        self.by_call = {}
+    
+    def stats(self) -> dict:
+        return {
+            'latency': self.latency.spec,
+            'error_rate': self.error_rate,
+            'requests': self.requests,
+            'injected_errors': self.errors,
+            'injected_latency_seconds': round(self.delay, 3),
+            'by_call': dict(self.by_call)
+        }
+
+
+def _words(text: str) -> int:
+    return len(text.split())
+
+
+def _answer(prompt: str, words: int) -> str:
+    """Deterministic prose of about `words` words, varied by the prompt"""
+    rng = random.Random(zlib.crc32(prompt.encode()))
+    sentences = []
+    count = 0
+    while count < words:
+        sentence = rng.choice(_SENTENCES)
+        sentences.append(sentence)
+        count += _words(sentence)
+    paragraphs = [' '.join(sentences[start:start + 4]) for start in range(0, len(sentences), 4)]
+    return '\n\n'.join(paragraphs)
+
+
+def _title(text: str) -> str:
+    return ' '.join(word.capitalize() for word in text.split()) or 'Archaeology'
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Gemini and MediaWiki stand-ins on one local port
+    
+    Call start() to serve from a daemon thread; env() gives the backend's
+    environment overrides pointing at it.
+    """
+    
+    daemon_threads = True
+    
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 gemini_latency: str = DEFAULT_GEMINI_LATENCY, gemini_errors: float = 0.0,
+                 wikipedia_latency: str = DEFAULT_WIKIPEDIA_LATENCY, wikipedia_errors: float = 0.0,
+                 answer_words: int = ANSWER_WORDS, seed: int = 0):
+        self.services = {
+            'gemini': _Service(gemini_latency, gemini_errors),
+            'wikipedia': _Service(wikipedia_latency, wikipedia_errors)
+        }
+        self.answer_words = answer_words
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.thread = None
+        super().__init__((host, port), _StubHandler)
+    
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+    
+    def env(self) -> dict:
+        """Backend environment that sends its Gemini and Wikipedia calls here"""
+        return {
+            'GEMINI_API_ENDPOINT': self.url,
+            'GEMINI_API_KEY': 'load-test-stub',
+            'WIKIPEDIA_API_URL': f'{self.url}/w/api.php'
+        }
+    
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name='load-test-stubs', daemon=True)
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+    
+    def stats(self) -> dict:
+        with self.lock:
+            return {name: service.stats() for name, service in self.services.items()}
+    
+    def inject(self, name: str, call: str) -> tuple:
+        """
+        Draw this request's delay and fault, and count them
+        
+        Returns:
+            (delay in seconds, (status, body) of an injected error or None)
+        """
+        service = self.services[name]
+        with self.lock:
+            delay = service.latency.sample(self.rng)
+            error = self.rng.choice(_ERRORS[name]) if self.rng.random() < service.error_rate else None
+            service.requests += 1
+            service.errors += error is not None
+            service.delay += delay
+            service.by_call[call] = service.by_call.get(call, 0) + 1
+        return delay, error
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'HeriScienceStub/1.0'
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send(self, status: int, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _respond(self, service: str, call: str, build):
+        delay, error = self.server.inject(service, call)
+        time.sleep(delay)
+        if error:
+            self._send(*error)
+        else:
+            self._send(200, build())
+    
+    def do_POST(self):
+        path = urlparse(self.path).path
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        match = _GENERATE.match(path)
+        if not match:
+            self._send(404, {'error': {'code': 404, 'message': f'Unknown path {path}', 'status': 'NOT_FOUND'}})
+            return
+        
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            self._send(400, {'error': {'code': 400, 'message': 'Invalid JSON payload', 'status': 'INVALID_ARGUMENT'}})
+            return
+        parts = [part for content in request.get('contents', []) for part in content.get('parts', [])]
+        prompt = ' '.join(part.get('text', '') for part in parts)
+        images = sum('inline_data' in part or 'inlineData' in part for part in parts)
+        
+        def build():
+            answer = _answer(prompt, self.server.answer_words)
+            # Images count as 258 tokens each, as in the real API
+            prompt_tokens = _words(prompt) + 258 * images
+            answer_tokens = _words(answer)
+            return {
+                'candidates': [{
+                    'content': {'parts': [{'text': answer}], 'role': 'model'},
+                    'finishReason': 'STOP',
+                    'index': 0
+                }],
+                'usageMetadata': {
+                    'promptTokenCount': prompt_tokens,
+                    'candidatesTokenCount': answer_tokens,
+                    'totalTokenCount': prompt_tokens + answer_tokens
+                },
+                'modelVersion': match.group(1)
+            }
+        
+        self._respond('gemini', 'image' if images else 'text', build)
+    
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/stats':
+            self._send(200, self.server.stats())
+            return
+        if url.path != '/w/api.php':
+            self._send(404, {'error': {'code': 'notfound', 'info': f'Unknown path {url.path}'}})
+            return
+        
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        action = params.get('action')
+        if action == 'opensearch':
+            self._respond('wikipedia', 'opensearch', lambda: self._opensearch(params))
+        elif action == 'query':
+            self._respond('wikipedia', 'query', lambda: self._query(params))
+        else:
+            self._send(400, {'error': {'code': 'badvalue', 'info': f"Unrecognized value for parameter 'action': {action}"}})
+    
+    def _page_url(self, title: str) -> str:
+        return f"{self.server.url}/wiki/{quote(title.replace(' ', '_'))}"
+    
+    def _opensearch(self, params: dict) -> list:
+        search = params.get('search', '')
+        limit = int(params.get('limit', 10))
+        title = _title(search)
+        titles = [title, f'{title} (artifact)', f'History of {title}', f'{title} in archaeology'][:limit]
+        return [
+            search,
+            titles,
+            [f'{name} - article about {search}.' for name in titles],
+            [self._page_url(name) for name in titles]
+        ]
+    
+    def _query(self, params: dict) -> dict:
+        title = params.get('titles', '').split('|')[0]
+        page_id = zlib.crc32(title.encode()) % 10_000_000
+        extract = (f"{title} is an object studied by archaeologists and historians. "
+                   + _answer(title, 90).replace('\n\n', ' '))
+        return {
+            'batchcomplete': '',
+            'query': {'pages': {str(page_id): {
+                'pageid': page_id,
+                'ns': 0,
+                'title': title,
+                'extract': extract,
+                'fullurl': self._page_url(title),
+                'thumbnail': {'source': f'{self.server.url}/thumb/{page_id}.jpg', 'width': 500, 'height': 375}
+            }}}
+        }
@@ -0,0 +1,149 @@
+"""
+Benchmark Suite
+Latency, throughput, memory and output equivalence per engine, mode and size
+
+For every (size, operation, engine, mode):
+1. One untimed run under memory accounting (models/memory_accounting.py)
+   - peak live image buffers and tracemalloc peak. It doubles as the
+   warm-up (imports, lazily created pools)
+2. REPEAT timed runs - p50 / p90 / p99 / mean / min and MP/s (input
+   megapixels / p50). Memoization caches are emptied before each run
+   unless --warm, so cached analyses don't flatter the repeats
+3. Equivalence - the output is compared with the reference engine's
+   output for the same mode: identical or not, mean and max absolute
+   channel difference. Deterministic = first and last run agree
+
+Engine stdout (stage logs) is swallowed during runs.
+"""
+
+from contextlib import redirect_stdout
+from PIL import ImageChops, ImageStat
+from models.bounded_cache import clear_all_caches
+from models.memory_accounting import MemoryUsage
+from .engines import load_engine, REFERENCE_FAMILY, MODES
+from .synthetic import synthetic_image
+import gc
+import io
+import time
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Linearly interpolated percentile of a non-empty list"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def compare_images(output, reference) -> dict:
+    """Equivalence of two outputs (differences in 0-255 channel units)"""
+    if output.size != reference.size:
+        return {'identical': False, 'mean_abs_diff': None, 'max_abs_diff': None}
+    diff = ImageChops.difference(output.convert('RGB'), reference.convert('RGB'))
+    means = ImageStat.Stat(diff).mean
+    return {
+        'identical': diff.getbbox() is None,
+        'mean_abs_diff': round(sum(means) / len(means), 4),
+        'max_abs_diff': max(high for _, high in diff.getextrema())
+    }
+
+
+def _quiet(fn, *args):
+    with redirect_stdout(io.StringIO()):
+        return fn(*args)
+
+
+def measure(engine, image, intensity: float, mode: str, repeat: int, warm: bool = False) -> tuple:
+    """
+    Benchmark one engine and mode on one image
+    
+    Returns:
+        (result row, last output image)
+    """
+    clear_all_caches()
+    memory = MemoryUsage(engine.operation, mode, image, trace_allocations=True)
+    with memory:
+        first = _quiet(engine.run, image, intensity, mode)
+    
+    times = []
+    output = first
+    for _ in range(repeat):
+        if not warm:
+            clear_all_caches()
+        gc.collect()
+        start = time.perf_counter()
+        output = _quiet(engine.run, image, intensity, mode)
+        times.append(time.perf_counter() - start)
+    
+    megapixels = image.width * image.height / 1e6
+    p50 = percentile(times, 0.5)
+    row = {
+        'p50': round(p50, 5),
+        'p90': round(percentile(times, 0.9), 5),
+        'p99': round(percentile(times, 0.99), 5),
+        'mean': round(sum(times) / len(times), 5),
+        'min': round(min(times), 5),
+        'mp_per_s': round(megapixels / p50, 3) if p50 else None,
+        'peak_image_buffers': memory.buffers_peak,
+        'peak_image_bytes': memory.buffer_bytes_peak,
+        'traced_peak_bytes': memory.traced_peak,
+        'output_size': f'{output.width}x{output.height}',
+        'deterministic': compare_images(output, first)['identical']
+    }
+    return row, output
+
+
+def run_suite(engines: list, sizes: list, intensity: float = 0.75, repeat: int = 5,
+              modes: tuple = MODES, warm: bool = False, on_row=None) -> list:
+    """
+    Benchmark every engine x mode x size
+    
+    sizes: [(name, (width, height))]
+    on_row: optional callback(row) as each result is ready
+    
+    Returns:
+        result rows
+    """
+    rows = []
+    references = {}
+    for size_name, (width, height) in sizes:
+        image = synthetic_image(width, height)
+        for operation in dict.fromkeys(engine.operation for engine in engines):
+            # The reference engine goes first; run it untimed if it isn't selected
+            selected = [engine for engine in engines if engine.operation == operation]
+            selected.sort(key=lambda engine: engine.family != REFERENCE_FAMILY)
+            reference = load_engine(operation, REFERENCE_FAMILY)
+            if selected[0].family != REFERENCE_FAMILY:
+                for mode in modes:
+                    references[mode] = _quiet(reference.run, image, intensity, mode)
+            
+            for engine in selected:
+                for mode in engine.modes(modes):
+                    row = {
+                        'operation': operation,
+                        'engine': engine.family,
+                        'mode': mode,
+                        'size': size_name,
+                        'width': width,
+                        'height': height,
+                        'megapixels': round(width * height / 1e6, 3),
+                        'intensity': intensity,
+                        'repeat': repeat
+                    }
+                    try:
+                        measured, output = measure(engine, image, intensity, mode, repeat, warm)
+                        row.update(measured)
+                        if engine.family == REFERENCE_FAMILY:
+                            references[mode] = output
+                        # Modeless engines are compared with the reference's balanced mode
+                        compared = references.get(mode if mode in references else 'balanced')
+                        if compared is not None:
+                            row.update(compare_images(output, compared))
+                    except Exception as e:
+                        row['error'] = f'{type(e).__name__}: {e}'
+                    rows.append(row)
+                    if on_row:
+                        on_row(row)
+            references.clear()
+    return rows
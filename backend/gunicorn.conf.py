@@ -0,0 +1,19 @@
+"""
+Gunicorn server hooks
+
+Settings stay on the command line (see Dockerfile.backend); this file only
+adds the hooks the app needs. gunicorn reads ./gunicorn.conf.py by default,
+or pass -c gunicorn.conf.py.
+"""
+
+
+def worker_exit(server, worker):
+    """
+    Drain the job pool while the worker can still cancel queued jobs
+    
+    Runs in the worker after it has stopped serving requests, before the
+    interpreter's exit hooks - concurrent.futures' own hook would otherwise
+    wait for every queued job, past --graceful-timeout.
+    """
+    from models.job_queue import job_queue
+    job_queue.drain()
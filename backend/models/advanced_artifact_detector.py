@@ -139,12 +139,14 @@ class AdvancedArtifactDetector:
 # Global instance
 artifact_detector = AdvancedArtifactDetector()
 
-def detect_artifact(image_data: bytes) -> Dict[str, Any]:
+def detect_artifact(image_data) -> Dict[str, Any]:
     """
     Main function to detect artifact culture
+    
+    image_data: encoded bytes, or an already-decoded PIL Image (not decoded again)
     """
     try:
-        img = Image.open(io.BytesIO(image_data))
+        img = image_data if isinstance(image_data, Image.Image) else Image.open(io.BytesIO(image_data))
         return artifact_detector.detect_artifact_culture(img)
     except Exception as e:
         print(f"Detection error: {e}")
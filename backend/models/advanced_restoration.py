@@ -5,6 +5,7 @@ NO EXTERNAL DEPENDENCIES - Pure PIL implementation
 """
 
 from PIL import Image, ImageEnhance, ImageFilter, ImageStat, ImageChops
+from .kernel_planner import apply_linear_chain, blend_op, sharpness_op
 import io
 
 class AdvancedRestorationModel:
@@ -52,6 +53,9 @@ class AdvancedRestorationModel:
         if analysis.get('is_noisy', False):
             # Strong denoising for noisy images
             denoised = image.filter(ImageFilter.MedianFilter(size=3))
+        elif intensity < 0.7:
+            # Light smoothing blended with the original - one kernel pass
+            return apply_linear_chain(image, [blend_op('SMOOTH', intensity * 0.6)])
         else:
             # Light smoothing for clean images
             denoised = image.filter(ImageFilter.SMOOTH)
@@ -144,36 +148,18 @@ class AdvancedRestorationModel:
             threshold=threshold
         ))
     
-    def texture_enhance(self, image: Image.Image, intensity: float) -> Image.Image:
+    def linear_finish_ops(self, intensity: float) -> list:
         """
-        Texture enhancement for better visual quality
+        Texture enhancement + final polish expressed as linear ops, so the
+        planner can collapse them into composite kernels
         """
-        if intensity < 0.6:
-            return image
-        
-        # Apply SHARPEN filter for texture
-        textured = image.filter(ImageFilter.SHARPEN)
-        
-        # Blend with original
-        return Image.blend(image, textured, intensity * 0.4)
-    
-    def final_polish(self, image: Image.Image, intensity: float) -> Image.Image:
-        """
-        Final polishing step
-        """
-        # Light sharpening
+        ops = []
         if intensity > 0.7:
-            sharpness_factor = 1.1 + (intensity * 0.2)
-            enhancer = ImageEnhance.Sharpness(image)
-            polished = enhancer.enhance(sharpness_factor)
-        else:
-            polished = image
-        
-        # Very light smoothing to reduce artifacts
+            ops.append(blend_op('SHARPEN', intensity * 0.4))
+            ops.append(sharpness_op(1.1 + (intensity * 0.2)))
         if intensity > 0.8:
-            polished = polished.filter(ImageFilter.SMOOTH)
-        
-        return polished
+            ops.append(blend_op('SMOOTH'))
+        return ops
     
     def restore_image(self, image: Image.Image, intensity: float = 0.75) -> Image.Image:
         """
@@ -220,14 +206,9 @@ class AdvancedRestorationModel:
         else:
             detail_recovered = color_restored
         
-        # Step 6: Texture enhancement (high intensity only)
-        if intensity > 0.7:
-            textured = self.texture_enhance(detail_recovered, intensity)
-        else:
-            textured = detail_recovered
-        
-        # Step 7: Final polish
-        final = self.final_polish(textured, intensity)
+        # Steps 6-7: Texture enhancement (high intensity only) + final polish,
+        # planned into composite kernels instead of filter/blend passes
+        final = apply_linear_chain(detail_recovered, self.linear_finish_ops(intensity))
         
         return final
     
@@ -3,11 +3,15 @@ Automatic Image Analyzer
 Analyzes uploaded images and provides Wikipedia information automatically
 """
 
-import requests
 from PIL import Image
 import io
 import re
 from typing import Dict, Any, Optional, List
+from models.metrics import track_external
+from models.outbound import outbound
+from models.shared_cache import shared_memoize
+from models.tracing import log, traced, WARNING
+from models.wikipedia_integration import WIKIPEDIA_API_URL, WIKIPEDIA_CACHE_TTL
 try:
     from models.advanced_artifact_detector import detect_artifact
 except ImportError:
@@ -22,19 +26,24 @@ except ImportError:
 
 class AutoImageAnalyzer:
     def __init__(self):
-        self.wikipedia_api = "https://en.wikipedia.org/w/api.php"
+        self.wikipedia_api = WIKIPEDIA_API_URL
         
-    def analyze_image_automatically(self, image_data: bytes) -> Dict[str, Any]:
+    @traced('AutoImageAnalyzer.analyze_image_automatically', 'model')
+    def analyze_image_automatically(self, image_data) -> Dict[str, Any]:
         """
         Automatically analyze an image and provide comprehensive information
+        
+        image_data: encoded bytes or a decoded PIL Image - decoded at most
+        once and shared with the artifact detector
         """
         try:
             # Open image to get basic info
-            img = Image.open(io.BytesIO(image_data))
-            width, height = img.size
+            img = image_data if isinstance(image_data, Image.Image) else Image.open(io.BytesIO(image_data))
+            # A reduced-resolution decode keeps the original in info
+            width, height = img.info.get('source_size', img.size)
             
-            # Detect artifact culture using advanced detector
-            culture_detection = detect_artifact(image_data)
+            # Detect artifact culture using advanced detector (same image object)
+            culture_detection = detect_artifact(img)
             
             # Generate automatic analysis
             analysis = {
@@ -45,8 +54,8 @@ class AutoImageAnalyzer:
                 "suggested_enhancements": culture_detection["suggested_enhancements"],
                 "image_info": {
                     "dimensions": f"{width}x{height}",
-                    "format": img.format,
-                    "mode": img.mode
+                    "format": img.info.get('source_format', img.format),
+                    "mode": img.info.get('source_mode', img.mode)
                 },
                 "suggestions": self._generate_suggestions(),
                 "wikipedia_info": None,
@@ -62,7 +71,7 @@ class AutoImageAnalyzer:
             return analysis
             
         except Exception as e:
-            print(f"Auto-analysis error: {e}")
+            log(f"Auto-analysis error: {e}", WARNING)
             return {
                 "detected_type": "Historical Artifact",
                 "suggestions": self._generate_suggestions(),
@@ -84,6 +93,8 @@ class AutoImageAnalyzer:
         else:
             return "Roman Historical Artifact"
     
+    @traced('AutoImageAnalyzer.fetch_wikipedia_info', 'model')
+    @shared_memoize('wikipedia', ttl=WIKIPEDIA_CACHE_TTL, cache_if=bool, method=True)
     def _fetch_wikipedia_info(self, search_term: str) -> Optional[Dict[str, Any]]:
         """
         Fetch Wikipedia information for the detected artifact type
@@ -97,8 +108,10 @@ class AutoImageAnalyzer:
                 "format": "json"
             }
             
-            response = requests.get(self.wikipedia_api, params=search_params, timeout=3)
-            search_results = response.json()
+            with track_external('wikipedia', 'search'):
+                response = outbound.get('wikipedia', 'search', self.wikipedia_api, params=search_params, timeout=3)
+                response.raise_for_status()
+                search_results = response.json()
             
             if len(search_results) > 1 and search_results[1]:
                 title = search_results[1][0]
@@ -115,8 +128,10 @@ class AutoImageAnalyzer:
                     "explaintext": True
                 }
                 
-                summary_response = requests.get(self.wikipedia_api, params=summary_params, timeout=3)
-                summary_data = summary_response.json()
+                with track_external('wikipedia', 'summary'):
+                    summary_response = outbound.get('wikipedia', 'summary', self.wikipedia_api, params=summary_params, timeout=3)
+                    summary_response.raise_for_status()
+                    summary_data = summary_response.json()
                 
                 pages = summary_data.get("query", {}).get("pages", {})
                 if pages:
@@ -133,7 +148,7 @@ class AutoImageAnalyzer:
             return None
             
         except Exception as e:
-            print(f"Wikipedia fetch error: {e}")
+            log(f"Wikipedia fetch error: {e}", WARNING)
             return None
     
     def _generate_suggestions(self) -> List[str]:
@@ -151,7 +166,7 @@ class AutoImageAnalyzer:
 # Global instance
 auto_analyzer = AutoImageAnalyzer()
 
-def analyze_image_auto(image_data: bytes) -> Dict[str, Any]:
+def analyze_image_auto(image_data) -> Dict[str, Any]:
     """
     Main function to automatically analyze images
     """
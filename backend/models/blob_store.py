@@ -0,0 +1,205 @@
+"""
+Content-Addressed Blob Store
+Deduplicated, atomically written files under uploads/ and processed/
+
+Results used to exist only inside base64 JSON responses, and the gallery
+stored those data URLs in Firestore. Blobs give every upload and result a
+short, stable URL instead:
+1. Addressed by content - blob id = sha256(bytes)[:40] + extension, so
+   storing the same bytes twice is a no-op
+2. Written atomically - temp file in the same directory, then os.replace;
+   readers never see a partial file, and concurrent writers of the same
+   blob both succeed
+3. Bounded - past the quota, least recently used blobs are deleted (file
+   mtime is the LRU clock; reads refresh it at most once a minute)
+4. Served with send_file, which hands the open file to the server's
+   sendfile path (no copy through Python)
+
+Layout: <root>/<id[:2]>/<id>, shared by every worker on the host.
+
+Configuration (environment):
+    UPLOAD_STORE_BYTES - quota for uploads/ (default 1GB)
+    RESULT_STORE_BYTES - quota for processed/blobs/ (default 2GB)
+"""
+
+from .tracing import log
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+
+UPLOAD_STORE_BYTES = int(os.getenv('UPLOAD_STORE_BYTES', 1024 * 1024 * 1024))
+RESULT_STORE_BYTES = int(os.getenv('RESULT_STORE_BYTES', 2 * 1024 * 1024 * 1024))
+
+# Reads only refresh the LRU clock when it is older than this
+TOUCH_INTERVAL = 60
+
+# Eviction frees down to this fraction of the quota, so it runs rarely
+EVICT_TO = 0.9
+
+MIMETYPES = {
+    '.jpg': 'image/jpeg',
+    '.png': 'image/png',
+    '.webp': 'image/webp',
+    '.gif': 'image/gif',
+    '.bmp': 'image/bmp',
+    '.tif': 'image/tiff'
+}
+
+EXTENSIONS = {mimetype: extension for extension, mimetype in MIMETYPES.items()}
+
+_BLOB_ID = re.compile(r'^[0-9a-f]{40}\.[a-z]{3,4}$')
+
+
+def extension_for(mimetype: str) -> str:
+    """File extension for an image mimetype (ValueError if not an image type)"""
+    extension = EXTENSIONS.get((mimetype or '').split(';')[0].strip().lower())
+    if extension is None:
+        raise ValueError(f"Unsupported blob type '{mimetype}'")
+    return extension
+
+
+class BlobStore:
+    """
+    Hash-addressed files in one directory tree with an LRU byte quota
+    """
+    
+    def __init__(self, name: str, root: str, max_bytes: int):
+        self.name = name
+        self.root = root
+        self.max_bytes = max_bytes
+        
+        self._lock = threading.Lock()
+        self._bytes = None  # lazily measured; other workers write too
+        
+        self.stats_counters = {
+            'writes': 0,
+            'deduplicated': 0,
+            'evictions': 0,
+            'reads': 0,
+            'misses': 0
+        }
+    
+    def _path(self, blob_id: str) -> str:
+        return os.path.join(self.root, blob_id[:2], blob_id)
+    
+    def _scan(self) -> list:
+        """(mtime, size, path) of every blob"""
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for shard in os.scandir(self.root):
+            if not shard.is_dir() or len(shard.name) != 2:
+                continue
+            for entry in os.scandir(shard.path):
+                if _BLOB_ID.match(entry.name):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+    
+    def put(self, data: bytes, extension: str) -> str:
+        """
+        Store bytes (no-op if already stored)
+        
+        Returns:
+            blob id (content hash + extension)
+        """
+        blob_id = hashlib.sha256(data).hexdigest()[:40] + extension
+        path = self._path(blob_id)
+        
+        if os.path.exists(path):
+            self._touch(path, force=True)
+            with self._lock:
+                self.stats_counters['deduplicated'] += 1
+            return blob_id
+        
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                temp.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        
+        with self._lock:
+            self.stats_counters['writes'] += 1
+            if self._bytes is None:
+                self._bytes = sum(size for _, size, _ in self._scan())
+            else:
+                self._bytes += len(data)
+            over_quota = self._bytes > self.max_bytes
+        
+        if over_quota:
+            self.evict()
+        return blob_id
+    
+    def _touch(self, path: str, force: bool = False):
+        try:
+            if force or time.time() - os.path.getmtime(path) > TOUCH_INTERVAL:
+                os.utime(path)
+        except FileNotFoundError:
+            pass
+    
+    def path(self, blob_id: str):
+        """Filesystem path of a stored blob, or None (also for malformed ids)"""
+        if not _BLOB_ID.match(blob_id or ''):
+            return None
+        path = self._path(blob_id)
+        if not os.path.exists(path):
+            with self._lock:
+                self.stats_counters['misses'] += 1
+            return None
+        
+        self._touch(path)
+        with self._lock:
+            self.stats_counters['reads'] += 1
+        return path
+    
+    def evict(self) -> int:
+        """Delete least recently used blobs until under EVICT_TO of the quota"""
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICT_TO
+        
+        evicted = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+                evicted += 1
+            except FileNotFoundError:
+                pass  # another worker got it first
+            total -= size
+        
+        with self._lock:
+            self._bytes = total
+            self.stats_counters['evictions'] += evicted
+        if evicted:
+            log(f"[BLOBS] {self.name}: evicted {evicted} blob(s), {total / 1024 / 1024:.1f}MB kept")
+        return evicted
+    
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.stats_counters)
+            counters['bytes'] = self._bytes
+        counters['max_bytes'] = self.max_bytes
+        return counters
+
+
+def mimetype_for_blob(blob_id: str) -> str:
+    return MIMETYPES.get(os.path.splitext(blob_id)[1], 'application/octet-stream')
+
+
+# Global instances
+upload_store = BlobStore('uploads', 'uploads', UPLOAD_STORE_BYTES)
+result_store = BlobStore('results', os.path.join('processed', 'blobs'), RESULT_STORE_BYTES)
@@ -0,0 +1,245 @@
+"""
+Bounded Cache Framework
+One size-bounded, content-keyed cache for every memoization point in the models
+
+Replaces the ad-hoc module dicts (ANALYSIS_CACHE keyed on id(image),
+ENHANCEMENT_CACHE keyed on raw floats, ...) that grew forever inside
+long-lived gunicorn workers.
+
+Features:
+1. Content-based keys - images are keyed by a hash of their pixels, floats
+   are quantized, so equal inputs hit and reused object ids never collide
+2. LRU eviction with per-cache entry and/or byte limits
+3. Optional TTL expiry
+4. Hit / miss / eviction / expiry counters, collected per named cache
+
+Usage:
+    _plan_cache = get_cache('kernel_plans', max_entries=256)
+    
+    @memoize(_plan_cache)
+    def plan(ops): ...
+
+Only memoize work that costs more than its key: an image key hashes every
+pixel (~54ms at 12MP), more than a single ImageStat pass over it.
+"""
+
+from collections import OrderedDict
+from functools import wraps
+import hashlib
+import threading
+import time
+
+# Rows hashed per step - avoids a full-size tobytes() copy of large scans
+_HASH_ROWS = 256
+
+# Decimal places kept when floats are used in keys
+FLOAT_KEY_DIGITS = 4
+
+_MISSING = object()
+
+
+def image_content_hash(image) -> str:
+    """SHA-256 of the decoded pixels (mode + size + raw data)"""
+    digest = hashlib.sha256(f'{image.mode}:{image.width}x{image.height}:'.encode())
+    for top in range(0, image.height, _HASH_ROWS):
+        band = image.crop((0, top, image.width, min(top + _HASH_ROWS, image.height)))
+        digest.update(band.tobytes())
+    return digest.hexdigest()
+
+
+def _key_part(value):
+    """Normalize one argument into a hashable, content-based key component"""
+    if hasattr(value, 'getbands') and hasattr(value, 'tobytes'):  # PIL Image
+        return ('image', image_content_hash(value))
+    if isinstance(value, float):
+        return round(value, FLOAT_KEY_DIGITS)
+    if isinstance(value, (bytes, bytearray)):
+        return ('bytes', hashlib.sha256(value).hexdigest())
+    if isinstance(value, dict):
+        return tuple(sorted((k, _key_part(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_key_part(v) for v in value)
+    return value
+
+
+def content_key(*args, **kwargs) -> tuple:
+    """Build a content-based cache key from function arguments"""
+    key = tuple(_key_part(arg) for arg in args)
+    if kwargs:
+        key += tuple(sorted((name, _key_part(value)) for name, value in kwargs.items()))
+    return key
+
+
+class BoundedCache:
+    """
+    Thread-safe LRU cache bounded by entries and/or bytes, with optional TTL
+    """
+    
+    def __init__(self, name: str, max_entries: int = None, max_bytes: int = None,
+                 ttl: float = None, sizeof=None, on_evict=None):
+        """
+        Args:
+            name: cache name (used in stats)
+            max_entries: maximum number of entries (None = unbounded by count)
+            max_bytes: maximum total size as measured by sizeof
+            ttl: seconds before an entry expires (None = never)
+            sizeof: value -> size in bytes (default len)
+            on_evict: callback(key, value) for LRU evictions (e.g. disk spill)
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof or len
+        self.on_evict = on_evict
+        
+        self._data = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.RLock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def _track_size(self, value):
+        return self.sizeof(value) if self.max_bytes is not None else 0
+    
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            value, size, expires_at = item
+            if expires_at is not None and expires_at < time.time():
+                self._data.pop(key)
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def __contains__(self, key):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            return item is not _MISSING and (item[2] is None or item[2] >= time.time())
+    
+    def __len__(self):
+        return len(self._data)
+    
+    def put(self, key, value):
+        size = self._track_size(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            if self.on_evict:
+                self.on_evict(key, value)  # Never fits - hand straight to the next tier
+            return
+        
+        expires_at = time.time() + self.ttl if self.ttl else None
+        evicted = []
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (value, size, expires_at)
+            self._bytes += size
+            
+            while self._data and (
+                (self.max_entries is not None and len(self._data) > self.max_entries) or
+                (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                old_key, (old_value, old_size, _) = self._data.popitem(last=False)
+                self._bytes -= old_size
+                self.evictions += 1
+                evicted.append((old_key, old_value))
+        
+        if self.on_evict:
+            for old_key, old_value in evicted:
+                self.on_evict(old_key, old_value)
+    
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None:
+                return default
+            self._bytes -= item[1]
+            return item[0]
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+    
+    def get_or_compute(self, key, compute):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+    
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+# Registry of named caches (one per memoization point)
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_cache(name: str, **options) -> BoundedCache:
+    """Get or create a named cache (options only apply on creation)"""
+    with _registry_lock:
+        cache = _registry.get(name)
+        if cache is None:
+            cache = BoundedCache(name, **options)
+            _registry[name] = cache
+        return cache
+
+
+def all_cache_stats() -> dict:
+    """Stats for every registered cache"""
+    with _registry_lock:
+        caches = list(_registry.values())
+    return {cache.name: cache.stats() for cache in caches}
+
+
+def clear_all_caches():
+    """Empty every registered cache (cold-cache benchmarks)"""
+    with _registry_lock:
+        caches = list(_registry.values())
+    for cache in caches:
+        cache.clear()
+
+
+def memoize(cache: BoundedCache, key=None):
+    """
+    Decorator memoizing a function on a BoundedCache
+    
+    key: optional callable(*args, **kwargs) -> key (default content_key)
+    """
+    make_key = key or content_key
+    
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            cache_key = make_key(*args, **kwargs)
+            return cache.get_or_compute(cache_key, lambda: fn(*args, **kwargs))
+        wrapper.cache = cache
+        return wrapper
+    return decorator
@@ -5,14 +5,26 @@ Fast, Balanced, Quality, and Ultra modes
 
 from PIL import Image, ImageEnhance, ImageFilter, ImageStat, ImageChops
 from .model_profiles import ProcessingMode, get_processing_params, select_mode_from_intensity
+from .kernel_planner import apply_linear_chain, blend_op, sharpness_op
+from .stage_graph import StageGraph
+from functools import partial
 import time
 
+# Final stage of each mode in the stage graph
+MODE_TARGETS = {
+    ProcessingMode.FAST: 'fast.contrast',
+    ProcessingMode.BALANCED: 'balanced.color',
+    ProcessingMode.QUALITY: 'quality.detail',
+    ProcessingMode.ULTRA: 'ultra.linear'
+}
+
 class FastRestorationEngine:
     """
     Optimized multi-model restoration engine
     """
     
     def __init__(self):
+        self.graph = self._build_graph()
         print("[⚡ Restore Engine] Multi-model system ready")
     
     def analyze_quick(self, image: Image.Image):
@@ -30,92 +42,88 @@ class FastRestorationEngine:
             'damage_score': max(0, min(100, 100 - variance / 30))
         }
     
-    def fast_restore(self, image: Image.Image, params: dict, analysis: dict) -> Image.Image:
-        """Ultra-fast restoration - 0.3s"""
-        # Just basic enhancement
+    # Shared stages
+    
+    def sharpen(self, image: Image.Image, unsharp_strength: float) -> Image.Image:
         enhancer = ImageEnhance.Sharpness(image)
-        restored = enhancer.enhance(params['unsharp_strength'])
-        
-        if params['contrast_factor'] > 1.0:
-            enhancer = ImageEnhance.Contrast(restored)
-            restored = enhancer.enhance(params['contrast_factor'])
-        
-        return restored
+        return enhancer.enhance(unsharp_strength)
     
-    def balanced_restore(self, image: Image.Image, params: dict, analysis: dict) -> Image.Image:
-        """Balanced restoration - 1.0s"""
-        restored = image
-        
-        # Light denoising if needed
+    def contrast(self, image: Image.Image, contrast_factor: float) -> Image.Image:
+        enhancer = ImageEnhance.Contrast(image)
+        return enhancer.enhance(contrast_factor)
+    
+    def faded_contrast(self, image: Image.Image, analysis: dict, contrast_factor: float, boost: float) -> Image.Image:
+        """Contrast restoration, boosted for faded images"""
+        if analysis['is_faded']:
+            contrast_factor *= boost
+        return self.contrast(image, contrast_factor)
+    
+    def faded_color(self, image: Image.Image, analysis: dict, color_factor: float, boost: float) -> Image.Image:
+        """Color restoration, boosted for faded images"""
+        if analysis['is_faded']:
+            color_factor *= boost
+        if color_factor > 1.0:
+            enhancer = ImageEnhance.Color(image)
+            return enhancer.enhance(color_factor)
+        return image
+    
+    # FAST - 0.3s
+    
+    def fast_contrast(self, image: Image.Image, contrast_factor: float) -> Image.Image:
+        if contrast_factor > 1.0:
+            return self.contrast(image, contrast_factor)
+        return image
+    
+    # BALANCED - 1.0s
+    
+    def balanced_denoise(self, image: Image.Image, analysis: dict) -> Image.Image:
+        """Light denoising if needed"""
         if analysis['is_noisy']:
-            restored = restored.filter(ImageFilter.SMOOTH)
-        
-        # Sharpness
-        enhancer = ImageEnhance.Sharpness(restored)
-        restored = enhancer.enhance(params['unsharp_strength'])
-        
-        # Contrast
-        enhancer = ImageEnhance.Contrast(restored)
-        restored = enhancer.enhance(params['contrast_factor'])
-        
-        # Color if faded
-        if analysis['is_faded'] and params['color_factor'] > 1.0:
-            enhancer = ImageEnhance.Color(restored)
-            restored = enhancer.enhance(params['color_factor'])
-        
-        return restored
+            return image.filter(ImageFilter.SMOOTH)
+        return image
     
-    def quality_restore(self, image: Image.Image, params: dict, analysis: dict) -> Image.Image:
-        """Quality restoration - 2.0s"""
-        restored = image
-        
-        # Adaptive denoising
+    def balanced_color(self, image: Image.Image, analysis: dict, color_factor: float) -> Image.Image:
+        """Color if faded"""
+        if analysis['is_faded'] and color_factor > 1.0:
+            enhancer = ImageEnhance.Color(image)
+            return enhancer.enhance(color_factor)
+        return image
+    
+    # QUALITY - 2.0s
+    
+    def quality_denoise(self, image: Image.Image, analysis: dict) -> Image.Image:
+        """Adaptive denoising"""
         if analysis['is_noisy']:
-            restored = restored.filter(ImageFilter.MedianFilter(size=3))
-        else:
-            restored = restored.filter(ImageFilter.SMOOTH)
-        
-        # Unsharp mask
+            return image.filter(ImageFilter.MedianFilter(size=3))
+        return image.filter(ImageFilter.SMOOTH)
+    
+    def quality_unsharp(self, image: Image.Image, analysis: dict, unsharp_strength: float) -> Image.Image:
         radius = 2.0 if analysis['damage_score'] > 50 else 1.5
-        percent = int((params['unsharp_strength'] - 1.0) * 150)
-        restored = restored.filter(ImageFilter.UnsharpMask(
+        percent = int((unsharp_strength - 1.0) * 150)
+        return image.filter(ImageFilter.UnsharpMask(
             radius=radius,
             percent=percent,
             threshold=2
         ))
-        
-        # Contrast restoration
-        contrast_factor = params['contrast_factor']
-        if analysis['is_faded']:
-            contrast_factor *= 1.2
-        enhancer = ImageEnhance.Contrast(restored)
-        restored = enhancer.enhance(contrast_factor)
-        
-        # Color restoration
-        color_factor = params['color_factor']
-        if analysis['is_faded']:
-            color_factor *= 1.15
-        if color_factor > 1.0:
-            enhancer = ImageEnhance.Color(restored)
-            restored = enhancer.enhance(color_factor)
-        
-        # Brightness adjustment if too dark
+    
+    def quality_brightness(self, image: Image.Image, analysis: dict) -> Image.Image:
+        """Brightness adjustment if too dark"""
         if analysis['brightness'] < 100:
-            enhancer = ImageEnhance.Brightness(restored)
-            restored = enhancer.enhance(1.1)
-        
-        # Detail recovery
-        if params.get('detail_recovery'):
-            detailed = restored.filter(ImageFilter.DETAIL)
-            restored = Image.blend(restored, detailed, 0.4)
-        
-        return restored
+            enhancer = ImageEnhance.Brightness(image)
+            return enhancer.enhance(1.1)
+        return image
     
-    def ultra_restore(self, image: Image.Image, params: dict, analysis: dict) -> Image.Image:
-        """Ultra quality restoration - 3.0s"""
+    def quality_detail(self, image: Image.Image, detail_recovery: bool) -> Image.Image:
+        """Detail recovery (filter + blend in one kernel pass)"""
+        if detail_recovery:
+            return apply_linear_chain(image, [blend_op('DETAIL', 0.4)])
+        return image
+    
+    # ULTRA - 3.0s
+    
+    def ultra_denoise(self, image: Image.Image, analysis: dict) -> Image.Image:
+        """Multi-pass denoising + edge-preserving (bilateral-like) smoothing"""
         restored = image
-        
-        # Multi-pass denoising
         if analysis['is_noisy']:
             restored = restored.filter(ImageFilter.MedianFilter(size=3))
             restored = restored.filter(ImageFilter.SMOOTH)
@@ -128,57 +136,83 @@ class FastRestorationEngine:
         
         # Bilateral-like filtering
         smoothed = restored.filter(ImageFilter.SMOOTH_MORE)
-        restored = Image.composite(restored, smoothed, edge_mask.convert('L'))
-        
-        # Strong unsharp masking
-        restored = restored.filter(ImageFilter.UnsharpMask(
+        return Image.composite(restored, smoothed, edge_mask.convert('L'))
+    
+    def ultra_unsharp(self, image: Image.Image, unsharp_strength: float) -> Image.Image:
+        """Strong unsharp masking"""
+        return image.filter(ImageFilter.UnsharpMask(
             radius=2.5,
-            percent=int((params['unsharp_strength'] - 1.0) * 200),
+            percent=int((unsharp_strength - 1.0) * 200),
             threshold=2
         ))
-        
-        # Advanced contrast restoration
-        contrast_factor = params['contrast_factor']
-        if analysis['is_faded']:
-            contrast_factor *= 1.3
-        enhancer = ImageEnhance.Contrast(restored)
-        restored = enhancer.enhance(contrast_factor)
-        
-        # Advanced color restoration
-        color_factor = params['color_factor']
-        if analysis['is_faded']:
-            color_factor *= 1.25
-        if color_factor > 1.0:
-            enhancer = ImageEnhance.Color(restored)
-            restored = enhancer.enhance(color_factor)
-        
-        # Brightness optimization
+    
+    def ultra_brightness(self, image: Image.Image, analysis: dict) -> Image.Image:
+        """Brightness optimization"""
         if analysis['brightness'] < 100:
-            enhancer = ImageEnhance.Brightness(restored)
-            restored = enhancer.enhance(1.15)
+            enhancer = ImageEnhance.Brightness(image)
+            return enhancer.enhance(1.15)
         elif analysis['brightness'] > 200:
-            enhancer = ImageEnhance.Brightness(restored)
-            restored = enhancer.enhance(0.95)
-        
-        # Detail recovery
-        detailed = restored.filter(ImageFilter.DETAIL)
-        restored = Image.blend(restored, detailed, 0.5)
+            enhancer = ImageEnhance.Brightness(image)
+            return enhancer.enhance(0.95)
+        return image
+    
+    def ultra_linear_tail(self, image: Image.Image, texture_enhance: bool, edge_preserve: bool) -> Image.Image:
+        """
+        Linear tail: detail, texture, edge enhance and final polish are
+        planned into composite kernels (2-3 passes instead of 5-8)
+        """
+        linear_ops = [blend_op('DETAIL', 0.5)]
         
         # Texture enhancement
-        if params.get('texture_enhance'):
-            textured = restored.filter(ImageFilter.SHARPEN)
-            restored = Image.blend(restored, textured, 0.4)
+        if texture_enhance:
+            linear_ops.append(blend_op('SHARPEN', 0.4))
         
         # Edge enhancement
-        if params.get('edge_preserve'):
-            restored = restored.filter(ImageFilter.EDGE_ENHANCE)
+        if edge_preserve:
+            linear_ops.append(blend_op('EDGE_ENHANCE'))
         
         # Final polish
-        enhancer = ImageEnhance.Sharpness(restored)
-        restored = enhancer.enhance(1.1)
-        restored = restored.filter(ImageFilter.SMOOTH)
+        linear_ops.append(sharpness_op(1.1))
+        linear_ops.append(blend_op('SMOOTH'))
+        return apply_linear_chain(image, linear_ops)
+    
+    def _build_graph(self) -> StageGraph:
+        """
+        Stage DAG for all four modes
         
-        return restored
+        Sources: 'image' plus every key of get_processing_params(). Each stage
+        lists only what it reads, so e.g. a new contrast_factor reuses the
+        denoise and unsharp outputs.
+        """
+        graph = StageGraph('restore')
+        graph.add('analysis', self.analyze_quick, ('image',))
+        
+        graph.add('fast.sharpen', self.sharpen, ('image', 'unsharp_strength'))
+        graph.add('fast.contrast', self.fast_contrast, ('fast.sharpen', 'contrast_factor'))
+        
+        graph.add('balanced.denoise', self.balanced_denoise, ('image', 'analysis'))
+        graph.add('balanced.sharpen', self.sharpen, ('balanced.denoise', 'unsharp_strength'))
+        graph.add('balanced.contrast', self.contrast, ('balanced.sharpen', 'contrast_factor'))
+        graph.add('balanced.color', self.balanced_color, ('balanced.contrast', 'analysis', 'color_factor'))
+        
+        graph.add('quality.denoise', self.quality_denoise, ('image', 'analysis'))
+        graph.add('quality.unsharp', self.quality_unsharp, ('quality.denoise', 'analysis', 'unsharp_strength'))
+        graph.add('quality.contrast', partial(self.faded_contrast, boost=1.2),
+                  ('quality.unsharp', 'analysis', 'contrast_factor'))
+        graph.add('quality.color', partial(self.faded_color, boost=1.15),
+                  ('quality.contrast', 'analysis', 'color_factor'))
+        graph.add('quality.brightness', self.quality_brightness, ('quality.color', 'analysis'))
+        graph.add('quality.detail', self.quality_detail, ('quality.brightness', 'detail_recovery'))
+        
+        graph.add('ultra.denoise', self.ultra_denoise, ('image', 'analysis'))
+        graph.add('ultra.unsharp', self.ultra_unsharp, ('ultra.denoise', 'unsharp_strength'))
+        graph.add('ultra.contrast', partial(self.faded_contrast, boost=1.3),
+                  ('ultra.unsharp', 'analysis', 'contrast_factor'))
+        graph.add('ultra.color', partial(self.faded_color, boost=1.25),
+                  ('ultra.contrast', 'analysis', 'color_factor'))
+        graph.add('ultra.brightness', self.ultra_brightness, ('ultra.color', 'analysis'))
+        graph.add('ultra.linear', self.ultra_linear_tail, ('ultra.brightness', 'texture_enhance', 'edge_preserve'))
+        return graph
     
     def restore(self, image: Image.Image, intensity: float = 0.75, mode: str = 'auto') -> tuple:
         """
@@ -194,9 +228,6 @@ class FastRestorationEngine:
         """
         start_time = time.time()
         
-        # Quick analysis
-        analysis = self.analyze_quick(image)
-        
         # Select mode
         if mode == 'auto':
             processing_mode = select_mode_from_intensity(intensity)
@@ -206,15 +237,11 @@ class FastRestorationEngine:
         # Get parameters
         params = get_processing_params(processing_mode, intensity)
         
-        # Restore based on mode
-        if processing_mode == ProcessingMode.FAST:
-            restored = self.fast_restore(image, params, analysis)
-        elif processing_mode == ProcessingMode.BALANCED:
-            restored = self.balanced_restore(image, params, analysis)
-        elif processing_mode == ProcessingMode.QUALITY:
-            restored = self.quality_restore(image, params, analysis)
-        else:  # ULTRA
-            restored = self.ultra_restore(image, params, analysis)
+        # Quick analysis + the mode's final stage, reusing cached stages
+        (analysis, restored), report = self.graph.run(
+            ('analysis', MODE_TARGETS[processing_mode]),
+            {'image': image, **params}
+        )
         
         processing_time = time.time() - start_time
         
@@ -226,6 +253,7 @@ class FastRestorationEngine:
             analysis,
             params
         )
+        metadata['stages'] = report
         
         return restored, metadata, processing_time
     
@@ -5,8 +5,19 @@ Fast, Balanced, Quality, and Ultra modes
 
 from PIL import Image, ImageEnhance, ImageFilter, ImageChops
 from .model_profiles import ProcessingMode, get_processing_params, select_mode_from_intensity
+from .kernel_planner import apply_linear_chain, blend_op, sharpness_op
+from .stage_graph import StageGraph
+from functools import partial
 import time
 
+# Final stage of each mode in the stage graph
+MODE_TARGETS = {
+    ProcessingMode.FAST: 'fast.sharpen',
+    ProcessingMode.BALANCED: 'balanced.color',
+    ProcessingMode.QUALITY: 'quality.linear',
+    ProcessingMode.ULTRA: 'ultra.linear'
+}
+
 class FastSuperResolutionEngine:
     """
     Optimized multi-model super-resolution engine
@@ -14,6 +25,7 @@ class FastSuperResolutionEngine:
     
     def __init__(self):
         self.scale_factor = 2
+        self.graph = self._build_graph()
         print("[⚡ SR Engine] Multi-model system ready")
     
     def fast_upscale(self, image: Image.Image) -> Image.Image:
@@ -76,45 +88,109 @@ class FastSuperResolutionEngine:
         
         return current
     
-    def apply_enhancement(self, image: Image.Image, params: dict) -> Image.Image:
-        """Apply enhancements based on parameters"""
-        enhanced = image
-        
-        # Unsharp mask (adaptive)
-        if params['unsharp_strength'] > 1.0:
-            radius = 2.0 if params.get('detail_recovery') else 1.5
-            percent = int((params['unsharp_strength'] - 1.0) * 200)
-            enhanced = enhanced.filter(ImageFilter.UnsharpMask(
+    # Enhancement stages (run on the upscaled image)
+    
+    def fast_sharpen(self, image: Image.Image, intensity: float, unsharp_strength: float) -> Image.Image:
+        """Minimal enhancement for speed"""
+        if intensity > 0.3:
+            enhancer = ImageEnhance.Sharpness(image)
+            return enhancer.enhance(unsharp_strength)
+        return image
+    
+    def unsharp(self, image: Image.Image, unsharp_strength: float, detail_recovery: bool) -> Image.Image:
+        """Unsharp mask (adaptive)"""
+        if unsharp_strength > 1.0:
+            radius = 2.0 if detail_recovery else 1.5
+            percent = int((unsharp_strength - 1.0) * 200)
+            return image.filter(ImageFilter.UnsharpMask(
                 radius=radius,
                 percent=percent,
                 threshold=3
             ))
-        
-        # Contrast
-        if params['contrast_factor'] > 1.0:
-            enhancer = ImageEnhance.Contrast(enhanced)
-            enhanced = enhancer.enhance(params['contrast_factor'])
-        
-        # Color
-        if params['color_factor'] > 1.0:
-            enhancer = ImageEnhance.Color(enhanced)
-            enhanced = enhancer.enhance(params['color_factor'])
+        return image
+    
+    def contrast(self, image: Image.Image, contrast_factor: float) -> Image.Image:
+        if contrast_factor > 1.0:
+            enhancer = ImageEnhance.Contrast(image)
+            return enhancer.enhance(contrast_factor)
+        return image
+    
+    def color(self, image: Image.Image, color_factor: float) -> Image.Image:
+        if color_factor > 1.0:
+            enhancer = ImageEnhance.Color(image)
+            return enhancer.enhance(color_factor)
+        return image
+    
+    def linear_tail(self, image: Image.Image, edge_preserve: bool, detail_recovery: bool,
+                    texture_enhance: bool, polish: bool = False) -> Image.Image:
+        """
+        Linear tail (edge enhance, detail, texture, polish) planned into
+        composite kernels instead of one filter + blend pass per step
+        """
+        linear_ops = []
         
         # Edge enhance
-        if params.get('edge_preserve'):
-            enhanced = enhanced.filter(ImageFilter.EDGE_ENHANCE)
+        if edge_preserve:
+            linear_ops.append(blend_op('EDGE_ENHANCE'))
         
         # Detail recovery
-        if params.get('detail_recovery'):
-            detailed = enhanced.filter(ImageFilter.DETAIL)
-            enhanced = Image.blend(enhanced, detailed, 0.4)
+        if detail_recovery:
+            linear_ops.append(blend_op('DETAIL', 0.4))
         
         # Texture
-        if params.get('texture_enhance'):
-            textured = enhanced.filter(ImageFilter.SHARPEN)
-            enhanced = Image.blend(enhanced, textured, 0.3)
+        if texture_enhance:
+            linear_ops.append(blend_op('SHARPEN', 0.3))
+        
+        # Extra polish
+        if polish:
+            linear_ops.append(sharpness_op(1.1))
         
-        return enhanced
+        if linear_ops:
+            return apply_linear_chain(image, linear_ops)
+        return image
+    
+    def _build_graph(self) -> StageGraph:
+        """
+        Stage DAG for all four modes
+        
+        Sources: 'image', 'scale_factor', 'intensity' plus every key of
+        get_processing_params(). Upscales depend only on the image and their
+        own params, so a new contrast_factor or color_factor reuses them.
+        """
+        graph = StageGraph('super_resolution')
+        
+        graph.add('fast.upscale', lambda image, scale_factor: self.fast_upscale(image),
+                  ('image', 'scale_factor'))
+        graph.add('fast.sharpen', self.fast_sharpen, ('fast.upscale', 'intensity', 'unsharp_strength'))
+        
+        # Some enhancements (no detail / texture / edge passes)
+        graph.add('balanced.upscale',
+                  lambda image, scale_factor, multi_scale: self.balanced_upscale(image, {'multi_scale': multi_scale}),
+                  ('image', 'scale_factor', 'multi_scale'))
+        graph.add('balanced.unsharp', partial(self.unsharp, detail_recovery=False),
+                  ('balanced.upscale', 'unsharp_strength'))
+        graph.add('balanced.contrast', self.contrast, ('balanced.unsharp', 'contrast_factor'))
+        graph.add('balanced.color', self.color, ('balanced.contrast', 'color_factor'))
+        
+        # Full enhancement pipeline
+        graph.add('quality.upscale',
+                  lambda image, scale_factor, histogram_enhance: self.quality_upscale(image, {'histogram_enhance': histogram_enhance}),
+                  ('image', 'scale_factor', 'histogram_enhance'))
+        graph.add('quality.unsharp', self.unsharp, ('quality.upscale', 'unsharp_strength', 'detail_recovery'))
+        graph.add('quality.contrast', self.contrast, ('quality.unsharp', 'contrast_factor'))
+        graph.add('quality.color', self.color, ('quality.contrast', 'color_factor'))
+        graph.add('quality.linear', self.linear_tail,
+                  ('quality.color', 'edge_preserve', 'detail_recovery', 'texture_enhance'))
+        
+        # Maximum enhancement + extra polish
+        graph.add('ultra.upscale', lambda image, scale_factor: self.ultra_upscale(image, {}),
+                  ('image', 'scale_factor'))
+        graph.add('ultra.unsharp', self.unsharp, ('ultra.upscale', 'unsharp_strength', 'detail_recovery'))
+        graph.add('ultra.contrast', self.contrast, ('ultra.unsharp', 'contrast_factor'))
+        graph.add('ultra.color', self.color, ('ultra.contrast', 'color_factor'))
+        graph.add('ultra.linear', partial(self.linear_tail, polish=True),
+                  ('ultra.color', 'edge_preserve', 'detail_recovery', 'texture_enhance'))
+        return graph
     
     def enhance(self, image: Image.Image, intensity: float = 0.75, mode: str = 'auto') -> tuple:
         """
@@ -139,38 +215,13 @@ class FastSuperResolutionEngine:
         # Get parameters
         params = get_processing_params(processing_mode, intensity)
         
-        # Upscale based on mode
-        if processing_mode == ProcessingMode.FAST:
-            upscaled = self.fast_upscale(image)
-            # Minimal enhancement for speed
-            if intensity > 0.3:
-                enhancer = ImageEnhance.Sharpness(upscaled)
-                enhanced = enhancer.enhance(params['unsharp_strength'])
-            else:
-                enhanced = upscaled
-        
-        elif processing_mode == ProcessingMode.BALANCED:
-            upscaled = self.balanced_upscale(image, params)
-            # Apply some enhancements
-            enhanced = self.apply_enhancement(upscaled, {
-                **params,
-                'detail_recovery': False,
-                'texture_enhance': False,
-                'edge_preserve': False
-            })
-        
-        elif processing_mode == ProcessingMode.QUALITY:
-            upscaled = self.quality_upscale(image, params)
-            # Full enhancement pipeline
-            enhanced = self.apply_enhancement(upscaled, params)
-        
-        else:  # ULTRA
-            upscaled = self.ultra_upscale(image, params)
-            # Maximum enhancement
-            enhanced = self.apply_enhancement(upscaled, params)
-            # Extra polish
-            enhancer = ImageEnhance.Sharpness(enhanced)
-            enhanced = enhancer.enhance(1.1)
+        # Upscale + enhance via the mode's final stage, reusing cached stages
+        enhanced, report = self.graph.run(MODE_TARGETS[processing_mode], {
+            'image': image,
+            'scale_factor': self.scale_factor,
+            'intensity': intensity,
+            **params
+        })
         
         processing_time = time.time() - start_time
         
@@ -183,6 +234,7 @@ class FastSuperResolutionEngine:
             processing_time,
             params
         )
+        metadata['stages'] = report
         
         return enhanced, metadata, processing_time
     
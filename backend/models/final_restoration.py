@@ -6,15 +6,8 @@ Pure PIL implementation with intelligent conditional processing
 from PIL import Image, ImageEnhance, ImageFilter, ImageStat
 import time
 
-# Analysis cache
-_ANALYSIS_CACHE = {}
-
 def _analyze_fast(image):
-    """Fast cached image analysis"""
-    cache_key = (image.size, image.mode)
-    if cache_key in _ANALYSIS_CACHE:
-        return _ANALYSIS_CACHE[cache_key]
-    
+    """Fast image analysis (not memoized - hashing the pixels costs more)"""
     gray = image.convert('L')
     stat = ImageStat.Stat(gray)
     
@@ -26,7 +19,6 @@ def _analyze_fast(image):
         'damage_score': max(0, min(100, 100 - stat.var[0] / 30))
     }
     
-    _ANALYSIS_CACHE[cache_key] = analysis
     return analysis
 
 def restore_artifact_image(image, intensity=0.75, mode='auto'):
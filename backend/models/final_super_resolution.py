@@ -4,23 +4,21 @@ Pure PIL implementation with maximum performance optimizations
 """
 
 from PIL import Image, ImageEnhance, ImageFilter
+from .bounded_cache import get_cache, memoize
 import time
 
 # Pre-computed enhancement factor cache
-_FACTOR_CACHE = {}
+_FACTOR_CACHE = get_cache('final_super_resolution.factors', max_entries=128)
 
+# Round to 2 decimals for effective caching
+@memoize(_FACTOR_CACHE, key=lambda intensity: round(intensity, 2))
 def _get_factors(intensity):
     """Cache enhancement factors to avoid redundant calculations"""
-    key = round(intensity, 2)  # Round to 2 decimals for effective caching
-    if key in _FACTOR_CACHE:
-        return _FACTOR_CACHE[key]
-    
     factors = {
         'sharpness': 1.5 + (intensity * 1.0),
         'contrast': 1.15 + (intensity * 0.2),
         'unsharp_percent': int(150 + intensity * 100)
     }
-    _FACTOR_CACHE[key] = factors
     return factors
 
 def enhance_super_resolution(image, intensity=0.75, mode='auto'):
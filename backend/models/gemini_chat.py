@@ -1,27 +1,51 @@
 """
 Gemini Flash Lite Chatbot Integration
 Fast, efficient AI responses using Google's Gemini API
+
+Configuration (environment):
+    GEMINI_API_KEY        API key (without one, fallback answers are used)
+    GEMINI_IMAGE_EDGE     longest edge images are decoded to (default 1536)
+    GEMINI_API_ENDPOINT   API host override, e.g. http://127.0.0.1:8701 for
+                          the load-test stub (benchmarks/stubs.py); switches
+                          the client to the REST transport
+
+Calls go through models/outbound.py (OUTBOUND_MODE=record / replay).
 """
 
 try:
     import google.generativeai as genai
-    from PIL import Image
-    import requests
-    import io
-    import base64
     GEMINI_AVAILABLE = True
 except ImportError:
     GEMINI_AVAILABLE = False
     genai = None
 
+import base64
 import os
+import hashlib
+import requests
 from typing import Dict, Any, Optional, Union
 import json
 from dotenv import load_dotenv
+from .metrics import track_external
+from .outbound import outbound
+from .shared_cache import shared_cache
+from .image_decode import decode_scaled
+from .image_handles import is_image_handle, load_image
+from .tracing import log, traced, DEBUG, WARNING, ERROR
 
-# Load environment variables
+# Load environment variables (before the settings below read them)
 load_dotenv()
 
+# Text-only answers are shared by all workers for a day
+LLM_CACHE_TTL = 24 * 3600
+GEMINI_MODEL = 'gemini-2.0-flash'
+
+# Gemini downsamples large images itself - decode no larger than this
+GEMINI_IMAGE_EDGE = int(os.getenv('GEMINI_IMAGE_EDGE', 1536))
+
+# Alternative API host (gRPC can't reach a plain HTTP stub, so REST is used)
+GEMINI_API_ENDPOINT = os.getenv('GEMINI_API_ENDPOINT')
+
 class GeminiChatbot:
     def __init__(self):
         self.api_key = os.getenv('GEMINI_API_KEY')
@@ -31,105 +55,141 @@ class GeminiChatbot:
         # Try to initialize Gemini, but don't fail if no API key or module
         if GEMINI_AVAILABLE and self.api_key:
             try:
-                genai.configure(api_key=self.api_key)
-                self.model = genai.GenerativeModel('gemini-2.0-flash')
+                if GEMINI_API_ENDPOINT:
+                    genai.configure(api_key=self.api_key, transport='rest',
+                                    client_options={'api_endpoint': GEMINI_API_ENDPOINT})
+                else:
+                    genai.configure(api_key=self.api_key)
+                self.model = genai.GenerativeModel(GEMINI_MODEL)
                 self.initialized = True
-                print("SUCCESS: Gemini 2.0 Flash initialized successfully!")
+                log("Gemini 2.0 Flash initialized")
             except Exception as e:
-                print(f"ERROR: Gemini initialization error: {e}")
+                log(f"Gemini initialization error: {e}", ERROR)
                 self.initialized = False
         else:
             if not GEMINI_AVAILABLE:
-                print("WARNING: google-generativeai module not installed. Using intelligent fallback.")
+                log("google-generativeai module not installed. Using intelligent fallback.", WARNING)
             else:
-                print("WARNING: GEMINI_API_KEY not found. Using intelligent fallback responses.")
+                log("GEMINI_API_KEY not found. Using intelligent fallback responses.", WARNING)
             self.initialized = False
+        
+        # Replayed answers need neither the SDK nor a key (models/outbound.py)
+        if not self.initialized and outbound.replaying:
+            self.initialized = True
+            log("Gemini answers are replayed from cassettes")
     
+    @traced('GeminiChatbot.chat_with_gemini', 'model')
     def chat_with_gemini(self, message: str, context: Optional[Dict[str, Any]] = None) -> str:
         """
         Chat with Gemini model with image support
         """
-        if not self.initialized or not self.model:
-            print("Gemini not initialized, using fallback")
+        if not self.initialized:
+            log("Gemini not initialized, using fallback", WARNING)
             return self._simple_fallback(message)
         
         try:
-            print(f"Gemini chat request - Message: {message[:50]}...")
-            print(f"Context: {context}")
+            log(f"Gemini chat request - Message: {message[:50]}...", DEBUG)
+            log(f"Context: {context}", DEBUG)
             
             # Check if we have an image to analyze
-            if context and context.get('hasImage') and context.get('imageUrl'):
-                print("Image detected, using image analysis mode")
+            if context and context.get('hasImage') and (context.get('imageHandle') or context.get('imageUrl')):
+                log("Image detected, using image analysis mode", DEBUG)
                 return self._chat_with_image(message, context)
             else:
-                print("No image detected, using text-only mode")
+                log("No image detected, using text-only mode", DEBUG)
                 # Text-only conversation
                 prompt = self._create_prompt(message, context)
-                response = self.model.generate_content(prompt)
+                cache_key = hashlib.sha256(f'{GEMINI_MODEL}:{prompt}'.encode()).hexdigest()
+                cached = shared_cache.get_json('llm', cache_key)
+                if cached is not None:
+                    log("Answer served from shared cache", DEBUG)
+                    return cached
+                
+                with track_external('gemini', 'text'):
+                    text = outbound.call('gemini', 'text', {'model': GEMINI_MODEL, 'prompt': prompt},
+                                         lambda: self.model.generate_content(prompt).text)
                 
-                if response.text:
-                    return response.text.strip()
+                if text:
+                    answer = text.strip()
+                    # Only real answers are cached, never fallbacks
+                    shared_cache.put_json('llm', cache_key, answer, ttl=LLM_CACHE_TTL)
+                    return answer
                 else:
                     return self._simple_fallback(message)
                     
         except Exception as e:
-            print(f"Gemini API error: {e}")
+            log(f"Gemini API error: {e}", ERROR)
             import traceback
             traceback.print_exc()
             return self._simple_fallback(message)
     
+    @traced('GeminiChatbot.chat_with_image', 'model')
     def _chat_with_image(self, message: str, context: Dict[str, Any]) -> str:
         """
         Chat with Gemini using image analysis
         """
         try:
-            image_url = context.get('imageUrl')
-            print(f"Image analysis requested for: {image_url[:100] if image_url else 'None'}...")
+            image_url = context.get('imageHandle') or context.get('imageUrl')
+            log(f"Image analysis requested for: {image_url[:100] if image_url else 'None'}...", DEBUG)
             
             if not image_url:
                 return "No image URL provided for analysis."
             
             # Download and process the image
-            print("Downloading image...")
+            log("Downloading image...", DEBUG)
             image_data = self._download_image(image_url)
             if not image_data:
                 return "Failed to download or process the image. Please check the image URL and try again."
             
             # Create image-focused prompt
             prompt = self._create_image_prompt(message, context)
-            print(f"Generated prompt for image analysis: {len(prompt)} characters")
+            log(f"Generated prompt for image analysis: {len(prompt)} characters", DEBUG)
             
             # Generate content with image
-            print("Sending image and prompt to Gemini...")
-            response = self.model.generate_content([prompt, image_data])
+            log("Sending image and prompt to Gemini...", DEBUG)
+            # Handles are content hashes; long (data) URLs are hashed for the cassette
+            image_ref = image_url if len(image_url) <= 512 else hashlib.sha256(image_url.encode()).hexdigest()
+            with track_external('gemini', 'image'):
+                text = outbound.call('gemini', 'image', {'model': GEMINI_MODEL, 'prompt': prompt, 'image': image_ref},
+                                     lambda: self.model.generate_content([prompt, image_data]).text)
             
-            if response.text:
-                print("Successfully received response from Gemini!")
-                return response.text.strip()
+            if text:
+                log("Successfully received response from Gemini!", DEBUG)
+                return text.strip()
             else:
-                print("Gemini returned empty response")
+                log("Gemini returned empty response", WARNING)
                 return "I can see the image, but I'm having trouble analyzing it right now. Could you try asking a more specific question about what you'd like to know?"
                 
         except Exception as e:
-            print(f"Gemini image analysis error: {e}")
+            log(f"Gemini image analysis error: {e}", ERROR)
             import traceback
             traceback.print_exc()
             return f"I'm having trouble analyzing the image right now. Error: {str(e)}"
     
+    @traced('GeminiChatbot.load_image', 'model')
     def _download_image(self, image_url: str):
         """
         Download and prepare image for Gemini analysis
         """
         try:
-            print(f"Downloading image from: {image_url[:100]}...")
+            log(f"Downloading image from: {image_url[:100]}...", DEBUG)
+            
+            # Handles from /api/images - already decoded, pyramid level fits Gemini
+            if is_image_handle(image_url):
+                pil_image = load_image(image_url, GEMINI_IMAGE_EDGE)
+                if pil_image is None:
+                    log(f"Image handle expired: {image_url}", WARNING)
+                else:
+                    log(f"Loaded image handle: {pil_image.info['source_size']} -> {pil_image.size}", DEBUG)
+                return pil_image
             
             # Handle data URLs (base64 encoded images)
             if image_url.startswith('data:image'):
                 # Extract base64 data
                 header, data = image_url.split(',', 1)
                 image_bytes = base64.b64decode(data)
-                pil_image = Image.open(io.BytesIO(image_bytes))
-                print(f"Successfully loaded base64 image: {pil_image.size}")
+                pil_image = decode_scaled(image_bytes, GEMINI_IMAGE_EDGE)
+                log(f"Successfully loaded base64 image: {pil_image.info['source_size']} -> {pil_image.size}", DEBUG)
                 return pil_image
             
             # Handle regular URLs (Firebase Storage, etc.)
@@ -139,16 +199,16 @@ class GeminiChatbot:
                 }
                 response = requests.get(image_url, timeout=30, headers=headers)
                 response.raise_for_status()
-                pil_image = Image.open(io.BytesIO(response.content))
-                print(f"Successfully downloaded image: {pil_image.size}")
+                pil_image = decode_scaled(response.content, GEMINI_IMAGE_EDGE)
+                log(f"Successfully downloaded image: {pil_image.info['source_size']} -> {pil_image.size}", DEBUG)
                 return pil_image
             
             else:
-                print(f"Unsupported image URL format: {image_url[:100]}...")
+                log(f"Unsupported image URL format: {image_url[:100]}...", WARNING)
                 return None
                 
         except Exception as e:
-            print(f"Error downloading image: {e}")
+            log(f"Error downloading image: {e}", ERROR)
             import traceback
             traceback.print_exc()
             return None
@@ -0,0 +1,32 @@
+"""
+HTTP Conditional Caching
+Strong ETags and Cache-Control for content-derived responses
+
+Everything the backend renders from an image is a pure function of the
+input pixels, the request parameters and the engine version - so the ETag
+can be computed from those before any work is done:
+    etag = sha256(input hash : parameters : engine version)[:32]
+1. A matching If-None-Match is answered with 304 without decoding,
+   processing or encoding anything
+2. Content-addressed URLs (/blobs/<id>/...) never change, so they are
+   sent as immutable - browsers skip even the revalidation request
+3. Responses whose URL can change state (job results) get the same ETag
+   with no-cache - revalidated every time, re-sent only when changed
+
+Configuration (environment):
+    IMMUTABLE_MAX_AGE - max-age for immutable responses (default 1 year)
+"""
+
+import hashlib
+import os
+
+IMMUTABLE_MAX_AGE = int(os.getenv('IMMUTABLE_MAX_AGE', 365 * 24 * 3600))
+
+CACHE_IMMUTABLE = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+CACHE_REVALIDATE = 'no-cache'
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag value (unquoted) for the given identity parts"""
+    identity = ':'.join(str(part) for part in parts)
+    return hashlib.sha256(identity.encode()).hexdigest()[:32]
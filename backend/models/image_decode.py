@@ -0,0 +1,96 @@
+"""
+Reduced-Resolution Decoding
+Decode only as many pixels as the consumer is going to keep
+
+Several consumers shrink their input right away (400px analysis outputs,
+artifact detection, Gemini image input), but a 6000px upload was always
+fully decoded first. decode_scaled() knows the target size up front:
+1. JPEG: Image.draft decodes at 1/2, 1/4 or 1/8 scale in the DCT domain,
+   so a 6000px scan destined for 400px never exists at full size
+2. The rest of the way uses resize() with reducing_gap - a cheap integer
+   Image.reduce first, then a short high-quality resample
+3. Other formats (and already-decoded images) skip step 1 only
+4. The EXIF orientation is applied (after the reduction, so on the small
+   image) - camera uploads are stored sideways with a rotation tag
+
+The original size (as displayed, i.e. oriented), format and mode are kept
+in image.info ('source_size', 'source_format', 'source_mode') for callers
+that report them.
+
+Full-resolution consumers (/api/process-image, scrub session statistics)
+do not use this - their output depends on every pixel.
+
+Configuration (environment):
+    DECODE_REDUCING_GAP - resize reducing_gap (default 2.0; 0 disables)
+"""
+
+from PIL import Image, ImageOps
+from .metrics import DECODE_SECONDS
+from .tracing import add_span
+import io
+import os
+import time
+
+DECODE_REDUCING_GAP = float(os.getenv('DECODE_REDUCING_GAP', 2.0)) or None
+
+# EXIF orientation tag, and its values that swap width and height
+EXIF_ORIENTATION = 0x0112
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def target_size(size: tuple, max_edge: int) -> tuple:
+    """Size that fits max_edge, keeping the aspect ratio (never upscales)"""
+    width, height = size
+    if width <= max_edge and height <= max_edge:
+        return size
+    ratio = min(max_edge / width, max_edge / height)
+    return (max(1, int(width * ratio)), max(1, int(height * ratio)))
+
+
+def decode_scaled(source, max_edge: int = None, mode: str = None,
+                  resample=Image.Resampling.BILINEAR) -> Image.Image:
+    """
+    Decode an image at (about) the size it will be used at
+    
+    Args:
+        source: encoded bytes, a binary file-like object or a PIL Image
+            (an unloaded Image.open() result still gets DCT scaling)
+        max_edge: longest edge of the result (None = full size)
+        mode: convert to this mode (JPEG can decode straight to 'L'/'RGB')
+        resample: filter for the final resize
+    
+    Returns:
+        Loaded PIL Image with the source size/format/mode in image.info
+    """
+    start = time.perf_counter()
+    if isinstance(source, Image.Image):
+        image = source
+    else:
+        image = Image.open(source if hasattr(source, 'read') else io.BytesIO(source))
+    
+    transposed = image.getexif().get(EXIF_ORIENTATION) in TRANSPOSED_ORIENTATIONS
+    source_info = {
+        'source_size': image.size[::-1] if transposed else image.size,
+        'source_format': image.format,
+        'source_mode': image.mode
+    }
+    
+    target = target_size(image.size, max_edge) if max_edge else image.size
+    reduced = target != image.size
+    if reduced:
+        # No-op for non-JPEG and already-loaded images
+        image.draft(mode, target)
+        image = image.resize(target, resample, reducing_gap=DECODE_REDUCING_GAP)
+    else:
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    
+    if mode and image.mode != mode:
+        image = image.convert(mode)
+    
+    image.info.update(source_info)
+    elapsed = time.perf_counter() - start
+    kind = 'reduced' if reduced else 'full'
+    DECODE_SECONDS.observe(elapsed, kind=kind)
+    add_span('decode', elapsed, 'image', kind=kind, size=f'{image.width}x{image.height}')
+    return image
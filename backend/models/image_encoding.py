@@ -0,0 +1,138 @@
+"""
+Output Image Encoding
+Encoder presets and response formats for processed images
+
+/api/process-image used to return every result as a JPEG data URL inside
+JSON: base64 adds ~33% to the payload, the bytes are copied several times
+on the way out, and the browser has to decode the base64 again. Results
+can now be returned as:
+    json      - data URL inside JSON (default, unchanged)
+    url       - JSON with a short /blobs/<id> URL (models/blob_store.py)
+    binary    - the encoded image as the body, metadata in X-Result-Metadata
+    multipart - multipart/mixed: a JSON part followed by the image part
+
+and encoded with any of these presets:
+    jpeg - fast (q85) / balanced (q90, the old output) / small (q82, optimized, progressive)
+    webp - fast (method 0) / balanced (method 4) / small (q80, method 6)
+    png  - fast (level 1) / balanced (level 6) / small (level 9, optimized)
+
+Configuration (environment):
+    OUTPUT_FORMAT - default encoder (default jpeg)
+    OUTPUT_PRESET - default preset (default balanced)
+"""
+
+from .metrics import ENCODE_SECONDS
+from .tracing import span
+import io
+import json
+import os
+import uuid
+
+FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'webp': ('WEBP', 'image/webp'),
+    'png': ('PNG', 'image/png')
+}
+
+PRESETS = {
+    'jpeg': {
+        'fast': {'quality': 85, 'optimize': False},
+        'balanced': {'quality': 90, 'optimize': False},
+        'small': {'quality': 82, 'optimize': True, 'progressive': True}
+    },
+    'webp': {
+        'fast': {'quality': 85, 'method': 0},
+        'balanced': {'quality': 85, 'method': 4},
+        'small': {'quality': 80, 'method': 6}
+    },
+    'png': {
+        'fast': {'compress_level': 1},
+        'balanced': {'compress_level': 6},
+        'small': {'compress_level': 9, 'optimize': True}
+    }
+}
+
+ALIASES = {'jpg': 'jpeg'}
+
+RESPONSE_MODES = ('json', 'url', 'binary', 'multipart')
+
+OUTPUT_FORMAT = os.getenv('OUTPUT_FORMAT', 'jpeg')
+OUTPUT_PRESET = os.getenv('OUTPUT_PRESET', 'balanced')
+
+
+def resolve_encoder(output_format: str = None, preset: str = None) -> tuple:
+    """
+    Normalize an encoder choice -> (format, preset)
+    
+    Raises:
+        ValueError: unknown format or preset
+    """
+    output_format = (output_format or OUTPUT_FORMAT).lower()
+    output_format = ALIASES.get(output_format, output_format)
+    preset = (preset or OUTPUT_PRESET).lower()
+    
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}' (use {', '.join(FORMATS)})")
+    if preset not in PRESETS[output_format]:
+        raise ValueError(f"Unknown preset '{preset}' (use {', '.join(PRESETS[output_format])})")
+    return output_format, preset
+
+
+def mimetype_for(output_format: str) -> str:
+    return FORMATS[output_format][1]
+
+
+def encode_image(image, output_format: str = 'jpeg', preset: str = 'balanced') -> bytes:
+    """Encode a PIL image with a preset"""
+    buffered = io.BytesIO()
+    with ENCODE_SECONDS.time(format=output_format, preset=preset), \
+            span('encode', 'image', format=output_format, preset=preset):
+        image.save(buffered, format=FORMATS[output_format][0], **PRESETS[output_format][preset])
+    return buffered.getvalue()
+
+
+def negotiate_response(requested: str = None, accept: str = '') -> str:
+    """
+    Pick a response mode - an explicit request wins, then the Accept header
+    
+    Raises:
+        ValueError: unknown explicit mode
+    """
+    if requested:
+        requested = requested.lower()
+        if requested not in RESPONSE_MODES:
+            raise ValueError(f"Unknown response mode '{requested}' (use {', '.join(RESPONSE_MODES)})")
+        return requested
+    
+    accept = (accept or '').lower()
+    if 'multipart/mixed' in accept:
+        return 'multipart'
+    if accept.startswith('image/'):
+        return 'binary'
+    return 'json'
+
+
+def metadata_header(fields: dict) -> str:
+    """JSON for an HTTP header - ASCII-escaped so emoji survive latin-1"""
+    return json.dumps(fields, ensure_ascii=True, separators=(',', ':'))
+
+
+def multipart_parts(fields: dict, image_bytes: bytes, mimetype: str) -> tuple:
+    """
+    multipart/mixed envelope as a list of chunks (the image is not copied)
+    
+    Returns:
+        (chunks, content_type, content_length)
+    """
+    boundary = uuid.uuid4().hex
+    metadata = json.dumps(fields).encode()
+    chunks = [
+        f'--{boundary}\r\nContent-Type: application/json\r\n'
+        f'Content-Length: {len(metadata)}\r\n\r\n'.encode(),
+        metadata,
+        f'\r\n--{boundary}\r\nContent-Type: {mimetype}\r\n'
+        f'Content-Length: {len(image_bytes)}\r\n\r\n'.encode(),
+        image_bytes,
+        f'\r\n--{boundary}--\r\n'.encode()
+    ]
+    return chunks, f'multipart/mixed; boundary={boundary}', sum(len(chunk) for chunk in chunks)
@@ -0,0 +1,161 @@
+"""
+Image Handles
+Upload an artifact image once, refer to it everywhere by handle
+
+The same image used to travel with every call - a data URL to
+/api/auto-analyze, a multipart file to /api/process-image, and the
+imageUrl context of every Gemini chat turn, each decoded again on arrival.
+ingest_image() instead:
+1. Decodes once and applies the EXIF orientation (phone photos come out
+   upright everywhere)
+2. Converts to RGB and names the result by its pixels:
+       handle = 'img_' + sha256(pixels)[:32]
+   so re-uploading the same image returns the same handle
+3. Stores the full image and a small resolution pyramid (longest edge
+   2048/1024/512/256) as raw RGB in the shared tier (namespace 'images')
+
+load_image(handle, max_edge) returns the smallest stored level that still
+covers max_edge, from worker memory or the shared tier - no decoding.
+
+Configuration (environment):
+    IMAGE_HANDLE_TTL         - seconds a handle stays valid (default 86400)
+    IMAGE_PYRAMID            - pyramid edges, comma separated (default 2048,1024,512,256)
+    IMAGE_HANDLE_CACHE_BYTES - per-worker memory for loaded levels (default 256MB)
+"""
+
+from PIL import Image
+from .bounded_cache import get_cache, image_content_hash
+from .image_decode import decode_scaled
+from .result_cache import pack_result, unpack_result
+from .shared_cache import shared_cache
+from .tracing import log
+import os
+import re
+import time
+
+IMAGE_HANDLE_TTL = int(os.getenv('IMAGE_HANDLE_TTL', 24 * 3600))
+IMAGE_PYRAMID = tuple(int(edge) for edge in os.getenv('IMAGE_PYRAMID', '2048,1024,512,256').split(','))
+IMAGE_HANDLE_CACHE_BYTES = int(os.getenv('IMAGE_HANDLE_CACHE_BYTES', 256 * 1024 * 1024))
+
+SHARED_NAMESPACE = 'images'
+
+HANDLE_PREFIX = 'img_'
+_HANDLE_PATTERN = re.compile(r'^img_[0-9a-f]{32}$')
+
+_levels = get_cache(
+    'image_handles',
+    max_bytes=IMAGE_HANDLE_CACHE_BYTES,
+    sizeof=lambda image: image.width * image.height * 3
+)
+
+
+def is_image_handle(value) -> bool:
+    return isinstance(value, str) and bool(_HANDLE_PATTERN.match(value))
+
+
+def _level_key(handle: str, level) -> str:
+    return f'{handle}:{level}'
+
+
+def _store_level(handle: str, level, image: Image.Image):
+    shared_cache.put(
+        SHARED_NAMESPACE,
+        _level_key(handle, level),
+        pack_result({'size': image.size}, image.tobytes()),
+        ttl=IMAGE_HANDLE_TTL
+    )
+    _levels.put(_level_key(handle, level), image)
+
+
+def _fetch_level(handle: str, level):
+    key = _level_key(handle, level)
+    image = _levels.get(key)
+    if image is None:
+        record = shared_cache.get(SHARED_NAMESPACE, key)
+        if record is not None:
+            header, data = unpack_result(record)
+            image = Image.frombytes('RGB', tuple(header['size']), data)
+            _levels.put(key, image)
+    return image
+
+
+def get_image_info(handle: str):
+    """Stored metadata for a handle, or None if unknown/expired"""
+    if not is_image_handle(handle):
+        return None
+    return shared_cache.get_json(SHARED_NAMESPACE, _level_key(handle, 'info'))
+
+
+def ingest_image(source) -> tuple:
+    """
+    Decode, EXIF-normalize and store an image
+    
+    Args:
+        source: encoded bytes, a binary stream or an unloaded PIL Image
+    
+    Returns:
+        (handle, info, status) - status is 'cached' or 'created'
+    """
+    start = time.time()
+    image = decode_scaled(source)  # Applies the EXIF orientation
+    source_format = image.info.get('source_format')
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    
+    handle = HANDLE_PREFIX + image_content_hash(image)[:32]
+    info = get_image_info(handle)
+    if info is not None:
+        return handle, info, 'cached'
+    
+    _store_level(handle, 'full', image)
+    levels = []
+    level = image
+    for edge in sorted(IMAGE_PYRAMID, reverse=True):
+        if max(image.size) <= edge:
+            continue
+        # Each level is reduced from the previous one, not from full size
+        level = level.copy()
+        level.thumbnail((edge, edge), Image.Resampling.LANCZOS, reducing_gap=2.0)
+        _store_level(handle, edge, level)
+        levels.append({'edge': edge, 'size': f"{level.width}x{level.height}"})
+    
+    info = {
+        'handle': handle,
+        'width': image.width,
+        'height': image.height,
+        'format': source_format,
+        'levels': levels
+    }
+    shared_cache.put_json(SHARED_NAMESPACE, _level_key(handle, 'info'), info, ttl=IMAGE_HANDLE_TTL)
+    log(f"[IMAGES] Ingested {handle} ({image.width}x{image.height}, "
+        f"{len(levels)} pyramid levels) in {time.time()-start:.2f}s")
+    return handle, info, 'created'
+
+
+def load_image(handle: str, max_edge: int = None):
+    """
+    Image for a handle - the smallest stored level with a longest edge of
+    at least max_edge (full size when max_edge is None)
+    
+    Returns:
+        RGB PIL Image (shared - copy before modifying), or None if unknown/expired
+    """
+    info = get_image_info(handle)
+    if info is None:
+        return None
+    
+    level = 'full'
+    if max_edge:
+        covering = [entry['edge'] for entry in info['levels'] if entry['edge'] >= max_edge]
+        if covering:
+            level = min(covering)
+    
+    image = _fetch_level(handle, level)
+    if image is None and level != 'full':
+        image = _fetch_level(handle, 'full')
+    if image is not None:
+        # Same keys as a reduced decode (models/image_decode.py)
+        image.info['source_size'] = (info['width'], info['height'])
+        image.info['source_format'] = info['format']
+        image.info['source_mode'] = 'RGB'
+    return image
@@ -0,0 +1,172 @@
+"""
+Intensity Scrubbing Engine
+Interactive intensity previews without rerunning the pipeline
+
+Dragging the intensity slider used to send a full /api/process-image
+request per step. A scrub session does the expensive work once:
+1. Decode, RGB-convert and measure image-global statistics at full
+   resolution (so previews make the same adaptive decisions as the final run)
+2. Resize to preview size and run the intensity-independent stage
+   (restoration denoise / super-resolution LANCZOS upscale)
+3. Run the intensity-dependent stages at a handful of anchor intensities
+
+Any intensity is then rendered by blending the two neighbouring anchors -
+a single Image.blend at preview size, a few milliseconds.
+
+Both pipelines switch stages on at fixed thresholds (unsharp mask above
+0.5, edge enhance above 0.8, ...), so anchors sit on both sides of every
+threshold and a blend never mixes "stage on" with "stage off".
+
+Sessions live in worker memory and in the shared tier, so any gunicorn
+worker can render a session another worker started.
+
+Configuration (environment):
+    SCRUB_PREVIEW_EDGE  - longest edge of preview output (default 1024)
+    SCRUB_SESSION_TTL   - seconds a session is kept (default 1800)
+    SCRUB_CACHE_BYTES   - per-worker memory for sessions (default 128MB)
+"""
+
+from PIL import Image
+from .bounded_cache import get_cache, image_content_hash
+from .result_cache import ENGINE_VERSION, pack_result, unpack_result
+from .shared_cache import shared_cache
+from .tracing import log
+from .ultra_fast_restoration import analyze_restoration_input, denoise_stage, restore_intensity_stages
+from .ultra_fast_super_resolution import SCALE_FACTOR, upscale_stage, enhance_intensity_stages
+import bisect
+import hashlib
+import os
+import time
+
+SCRUB_PREVIEW_EDGE = int(os.getenv('SCRUB_PREVIEW_EDGE', 1024))
+SCRUB_SESSION_TTL = int(os.getenv('SCRUB_SESSION_TTL', 1800))
+SCRUB_CACHE_BYTES = int(os.getenv('SCRUB_CACHE_BYTES', 128 * 1024 * 1024))
+
+# Anchor intensities per pipeline - pairs like (0.5, 0.51) straddle a stage
+# threshold (the slider moves in 0.01 steps, so nothing falls in between)
+ANCHORS = {
+    'restoration': (0.0, 0.25, 0.5, 0.51, 0.65, 0.8, 0.81, 1.0),
+    'super-resolution': (0.0, 0.3, 0.6, 0.61, 0.8, 1.0)
+}
+
+SHARED_NAMESPACE = 'scrub'
+
+_sessions = get_cache(
+    'scrub_sessions',
+    max_bytes=SCRUB_CACHE_BYTES,
+    ttl=SCRUB_SESSION_TTL,
+    sizeof=lambda session: session.nbytes
+)
+
+
+class ScrubSession:
+    """
+    Anchor previews for one (image, process type) pair
+    """
+    
+    def __init__(self, process_type: str, intensities: tuple, anchors: list, original_size: tuple):
+        self.process_type = process_type
+        self.intensities = tuple(intensities)
+        self.anchors = anchors
+        self.original_size = tuple(original_size)
+    
+    @property
+    def size(self) -> tuple:
+        return self.anchors[0].size
+    
+    @property
+    def nbytes(self) -> int:
+        width, height = self.size
+        return width * height * 3 * len(self.anchors)
+    
+    def render(self, intensity: float) -> Image.Image:
+        """Preview at any intensity - exact at anchors, blended in between"""
+        intensity = min(max(intensity, self.intensities[0]), self.intensities[-1])
+        upper = bisect.bisect_left(self.intensities, intensity)
+        if self.intensities[upper] == intensity:
+            return self.anchors[upper]
+        
+        low, high = self.intensities[upper - 1], self.intensities[upper]
+        weight = (intensity - low) / (high - low)
+        return Image.blend(self.anchors[upper - 1], self.anchors[upper], weight)
+    
+    def pack(self) -> bytes:
+        """Serialize for the shared tier (raw RGB anchors, no re-encoding)"""
+        return pack_result({
+            'process_type': self.process_type,
+            'intensities': self.intensities,
+            'size': self.size,
+            'original_size': self.original_size
+        }, b''.join(anchor.tobytes() for anchor in self.anchors))
+    
+    @classmethod
+    def unpack(cls, record: bytes) -> 'ScrubSession':
+        header, data = unpack_result(record)
+        size = tuple(header['size'])
+        step = size[0] * size[1] * 3
+        anchors = [
+            Image.frombytes('RGB', size, data[i * step:(i + 1) * step])
+            for i in range(len(header['intensities']))
+        ]
+        return cls(header['process_type'], header['intensities'], anchors, header['original_size'])
+
+
+def _preview_input(image: Image.Image, max_edge: int) -> Image.Image:
+    """Downscale so the longest edge fits max_edge (never upscales)"""
+    preview = image.copy()
+    preview.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    return preview
+
+
+def _session_id(content_hash: str, process_type: str) -> str:
+    key = f'{content_hash}:{process_type}:{SCRUB_PREVIEW_EDGE}:v{ENGINE_VERSION}'
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def build_scrub_session(image: Image.Image, process_type: str) -> ScrubSession:
+    """Run the intensity-independent work once and render every anchor"""
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    intensities = ANCHORS[process_type]
+    
+    if process_type == 'super-resolution':
+        base = upscale_stage(_preview_input(image, SCRUB_PREVIEW_EDGE // SCALE_FACTOR))
+        anchors = [enhance_intensity_stages(base, t) for t in intensities]
+    else:
+        analysis = analyze_restoration_input(image)
+        base = denoise_stage(_preview_input(image, SCRUB_PREVIEW_EDGE), analysis)
+        anchors = [restore_intensity_stages(base, t, analysis) for t in intensities]
+    
+    return ScrubSession(process_type, intensities, anchors, image.size)
+
+
+def start_scrub_session(image: Image.Image, process_type: str) -> tuple:
+    """
+    Get or build the scrub session for an image
+    
+    Returns:
+        (session_id, session, status) - status is 'cached' or 'created'
+    """
+    session_id = _session_id(image_content_hash(image), process_type)
+    session = get_scrub_session(session_id)
+    if session is not None:
+        return session_id, session, 'cached'
+    
+    start = time.time()
+    session = build_scrub_session(image, process_type)
+    _sessions.put(session_id, session)
+    shared_cache.put(SHARED_NAMESPACE, session_id, session.pack(), ttl=SCRUB_SESSION_TTL)
+    log(f"[SCRUB] Session {session_id[:8]} ready in {time.time()-start:.2f}s | "
+        f"{len(session.anchors)} anchors at {session.size[0]}x{session.size[1]}")
+    return session_id, session, 'created'
+
+
+def get_scrub_session(session_id: str):
+    """Look a session up in this worker, then in the shared tier"""
+    session = _sessions.get(session_id)
+    if session is None:
+        record = shared_cache.get(SHARED_NAMESPACE, session_id)
+        if record is not None:
+            session = ScrubSession.unpack(record)
+            _sessions.put(session_id, session)
+    return session
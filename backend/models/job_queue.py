@@ -0,0 +1,288 @@
+"""
+Asynchronous Job Queue
+Submit / poll / cancel for long-running image processing
+
+/api/process-image holds a gunicorn sync worker for the whole pipeline, so a
+few ULTRA requests block every chat and health request. Jobs instead run on
+a bounded local process pool and the request returns a job id immediately.
+
+Job state lives in the shared tier (namespace 'jobs'), so any gunicorn
+worker can answer a status poll or a cancellation - not just the worker
+that accepted the job. Results go to the result cache, which is shared too.
+
+Lifecycle: queued -> running -> done | failed | cancelled
+- Queued jobs are cancelled immediately
+- Running jobs can't be interrupted safely; they are flagged and their
+  result is discarded when they finish. The flag is its own key
+  ('<id>:cancel'), never a field rewritten into the record, so a cancel
+  that lands while the job is being updated can't be lost
+- On shutdown the pool drains: running jobs finish, queued ones are
+  cancelled (marked for resubmission). drain() must run before the
+  interpreter exits - concurrent.futures' own exit hook runs before
+  atexit handlers and waits for every queued job - so it is called from
+  gunicorn's worker_exit hook (gunicorn.conf.py) or when app.run() returns
+
+Job processes start from a forkserver, not as forks of the serving
+process: a gunicorn worker has request threads, and a fork copies their
+locks (SQLite, logging, PIL) in whatever state they were in. The pool
+initializer (_init_job_process) sets up the per-process state.
+
+Queued jobs wait here, not in the executor - it hands work to its
+processes ahead of time, where it can no longer be cancelled - and are
+submitted one at a time as pool workers free up.
+
+Configuration (environment):
+    JOB_WORKERS      - concurrent jobs per server process (default 2)
+    JOB_QUEUE_LIMIT  - jobs waiting beyond those running (default 16)
+    JOB_TTL          - seconds job records are kept (default 3600)
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from .shared_cache import shared_cache
+from .tile_engine import run_tiles_inline
+from .tracing import log, ERROR
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+JOB_QUEUE_LIMIT = int(os.getenv('JOB_QUEUE_LIMIT', 16))
+JOB_TTL = int(os.getenv('JOB_TTL', 3600))
+
+SHARED_NAMESPACE = 'jobs'
+
+FINAL_STATES = ('done', 'failed', 'cancelled')
+
+
+class JobQueueFull(Exception):
+    """Raised when the queue is at capacity or shutting down"""
+    pass
+
+
+def _save_job(job: dict):
+    shared_cache.put_json(SHARED_NAMESPACE, job['id'], job, ttl=JOB_TTL)
+
+
+def _cancel_key(job_id: str) -> str:
+    return f'{job_id}:cancel'
+
+
+def _cancel_requested(job_id: str) -> bool:
+    return shared_cache.get(SHARED_NAMESPACE, _cancel_key(job_id)) is not None
+
+
+def _load_job(job_id: str):
+    job = shared_cache.get_json(SHARED_NAMESPACE, job_id)
+    if job is not None and job['status'] not in FINAL_STATES and _cancel_requested(job_id):
+        job['cancel_requested'] = True
+    return job
+
+
+def _init_job_process():
+    """Pool initializer - fresh shared tier connection, tiles inline"""
+    shared_cache.reopen()
+    # Job processes run their tiles inline (see models/tile_engine.py)
+    run_tiles_inline()
+
+
+def _run_job(job_id, fn, args):
+    """Pool entry point - skips jobs cancelled while queued elsewhere"""
+    if _cancel_requested(job_id):
+        return None
+    job = _load_job(job_id)
+    if job is not None:
+        job['status'] = 'running'
+        job['started_at'] = time.time()
+        _save_job(job)
+    return fn(*args)
+
+
+class JobQueue:
+    """
+    Bounded process pool with job state in the shared tier
+    """
+    
+    def __init__(self, workers: int = JOB_WORKERS, queue_limit: int = JOB_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        
+        self._executor = None
+        self._executor_pid = None
+        self._queued = OrderedDict()  # job id -> (fn, args, on_done), not yet on the pool
+        self._futures = {}            # job id -> future, running on the pool
+        self._lock = threading.Lock()
+        self._draining = False
+        
+        self.stats_counters = {
+            'submitted': 0,
+            'done': 0,
+            'failed': 0,
+            'cancelled': 0,
+            'rejected': 0
+        }
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Lazily create the pool in the serving process (after gunicorn forks)"""
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('forkserver'),
+                initializer=_init_job_process
+            )
+            self._executor_pid = os.getpid()
+        return self._executor
+    
+    def get(self, job_id: str):
+        """Job record (from any worker), or None if unknown/expired"""
+        return _load_job(job_id)
+    
+    def create(self, status: str = 'queued', job_id: str = None, **info) -> dict:
+        """Record a job without running it (e.g. already answered from cache)"""
+        now = time.time()
+        job = {
+            'id': job_id or uuid.uuid4().hex,
+            'status': status,
+            'created_at': now,
+            **info
+        }
+        if status in FINAL_STATES:
+            job['finished_at'] = now
+        _save_job(job)
+        return job
+    
+    def submit(self, fn, args: tuple = (), on_done=None, **info) -> dict:
+        """
+        Queue fn(*args) on the pool
+        
+        fn must be a picklable module-level function. on_done(result) runs in
+        this process when the job succeeds (e.g. to store the result).
+        
+        Raises:
+            JobQueueFull: at capacity or shutting down
+        """
+        with self._lock:
+            if self._draining or len(self._queued) + len(self._futures) >= self.workers + self.queue_limit:
+                self.stats_counters['rejected'] += 1
+                raise JobQueueFull('Server is shutting down' if self._draining else 'Job queue is full')
+            
+            job = self.create(**info)
+            self._queued[job['id']] = (fn, args, on_done)
+            self.stats_counters['submitted'] += 1
+        
+        self._dispatch()
+        return job
+    
+    def _dispatch(self):
+        """Move queued jobs onto free pool workers"""
+        started = []
+        with self._lock:
+            while self._queued and len(self._futures) < self.workers and not self._draining:
+                job_id, (fn, args, on_done) = self._queued.popitem(last=False)
+                future = self._get_executor().submit(_run_job, job_id, fn, args)
+                self._futures[job_id] = future
+                started.append((job_id, on_done, future))
+        
+        # Outside the lock - a future that is already done runs its callback here
+        for job_id, on_done, future in started:
+            future.add_done_callback(partial(self._finish, job_id, on_done))
+    
+    def _finish(self, job_id, on_done, future):
+        with self._lock:
+            self._futures.pop(job_id, None)
+        
+        job = _load_job(job_id) or {'id': job_id}
+        job['finished_at'] = time.time()
+        
+        if future.cancelled():
+            job['status'] = 'cancelled'
+        elif future.exception() is not None:
+            job['status'] = 'failed'
+            job['error'] = str(future.exception())
+            log(f"Job {job_id} failed: {future.exception()}", ERROR)
+        elif future.result() is None or _cancel_requested(job_id):
+            job['status'] = 'cancelled'
+            job['cancel_requested'] = True
+        else:
+            try:
+                if on_done:
+                    on_done(future.result())
+                job['status'] = 'done'
+            except Exception as e:
+                job['status'] = 'failed'
+                job['error'] = str(e)
+        
+        self._record_final(job)
+        self._dispatch()
+    
+    def _record_final(self, job: dict):
+        with self._lock:
+            self.stats_counters[job['status']] += 1
+        _save_job(job)
+    
+    def _cancel_queued(self, job_id: str, error: str = None):
+        """Record a job that never reached the pool as cancelled"""
+        job = _load_job(job_id) or {'id': job_id}
+        job['status'] = 'cancelled'
+        job['finished_at'] = time.time()
+        if error:
+            job['error'] = error
+        self._record_final(job)
+        return job
+    
+    def cancel(self, job_id: str):
+        """
+        Cancel a job - immediate if still queued in this process, otherwise
+        flagged so it is skipped (queued elsewhere) or discarded (running)
+        
+        Returns:
+            Updated job record, or None if unknown
+        """
+        job = _load_job(job_id)
+        if job is None or job['status'] in FINAL_STATES:
+            return job
+        
+        with self._lock:
+            queued = self._queued.pop(job_id, None)
+        if queued is not None:
+            return self._cancel_queued(job_id)
+        
+        # Written under its own key - the record itself may be rewritten
+        # concurrently by the pool process or _finish
+        shared_cache.put(SHARED_NAMESPACE, _cancel_key(job_id), b'1', ttl=JOB_TTL)
+        job['cancel_requested'] = True
+        return job
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats_counters,
+                'active': len(self._queued) + len(self._futures),
+                'running': len(self._futures),
+                'workers': self.workers,
+                'queue_limit': self.queue_limit,
+                'draining': self._draining
+            }
+    
+    def drain(self):
+        """Graceful shutdown - finish running jobs, cancel queued ones"""
+        with self._lock:
+            self._draining = True
+            executor = self._executor if self._executor_pid == os.getpid() else None
+            queued = list(self._queued)
+            self._queued.clear()
+            running = len(self._futures)
+        
+        for job_id in queued:
+            self._cancel_queued(job_id, 'Server shutting down - please resubmit')
+        if executor is not None:
+            if queued or running:
+                log(f"[JOBS] Draining: {running} running job(s) finish, {len(queued)} queued cancelled")
+            executor.shutdown(wait=True)
+
+
+# Global instance (drained by gunicorn.conf.py's worker_exit hook)
+job_queue = JobQueue()
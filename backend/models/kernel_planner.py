@@ -0,0 +1,197 @@
+"""
+LINEAR Filter Chain Planner
+Collapses runs of linear convolution filters and blends into composite kernels
+
+SMOOTH, DETAIL, SHARPEN, EDGE_ENHANCE and friends are all linear, and so are
+the blends the pipelines put between them:
+
+    Image.blend(x, F(x), a)        == ((1 - a) * identity + a * K_F) (x)
+    ImageEnhance.Sharpness(x)(f)   == blend(x, SMOOTH(x), 1 - f)
+
+A run of them is therefore one linear filter - up to clipping. PIL clamps
+every pass to 0-255, and a kernel with negative weights (DETAIL, SHARPEN,
+EDGE_ENHANCE, Sharpness > 1) can overshoot, so the planner only composes
+where no intermediate could have clipped:
+
+1. An op is a kernel when its filter is non-negative (SMOOTH at any
+   alpha) or it is the plain filter (alpha 1.0). A blended DETAIL/SHARPEN
+   clips before its blend, so it runs sequentially (filter + blend).
+2. A group of kernels closes after the first op that makes the composite
+   negative - only the last pass of a group may overshoot.
+3. PIL only accepts 3x3 and 5x5 kernels, so a group also closes when its
+   composite would outgrow 5x5.
+
+The kernels of a group are convolved together in NumPy, once per op
+sequence, and applied as one PIL Kernel filter.
+
+Accuracy: what remains is per-pass rounding (each pass rounds to 8 bits,
+the composite rounds once) - max 1 level vs the sequential chain on the
+ultra/quality tails of fast super resolution, fast restoration and
+advanced restoration, including high-contrast text; a sharpening gain
+after a composite can stretch that to 2. Border pixels are recomputed
+with the sequential chain so edges match.
+"""
+
+from PIL import Image, ImageFilter
+from .bounded_cache import get_cache, memoize
+import numpy as np
+
+# Linear built-in filters the planner understands
+LINEAR_FILTERS = {
+    'SMOOTH': ImageFilter.SMOOTH,
+    'SMOOTH_MORE': ImageFilter.SMOOTH_MORE,
+    'DETAIL': ImageFilter.DETAIL,
+    'SHARPEN': ImageFilter.SHARPEN,
+    'EDGE_ENHANCE': ImageFilter.EDGE_ENHANCE,
+    'EDGE_ENHANCE_MORE': ImageFilter.EDGE_ENHANCE_MORE,
+}
+
+# Largest kernel PIL's ImageFilter.Kernel accepts
+MAX_KERNEL_SIZE = 5
+
+# One plan per op sequence, i.e. per (mode, intensity)
+_plan_cache = get_cache('kernel_planner.plans', max_entries=256)
+
+
+def blend_op(filter_name: str, alpha: float = 1.0) -> tuple:
+    """Image.blend(x, FILTER(x), alpha) - alpha 1.0 is the plain filter"""
+    return (filter_name, float(alpha))
+
+
+def sharpness_op(factor: float) -> tuple:
+    """ImageEnhance.Sharpness(x).enhance(factor) as a linear op"""
+    return ('SMOOTH', 1.0 - float(factor))
+
+
+def _base_kernel(filter_name: str) -> np.ndarray:
+    size, scale, offset, kernel = LINEAR_FILTERS[filter_name].filterargs
+    return np.array(kernel, dtype=np.float64).reshape(size) / scale
+
+
+def _op_kernel(op: tuple) -> np.ndarray:
+    """Kernel of a single (filter, alpha) op"""
+    filter_name, alpha = op
+    kernel = _base_kernel(filter_name) * alpha
+    center = kernel.shape[0] // 2
+    kernel[center, center] += 1.0 - alpha
+    return kernel
+
+
+def _compose(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Full 2D convolution of two kernels (applying a, then b)"""
+    size = a.shape[0] + b.shape[0] - 1
+    out = np.zeros((size, size), dtype=np.float64)
+    for dy in range(b.shape[0]):
+        for dx in range(b.shape[1]):
+            out[dy:dy + a.shape[0], dx:dx + a.shape[1]] += b[dy, dx] * a
+    return out
+
+
+def _overshoots(kernel: np.ndarray) -> bool:
+    """Whether in-range input can leave 0-255, i.e. any negative weight"""
+    return bool((kernel < 0).any())
+
+
+def _is_kernel_op(op: tuple) -> bool:
+    """Whether one kernel pass reproduces filter + blend (see module docstring)"""
+    filter_name, alpha = op
+    return alpha == 1.0 or not _overshoots(_base_kernel(filter_name))
+
+
+def _to_filter(kernel: np.ndarray) -> ImageFilter.Kernel:
+    size = kernel.shape[0]
+    return ImageFilter.Kernel((size, size), kernel.ravel().tolist(), scale=1)
+
+
+@memoize(_plan_cache, key=lambda ops: ops)  # Exact ops - plans must not be shared across alphas
+def plan_linear_chain(ops: tuple) -> tuple:
+    """
+    Plan a run of linear ops
+
+    Args:
+        ops: tuple of (filter_name, alpha) pairs, applied in order
+
+    Returns:
+        tuple of (filter, group) pairs - one PIL filter per pass, plus the
+        ops it replaces (used to recompute borders). filter is None for an
+        op that has to run sequentially.
+    """
+    passes = []
+    kernel = None
+    group = []
+
+    for op in ops:
+        if op[1] == 0.0:
+            continue  # blend weight 0 is the identity
+        if not _is_kernel_op(op):
+            if kernel is not None:
+                passes.append((_to_filter(kernel), tuple(group)))
+                kernel, group = None, []
+            passes.append((None, (op,)))
+            continue
+        op_kernel = _op_kernel(op)
+        if kernel is not None and (
+                _overshoots(kernel) or kernel.shape[0] + op_kernel.shape[0] - 1 > MAX_KERNEL_SIZE):
+            passes.append((_to_filter(kernel), tuple(group)))
+            kernel, group = None, []
+        kernel = op_kernel if kernel is None else _compose(kernel, op_kernel)
+        group.append(op)
+
+    if kernel is not None:
+        passes.append((_to_filter(kernel), tuple(group)))
+
+    return tuple(passes)
+
+
+def _apply_sequential(image: Image.Image, ops: tuple) -> Image.Image:
+    """Reference implementation: one filter (and blend) per op"""
+    result = image
+    for filter_name, alpha in ops:
+        filtered = result.filter(LINEAR_FILTERS[filter_name])
+        result = filtered if alpha == 1.0 else Image.blend(result, filtered, alpha)
+    return result
+
+
+def _restore_borders(source: Image.Image, result: Image.Image, group: tuple) -> Image.Image:
+    """
+    PIL copies a kernel's border ring unchanged, so a 5x5 composite leaves
+    a 2px ring where the sequential 3x3 chain would have filtered the inner
+    pixel. Recompute the four edge bands sequentially and paste them back.
+    """
+    radius = len(group)
+    if radius < 2:
+        return result
+
+    width, height = source.size
+    depth = min(3 * radius, width, height)
+    keep = min(radius, depth)
+
+    # (band in source, ring inside that band, paste position)
+    bands = [
+        ((0, 0, width, depth), (0, 0, width, keep), (0, 0)),
+        ((0, height - depth, width, height), (0, depth - keep, width, depth), (0, height - keep)),
+        ((0, 0, depth, height), (0, 0, keep, height), (0, 0)),
+        ((width - depth, 0, width, height), (depth - keep, 0, depth, height), (width - keep, 0)),
+    ]
+    for band, ring, position in bands:
+        fixed = _apply_sequential(source.crop(band), group)
+        result.paste(fixed.crop(ring), position)
+    return result
+
+
+def apply_linear_chain(image: Image.Image, ops) -> Image.Image:
+    """
+    Apply a run of linear ops with the minimum number of convolution passes
+
+    Args:
+        image: Input PIL Image
+        ops: sequence of (filter_name, alpha) pairs (see blend_op/sharpness_op)
+    """
+    result = image
+    for kernel, group in plan_linear_chain(tuple(ops)):
+        if kernel is None:
+            result = _apply_sequential(result, group)
+            continue
+        filtered = result.filter(kernel)
+        result = _restore_borders(result, filtered, group)
+    return result
@@ -0,0 +1,207 @@
+"""
+Memory Accounting
+Per-run peak RSS, live PIL buffers and traced allocations
+
+Restoration keeps a dozen full-size intermediates alive at once (edges,
+masks, smoothed, detailed, textured...), and OOM-killed containers never
+said which request did it. Every pipeline run is now measured:
+1. Live image buffers - every PIL image created during the run (plus the
+   input) is tracked through a weak reference; the number and estimated
+   bytes alive at once are re-measured each time an image is created,
+   and the peak is kept. Pillow allocates pixel memory outside the Python
+   allocator, so this is the number tracemalloc can't give
+2. RSS - current RSS before and after (retained memory) and growth of the
+   process's peak RSS (ru_maxrss) during the run - what the OOM killer
+   sees
+3. Traced allocations - tracemalloc peak, only for debug runs: tracing
+   slows everything down, so it is serialized and never on by default
+
+Runs record heri_run_image_buffers / heri_run_image_buffer_bytes /
+heri_run_peak_rss_growth_bytes by process_type, mode and megapixel class.
+
+Caveats:
+- RSS is per process: with several request threads in a worker, a run's
+  RSS figures include what concurrent runs allocated
+- Tiles processed in the tile pool allocate in the pool processes, not
+  in the run's process
+
+Debug reports are requested per request with memory=1 (see app.py).
+"""
+
+from PIL import Image
+from .metrics import RUN_IMAGE_BUFFERS, RUN_IMAGE_BUFFER_BYTES, RUN_PEAK_RSS_GROWTH, PROCESS_RSS
+import contextvars
+import os
+import threading
+import tracemalloc
+import weakref
+
+try:
+    import resource
+except ImportError:
+    resource = None  # not on Windows - peak RSS growth is reported as None
+
+# Megapixel classes for metric labels: '<1', '1-4', '4-12', '12-24', '24+'
+MEGAPIXEL_CLASSES = (1, 4, 12, 24)
+
+# tracemalloc is process-wide - one traced run (or request profile) at a time
+tracemalloc_lock = threading.RLock()
+
+_current = contextvars.ContextVar('memory_usage', default=None)
+
+# A forked pool process must not report into the parent's run
+os.register_at_fork(after_in_child=lambda: _current.set(None))
+
+
+def megapixel_class(megapixels: float) -> str:
+    lower = 0
+    for bound in MEGAPIXEL_CLASSES:
+        if megapixels < bound:
+            return f'<{bound}' if lower == 0 else f'{lower}-{bound}'
+        lower = bound
+    return f'{lower}+'
+
+
+def image_buffer_bytes(image) -> int:
+    """Estimated pixel memory of a PIL image (0 until it is loaded)"""
+    if getattr(image, 'im', None) is None:
+        return 0
+    if image.mode in ('1', 'L', 'P'):
+        bytes_per_pixel = 1
+    elif image.mode.startswith('I;16'):
+        bytes_per_pixel = 2
+    else:
+        bytes_per_pixel = 4  # multi-band images are stored as 32-bit pixels
+    return image.width * image.height * bytes_per_pixel
+
+
+def current_rss():
+    """Resident set size of this process in bytes (None where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss():
+    """High-water RSS of this process in bytes (None without the resource module)"""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KB on Linux
+
+
+class MemoryUsage:
+    """
+    Context manager measuring one pipeline run
+    
+    Usage:
+        usage = MemoryUsage('restoration', 'ultra', image)
+        with usage:
+            result = restore_artifact_image(image, ...)
+        usage.report()
+    """
+    
+    def __init__(self, process_type: str, mode: str, image=None, trace_allocations: bool = False):
+        self.process_type = process_type
+        self.mode = mode
+        self.megapixels = image.width * image.height / 1e6 if image is not None else 0.0
+        self.trace_allocations = trace_allocations
+        
+        self._inputs = [image] if image is not None else []
+        self._images = []  # weak references (PIL images are unhashable)
+        self.buffers_peak = 0
+        self.buffer_bytes_peak = 0
+        self.traced_peak = None
+        self._token = None
+    
+    def track(self, image):
+        """Register a new image and re-measure the live set"""
+        self._images.append(weakref.ref(image))
+        self.measure()
+    
+    def measure(self):
+        self._images = [ref for ref in self._images if ref() is not None]
+        live_bytes = sum(image_buffer_bytes(ref()) for ref in self._images)
+        self.buffers_peak = max(self.buffers_peak, len(self._images))
+        self.buffer_bytes_peak = max(self.buffer_bytes_peak, live_bytes)
+    
+    def __enter__(self):
+        if self.trace_allocations:
+            tracemalloc_lock.acquire()
+            self._tracing_before = tracemalloc.is_tracing()
+            if not self._tracing_before:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        
+        self.rss_before = current_rss()
+        self.peak_rss_before = peak_rss()
+        self._token = _current.set(self)
+        for image in self._inputs:
+            self.track(image)
+        self._inputs = []
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        self.measure()
+        self.rss_after = current_rss()
+        self.peak_rss_after = peak_rss()
+        
+        if self.trace_allocations:
+            self.traced_peak = tracemalloc.get_traced_memory()[1]
+            if not self._tracing_before:
+                tracemalloc.stop()
+            tracemalloc_lock.release()
+        
+        if exc_type is None:
+            labels = {
+                'process_type': self.process_type,
+                'mode': self.mode,
+                'megapixels': megapixel_class(self.megapixels)
+            }
+            RUN_IMAGE_BUFFERS.observe(self.buffers_peak, **labels)
+            RUN_IMAGE_BUFFER_BYTES.observe(self.buffer_bytes_peak, **labels)
+            if self.peak_rss_after is not None:
+                RUN_PEAK_RSS_GROWTH.observe(self.peak_rss_after - self.peak_rss_before, **labels)
+            if self.rss_after is not None:
+                PROCESS_RSS.set(self.rss_after)
+        return False
+    
+    def report(self) -> dict:
+        """Debug metadata for the response"""
+        rss_delta = None
+        if self.rss_before is not None and self.rss_after is not None:
+            rss_delta = self.rss_after - self.rss_before
+        peak_growth = None
+        if self.peak_rss_before is not None and self.peak_rss_after is not None:
+            peak_growth = self.peak_rss_after - self.peak_rss_before
+        return {
+            'megapixels': round(self.megapixels, 2),
+            'image_buffers_peak': self.buffers_peak,
+            'image_buffer_bytes_peak': self.buffer_bytes_peak,
+            'rss_before_bytes': self.rss_before,
+            'rss_after_bytes': self.rss_after,
+            'rss_delta_bytes': rss_delta,
+            'peak_rss_growth_bytes': peak_growth,
+            'traced_peak_bytes': self.traced_peak
+        }
+
+
+def _install_image_hook():
+    """Report every PIL image created inside a measured run to that run"""
+    original_init = Image.Image.__init__
+    if getattr(original_init, '_memory_accounting', False):
+        return
+    
+    def init(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        usage = _current.get()
+        if usage is not None:
+            usage.track(self)
+    
+    init._memory_accounting = True
+    Image.Image.__init__ = init
+
+
+_install_image_hook()
@@ -0,0 +1,343 @@
+"""
+Metrics
+Prometheus text-format metrics aggregated across gunicorn workers
+
+The only performance signal used to be print() output ("[Stage 3/8]
+Complete in 0.41s", MP/s lines), one worker at a time. Counters, gauges
+and histograms are now kept per process and merged for /metrics:
+1. Each process (gunicorn worker or job pool process) records into its own
+   in-memory registry - an observation is a dict update under a lock
+2. A background thread writes the process's snapshot to the shared tier
+   (namespace 'metrics', one key per host:pid) every METRICS_FLUSH seconds
+3. render() merges every snapshot: counters and histograms are summed
+   across processes; gauges only over processes that are still flushing,
+   so a dead worker's in-flight count does not linger
+
+A forked child (job pool process) starts from zero and drops the parent's
+collectors. Snapshots of exited processes expire after METRICS_TTL, which
+Prometheus treats like any counter reset.
+
+Families (labels):
+    heri_http_requests_total             endpoint, method, status
+    heri_http_request_duration_seconds   endpoint, process_type, mode
+    heri_http_in_flight, heri_http_threads    saturation = in_flight / threads
+    heri_pipeline_stage_seconds          pipeline, stage
+    heri_decode_seconds                  kind (full / reduced)
+    heri_encode_seconds                  format, preset
+    heri_input_megapixels                endpoint
+    heri_run_image_buffers, heri_run_image_buffer_bytes, heri_run_peak_rss_growth_bytes
+                                         process_type, mode, megapixels (class)
+    heri_process_rss_bytes               (summed over live processes)
+    heri_external_request_seconds        service, operation, outcome
+    heri_external_errors_total           service, operation, reason (HTTP status / exception)
+    heri_cache_lookups_total             cache, result
+    heri_jobs_active, heri_job_workers, heri_jobs_total (status)
+
+Configuration (environment):
+    METRICS_FLUSH - seconds between snapshot writes (default 5)
+    METRICS_TTL   - seconds a snapshot outlives its process (default 3600)
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from .shared_cache import shared_cache
+from .tracing import log, span, ERROR
+import atexit
+import os
+import socket
+import threading
+import time
+
+METRICS_FLUSH = float(os.getenv('METRICS_FLUSH', 5))
+METRICS_TTL = int(os.getenv('METRICS_TTL', 3600))
+
+SHARED_NAMESPACE = 'metrics'
+
+# A process that has not flushed for this long no longer contributes gauges
+LIVE_WINDOW = 3 * METRICS_FLUSH
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+MEGAPIXEL_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 12, 16, 24, 48)
+BUFFER_BUCKETS = (1, 2, 4, 8, 12, 16, 24, 32, 64, 128, 256)
+BYTE_BUCKETS = tuple(megabytes * 1024 * 1024 for megabytes in (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192))
+
+
+def _format(value) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Registry:
+    """
+    Metric definitions plus this process's values
+    """
+    
+    def __init__(self):
+        self.metrics = {}
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self.flush)
+    
+    def _reset(self):
+        """Fresh values for a new process (the fork child has one thread)"""
+        self._lock = threading.Lock()
+        self._values = {}
+        self._collectors = []
+        self._flusher = None
+        self.key = f'{socket.gethostname()}:{os.getpid()}'
+    
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+    
+    def add_collector(self, collector):
+        """collector() runs before every snapshot of this process (e.g. to copy stats into gauges)"""
+        self._collectors.append(collector)
+    
+    def record(self, name: str, key: tuple, update):
+        """Apply update(old) -> new to one series"""
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            series[key] = update(series.get(key))
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+                self._flusher.start()
+    
+    def snapshot(self) -> dict:
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as e:
+                log(f"[METRICS] Collector error: {e}", ERROR)
+        with self._lock:
+            values = {
+                name: [[list(key), list(value) if isinstance(value, list) else value]
+                       for key, value in series.items()]
+                for name, series in self._values.items()
+            }
+        return {'updated_at': time.time(), 'values': values}
+    
+    def flush(self):
+        """Publish this process's snapshot to the shared tier"""
+        if self._values:
+            shared_cache.put_json(SHARED_NAMESPACE, self.key, self.snapshot(), ttl=METRICS_TTL)
+    
+    def _flush_loop(self):
+        while True:
+            time.sleep(METRICS_FLUSH)
+            self.flush()
+    
+    def render(self) -> str:
+        """Prometheus text exposition of every process on the host"""
+        snapshots = shared_cache.scan_json(SHARED_NAMESPACE)
+        snapshots[self.key] = self.snapshot()  # always current for this process
+        
+        now = time.time()
+        merged = {}
+        for snapshot in snapshots.values():
+            live = now - snapshot['updated_at'] <= LIVE_WINDOW
+            for name, series in snapshot['values'].items():
+                metric = self.metrics.get(name)
+                if metric is None or (metric.kind == 'gauge' and not live):
+                    continue
+                target = merged.setdefault(name, {})
+                for labels, value in series:
+                    key = tuple(labels)
+                    target[key] = metric.merge(target.get(key), value)
+        
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for key, value in sorted(merged.get(name, {}).items()):
+                lines.extend(metric.lines(key, value))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    kind = 'untyped'
+    
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        registry.register(self)
+    
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+    
+    def merge(self, total, value):
+        return (total or 0) + value
+    
+    def lines(self, key: tuple, value) -> list:
+        return [f'{self.name}{_label_text(self.labelnames, key)} {_format(value)}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+    
+    def inc(self, amount: float = 1, **labels):
+        self.registry.record(self.name, self._key(labels), lambda old: (old or 0) + amount)
+    
+    def set_total(self, value: float, **labels):
+        """Mirror a cumulative count kept elsewhere (cache and job stats)"""
+        self.registry.record(self.name, self._key(labels), lambda old: value)
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+    
+    def set(self, value: float, **labels):
+        self.registry.record(self.name, self._key(labels), lambda old: value)
+    
+    def inc(self, amount: float = 1, **labels):
+        self.registry.record(self.name, self._key(labels), lambda old: (old or 0) + amount)
+    
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+    
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (),
+                 buckets: tuple = LATENCY_BUCKETS, registry: Registry = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(buckets)
+    
+    def observe(self, value: float, **labels):
+        # Layout: one count per bucket (+Inf last), then sum, then count
+        index = bisect_left(self.buckets, value)
+        
+        def update(old):
+            state = old or [0] * (len(self.buckets) + 3)
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+            return state
+        
+        self.registry.record(self.name, self._key(labels), update)
+    
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+    
+    def merge(self, total, value):
+        if total is None:
+            return list(value)
+        return [a + b for a, b in zip(total, value)]
+    
+    def lines(self, key: tuple, value) -> list:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (None,), value[:-2]):
+            cumulative += count
+            le = 'le="+Inf"' if bound is None else f'le="{_format(bound)}"'
+            lines.append(f'{self.name}_bucket{_label_text(self.labelnames, key, le)} {_format(cumulative)}')
+        labels = _label_text(self.labelnames, key)
+        lines.append(f'{self.name}_sum{labels} {_format(value[-2])}')
+        lines.append(f'{self.name}_count{labels} {_format(value[-1])}')
+        return lines
+
+
+# Request level
+HTTP_REQUESTS = Counter(
+    'heri_http_requests_total', 'HTTP requests handled', ('endpoint', 'method', 'status')
+)
+HTTP_DURATION = Histogram(
+    'heri_http_request_duration_seconds', 'Time to build the response',
+    ('endpoint', 'process_type', 'mode')
+)
+HTTP_IN_FLIGHT = Gauge('heri_http_in_flight', 'Requests being handled')
+HTTP_THREADS = Gauge('heri_http_threads', 'Request threads available (saturation = in_flight / threads)')
+
+# Pipeline level
+STAGE_SECONDS = Histogram(
+    'heri_pipeline_stage_seconds', 'Restoration / super-resolution stage time', ('pipeline', 'stage')
+)
+DECODE_SECONDS = Histogram('heri_decode_seconds', 'Image decode time', ('kind',))
+ENCODE_SECONDS = Histogram('heri_encode_seconds', 'Result encode time', ('format', 'preset'))
+INPUT_MEGAPIXELS = Histogram(
+    'heri_input_megapixels', 'Input image size', ('endpoint',), buckets=MEGAPIXEL_BUCKETS
+)
+
+# Memory (models/memory_accounting.py)
+RUN_IMAGE_BUFFERS = Histogram(
+    'heri_run_image_buffers', 'PIL images alive at once during a pipeline run',
+    ('process_type', 'mode', 'megapixels'), buckets=BUFFER_BUCKETS
+)
+RUN_IMAGE_BUFFER_BYTES = Histogram(
+    'heri_run_image_buffer_bytes', 'Peak PIL pixel memory of a pipeline run',
+    ('process_type', 'mode', 'megapixels'), buckets=BYTE_BUCKETS
+)
+RUN_PEAK_RSS_GROWTH = Histogram(
+    'heri_run_peak_rss_growth_bytes', 'Growth of the process peak RSS during a pipeline run',
+    ('process_type', 'mode', 'megapixels'), buckets=(0,) + BYTE_BUCKETS
+)
+PROCESS_RSS = Gauge('heri_process_rss_bytes', 'Resident memory of worker and pool processes')
+
+# External services
+EXTERNAL_SECONDS = Histogram(
+    'heri_external_request_seconds', 'Gemini / Wikipedia call latency', ('service', 'operation', 'outcome')
+)
+EXTERNAL_ERRORS = Counter(
+    'heri_external_errors_total', 'Failed Gemini / Wikipedia calls', ('service', 'operation', 'reason')
+)
+EXTERNAL_CASSETTE = Counter(
+    'heri_external_cassette_total', 'Recorded / replayed / missed outbound calls (models/outbound.py)',
+    ('service', 'operation', 'result')
+)
+
+# Caches and jobs (copied from their stats by collectors)
+CACHE_LOOKUPS = Counter('heri_cache_lookups_total', 'Cache lookups by outcome', ('cache', 'result'))
+JOBS_ACTIVE = Gauge('heri_jobs_active', 'Jobs queued or running')
+JOB_WORKERS = Gauge('heri_job_workers', 'Job pool processes')
+JOBS_TOTAL = Counter('heri_jobs_total', 'Jobs by final status (plus submitted / rejected)', ('status',))
+
+
+@contextmanager
+def track_external(service: str, operation: str):
+    """
+    Time an outbound call (also a trace span) - an exception inside the
+    block counts as an error and is re-raised. HTTP calls must call
+    raise_for_status() inside the block, or a 4xx/5xx counts as 'ok'.
+    Errors are labelled with the HTTP status, or the exception type.
+    
+    Usage:
+        with track_external('wikipedia', 'search'):
+            response = requests.get(...)
+            response.raise_for_status()
+    """
+    start = time.perf_counter()
+    try:
+        with span(f'{service}.{operation}', 'external'):
+            yield
+    except Exception as e:
+        status = getattr(getattr(e, 'response', None), 'status_code', None)
+        EXTERNAL_SECONDS.observe(time.perf_counter() - start, service=service, operation=operation, outcome='error')
+        EXTERNAL_ERRORS.inc(service=service, operation=operation, reason=str(status or type(e).__name__))
+        raise
+    EXTERNAL_SECONDS.observe(time.perf_counter() - start, service=service, operation=operation, outcome='ok')
+
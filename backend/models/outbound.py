@@ -0,0 +1,303 @@
+"""
+Outbound Transport
+Record / replay of Gemini and Wikipedia calls, with latency injection
+
+Chat and historical-info latency is mostly upstream latency, which is
+neither reproducible nor available on an air-gapped machine. Every
+Gemini and Wikipedia call goes through this transport instead of calling
+out directly:
+1. live (default) - calls go out as before
+2. record - calls go out, and every successful answer is appended to a
+   cassette (OUTBOUND_CASSETTES/<service>.jsonl) with the time it took
+3. replay - answers come from the cassettes and nothing leaves the host
+   (Gemini needs neither the SDK nor an API key). Before each answer the
+   transport waits OUTBOUND_LATENCY:
+       recorded                 the latency measured when recording
+       scaled:F                 recorded x F - sweep F to see how
+                                throughput degrades as upstreams slow down
+       offset:S                 recorded + S seconds
+       none, fixed:S, uniform:LOW,HIGH, normal:MEAN,SD,
+       lognormal:MEDIAN,SIGMA   synthetic (LatencyModel)
+
+A call is identified by service, operation and request, hashed: the query
+parameters for Wikipedia (not the host, so recordings made against the
+load-test stubs and against the real API are interchangeable); model,
+prompt and image reference for Gemini. A replayed call that was never
+recorded is a miss - it fails like an unreachable service, so callers
+take their offline fallbacks - unless OUTBOUND_REPLAY_MISS=live sends it
+out.
+
+Caveats:
+- Only successes are recorded (HTTP 2xx, Gemini answers with text);
+  upstream errors are not replayed - use synthetic latency and the
+  load-test stubs' error rates for those
+- A call recorded more than once replays its latest recording
+- Gemini image calls still load their image - local for handles from
+  /api/images, fetched for plain URLs
+- Every worker process appends to the same cassettes, one write per line,
+  so lines never interleave. Replay reads them once per process
+- Each call's wait is real time, so replay is only as deterministic as
+  the latency setting (recorded / scaled / offset / fixed are)
+
+Configuration (environment):
+    OUTBOUND_MODE        - live, record or replay (default live)
+    OUTBOUND_CASSETTES   - cassette directory (default processed/cassettes)
+    OUTBOUND_LATENCY     - replay latency (default recorded)
+    OUTBOUND_REPLAY_MISS - error or live, for calls with no recording (default error)
+"""
+
+from .metrics import EXTERNAL_CASSETTE
+from .tracing import log, WARNING
+import hashlib
+import json
+import os
+import random
+import requests
+import threading
+import time
+from urllib.parse import urlparse
+
+OUTBOUND_MODE = os.getenv('OUTBOUND_MODE', 'live').lower()
+OUTBOUND_CASSETTES = os.getenv('OUTBOUND_CASSETTES', os.path.join('processed', 'cassettes'))
+OUTBOUND_LATENCY = os.getenv('OUTBOUND_LATENCY', 'recorded')
+OUTBOUND_REPLAY_MISS = os.getenv('OUTBOUND_REPLAY_MISS', 'error').lower()
+
+MODES = ('live', 'record', 'replay')
+
+# No injected delay is longer than this
+MAX_LATENCY = 30.0
+
+
+class CassetteMiss(ConnectionError):
+    """A replayed call that was never recorded"""
+
+
+class LatencyModel:
+    """
+    A latency distribution in seconds, from a spec:
+        none                    no delay
+        fixed:S                 always S
+        uniform:LOW,HIGH        uniform between LOW and HIGH
+        normal:MEAN,SD          normal, clipped at 0
+        lognormal:MEDIAN,SIGMA  log-normal (long right tail, like real APIs)
+    """
+    
+    KINDS = {'none': 0, 'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2}
+    
+    def __init__(self, spec: str):
+        kind, _, arguments = spec.partition(':')
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency model '{kind}' (use {', '.join(self.KINDS)})")
+        try:
+            self.parameters = tuple(float(value) for value in arguments.split(',')) if arguments else ()
+        except ValueError:
+            raise ValueError(f"Latency '{spec}': parameters must be numbers")
+        if len(self.parameters) != self.KINDS[kind] or any(value < 0 for value in self.parameters):
+            raise ValueError(f"Latency '{spec}': {kind} takes {self.KINDS[kind]} non-negative parameter(s)")
+        self.kind = kind
+        self.spec = spec
+    
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == 'none':
+            return 0.0
+        if self.kind == 'fixed':
+            delay = self.parameters[0]
+        elif self.kind == 'uniform':
+            delay = rng.uniform(*self.parameters)
+        elif self.kind == 'normal':
+            delay = rng.normalvariate(*self.parameters)
+        else:
+            median, sigma = self.parameters
+            delay = median * rng.lognormvariate(0, sigma) if median else 0.0
+        return min(max(delay, 0.0), MAX_LATENCY)
+
+
+class ReplayLatency:
+    """Delay of a replayed call: derived from its recorded latency, or synthetic"""
+    
+    def __init__(self, spec: str):
+        kind, _, argument = spec.partition(':')
+        self.spec = spec
+        self.kind = kind if kind in ('recorded', 'scaled', 'offset') else 'synthetic'
+        if self.kind == 'recorded':
+            if argument:
+                raise ValueError("Latency 'recorded' takes no parameter")
+        elif self.kind == 'synthetic':
+            if kind not in LatencyModel.KINDS:
+                raise ValueError(f"Unknown latency '{kind}' (use recorded, scaled, offset, {', '.join(LatencyModel.KINDS)})")
+            self.model = LatencyModel(spec)
+        else:
+            try:
+                self.factor = float(argument)
+            except ValueError:
+                raise ValueError(f"Latency '{spec}': {kind} takes one number")
+            if self.factor < 0:
+                raise ValueError(f"Latency '{spec}': must not be negative")
+    
+    def delay(self, recorded: float, rng: random.Random) -> float:
+        if self.kind == 'recorded':
+            return recorded
+        if self.kind == 'scaled':
+            return min(recorded * self.factor, MAX_LATENCY)
+        if self.kind == 'offset':
+            return min(recorded + self.factor, MAX_LATENCY)
+        return self.model.sample(rng)
+
+
+class ReplayedResponse:
+    """The parts of a requests.Response that callers use, from a cassette"""
+    
+    def __init__(self, status_code: int, text: str):
+        self.status_code = status_code
+        self.text = text
+        self.ok = status_code < 400
+    
+    def json(self):
+        return json.loads(self.text)
+    
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(f'{self.status_code} (replayed)', response=self)
+
+
+def request_key(service: str, operation: str, request: dict) -> str:
+    """Identity of a call in a cassette"""
+    material = json.dumps([service, operation, request], sort_keys=True, default=str)
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+class OutboundTransport:
+    """
+    Sends, records or replays outbound calls (see module docstring)
+    """
+    
+    def __init__(self, mode: str = OUTBOUND_MODE, directory: str = OUTBOUND_CASSETTES,
+                 latency: str = OUTBOUND_LATENCY, replay_miss: str = OUTBOUND_REPLAY_MISS):
+        if mode not in MODES:
+            log(f"Unknown OUTBOUND_MODE '{mode}' - using live", WARNING)
+            mode = 'live'
+        try:
+            self.latency = ReplayLatency(latency)
+        except ValueError as e:
+            log(f"OUTBOUND_LATENCY: {e} - using recorded", WARNING)
+            latency, self.latency = 'recorded', ReplayLatency('recorded')
+        self.mode = mode
+        self.directory = directory
+        self.replay_miss = replay_miss
+        self.cassettes = {}
+        self.rng = random.Random()
+        self.lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._after_fork)
+        if mode != 'live':
+            log(f"Outbound calls: {mode} ({directory}{', latency ' + latency if mode == 'replay' else ''})")
+    
+    def _after_fork(self):
+        self.lock = threading.Lock()
+    
+    @property
+    def replaying(self) -> bool:
+        return self.mode == 'replay'
+    
+    def _path(self, service: str) -> str:
+        return os.path.join(self.directory, f'{service}.jsonl')
+    
+    def _cassette(self, service: str) -> dict:
+        """key -> entry, read once per process"""
+        with self.lock:
+            cassette = self.cassettes.get(service)
+            if cassette is None:
+                cassette = self.cassettes[service] = {}
+                try:
+                    with open(self._path(service)) as lines:
+                        for line in lines:
+                            try:
+                                entry = json.loads(line)
+                            except ValueError:
+                                continue  # a line cut short by a crash while recording
+                            cassette[entry['key']] = entry
+                except FileNotFoundError:
+                    log(f"No {service} cassette at {self._path(service)} - every call will miss", WARNING)
+            return cassette
+    
+    def _record(self, service: str, operation: str, key: str, request: dict, response, elapsed: float):
+        line = json.dumps({
+            'key': key,
+            'service': service,
+            'operation': operation,
+            'request': request,
+            'response': response,
+            'elapsed': round(elapsed, 4),
+            'recorded_at': time.time()
+        }, default=str) + '\n'
+        os.makedirs(self.directory, exist_ok=True)
+        # One O_APPEND write per line - concurrent workers never interleave
+        fd = os.open(self._path(service), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, line.encode())
+        finally:
+            os.close(fd)
+        EXTERNAL_CASSETTE.inc(service=service, operation=operation, result='recorded')
+    
+    def _replay(self, service: str, operation: str, key: str):
+        """The recorded entry after its delay; None when live calls may fill a miss"""
+        entry = self._cassette(service).get(key)
+        if entry is None:
+            EXTERNAL_CASSETTE.inc(service=service, operation=operation, result='miss')
+            if self.replay_miss == 'live':
+                return None
+            raise CassetteMiss(f'No recorded {service} {operation} call for this request')
+        
+        EXTERNAL_CASSETTE.inc(service=service, operation=operation, result='replayed')
+        with self.lock:
+            delay = self.latency.delay(entry['elapsed'], self.rng)
+        time.sleep(delay)
+        return entry
+    
+    def get(self, service: str, operation: str, url: str, params: dict = None, headers: dict = None,
+            timeout: float = 10):
+        """
+        HTTP GET - a requests.Response, or a ReplayedResponse in replay mode
+        """
+        if self.mode == 'live':
+            return requests.get(url, params=params, headers=headers, timeout=timeout)
+        
+        # The host is not part of the identity
+        request = {'path': urlparse(url).path, 'params': params}
+        key = request_key(service, operation, request)
+        if self.replaying:
+            entry = self._replay(service, operation, key)
+            if entry is not None:
+                return ReplayedResponse(entry['response']['status'], entry['response']['text'])
+        
+        start = time.perf_counter()
+        response = requests.get(url, params=params, headers=headers, timeout=timeout)
+        if self.mode == 'record' and response.ok:
+            self._record(service, operation, key, request,
+                         {'status': response.status_code, 'text': response.text}, time.perf_counter() - start)
+        return response
+    
+    def call(self, service: str, operation: str, request: dict, send):
+        """
+        An SDK call - send() returns a JSON-serializable answer (falsy
+        answers are not recorded)
+        
+        request: what identifies the call (model, prompt, ...)
+        """
+        if self.mode == 'live':
+            return send()
+        
+        key = request_key(service, operation, request)
+        if self.replaying:
+            entry = self._replay(service, operation, key)
+            if entry is not None:
+                return entry['response']
+        
+        start = time.perf_counter()
+        answer = send()
+        if self.mode == 'record' and answer:
+            self._record(service, operation, key, request, answer, time.perf_counter() - start)
+        return answer
+
+
+# Global instance
+outbound = OutboundTransport()
@@ -0,0 +1,310 @@
+"""
+Pipeline Progress Reporting
+Structured stage events for Server-Sent Events streams
+
+The pipelines used to print "[Stage n/8] ..." lines to stdout only. A
+ProgressReporter logs the same lines (models/tracing.py - completed stages
+are also trace spans) and publishes each stage boundary as an event:
+    stage, through, total  - stage number(s) and stage count
+    name, status, detail   - 'started' / 'complete' / 'skipped' / 'tiles' /
+                             'finished' / 'failed'
+    elapsed, stage_time    - seconds since the pipeline / stage started
+    progress, eta          - fraction done and estimated seconds remaining
+    preview                - optional low-resolution JPEG data URL
+
+Events go to a channel (the job id, or a client-chosen progress id) in the
+shared tier, so a pipeline running in a job pool process can be streamed
+by whichever gunicorn worker holds the SSE connection. A channel is a
+range of keys, so publishing is one small write, never a rewrite of the
+events so far:
+    <channel>:open       - written when the reporter is created
+    <channel>:e:<seq>    - one key per event (zero-padded, so key order is
+                           event order)
+    <channel>:preview    - the latest stage preview only; an event that had
+                           one carries it while it is still the latest
+
+stream_events() turns a channel into a text/event-stream body: it polls
+the channel, resumes after Last-Event-ID, sends keep-alive comments so
+proxies and clients don't treat a long stage as a hung request, and ends
+on a terminal event. A channel that is never opened (a made-up or
+mistyped id) ends with an 'end' event of status 'unknown' after
+PROGRESS_OPEN_WAIT, so it does not hold a worker thread for the full TTL.
+So does a running channel that has had no event for PROGRESS_STALE - its
+pipeline died with its process (OOM kill, worker restart) before it could
+publish a terminal event. Queued jobs are not running yet; their clock
+starts when the channel is opened.
+
+Configuration (environment):
+    PROGRESS_TTL          - seconds a channel is kept (default 3600)
+    PROGRESS_PREVIEW_EDGE - longest edge of stage previews (default 256)
+    PROGRESS_POLL         - seconds between channel polls (default 0.25)
+    PROGRESS_KEEPALIVE    - seconds between keep-alive comments (default 15)
+    PROGRESS_OPEN_WAIT    - seconds a stream waits for its channel to be
+                            opened (default 30)
+    PROGRESS_STALE        - seconds without an event before a running
+                            channel is given up (default 20 keep-alives)
+"""
+
+from .metrics import STAGE_SECONDS
+from .shared_cache import shared_cache
+from .tracing import add_span, log, DEBUG
+import base64
+import io
+import json
+import os
+import time
+
+PROGRESS_TTL = int(os.getenv('PROGRESS_TTL', 3600))
+PROGRESS_PREVIEW_EDGE = int(os.getenv('PROGRESS_PREVIEW_EDGE', 256))
+PROGRESS_POLL = float(os.getenv('PROGRESS_POLL', 0.25))
+PROGRESS_KEEPALIVE = float(os.getenv('PROGRESS_KEEPALIVE', 15))
+PROGRESS_OPEN_WAIT = float(os.getenv('PROGRESS_OPEN_WAIT', 30))
+PROGRESS_STALE = float(os.getenv('PROGRESS_STALE', 20 * PROGRESS_KEEPALIVE))
+
+SHARED_NAMESPACE = 'progress'
+
+TERMINAL_STATUSES = ('finished', 'failed')
+
+
+def _event_key(channel_id: str, seq: int) -> str:
+    return f'{channel_id}:e:{seq:06d}'
+
+
+class NullProgress:
+    """
+    Reporter that does nothing - used for tiles and background work
+    """
+    
+    def start(self, stage: int, name: str, through: int = None):
+        pass
+    
+    def complete(self, detail: str = '', image=None):
+        pass
+    
+    def skip(self, reason: str):
+        pass
+    
+    def note(self, message: str):
+        pass
+    
+    def tiles(self, done: int, total: int):
+        pass
+    
+    def finish(self, detail: str = ''):
+        pass
+    
+    def fail(self, error: str):
+        pass
+
+
+QUIET = NullProgress()
+
+
+def _preview_data_url(image) -> str:
+    # Integer box reduce first - never copies a full-size image
+    factor = max(image.size) // (2 * PROGRESS_PREVIEW_EDGE)
+    preview = image.reduce(factor) if factor > 1 else image.copy()
+    preview.thumbnail((PROGRESS_PREVIEW_EDGE, PROGRESS_PREVIEW_EDGE))
+    if preview.mode != 'RGB':
+        preview = preview.convert('RGB')
+    buffered = io.BytesIO()
+    preview.save(buffered, format='JPEG', quality=70)
+    return f"data:image/jpeg;base64,{base64.b64encode(buffered.getvalue()).decode()}"
+
+
+class ProgressReporter(NullProgress):
+    """
+    Prints stage lines and publishes them as events on a channel
+    
+    Usage:
+        progress = ProgressReporter(job_id, total_stages=8, preview=True)
+        progress.start(2, 'Adaptive Denoising')
+        ...
+        progress.complete('Denoised', image=result)
+    """
+    
+    def __init__(self, channel_id: str = None, total_stages: int = 1, pipeline: str = '',
+                 preview: bool = False):
+        """
+        Args:
+            channel_id: event channel (None = print only)
+            total_stages: number of stages in the pipeline
+            pipeline: name prefixed to events (e.g. 'restoration')
+            preview: attach a low-resolution preview to completed stages
+        """
+        self.channel_id = channel_id
+        self.total = total_stages
+        self.pipeline = pipeline
+        self.preview = preview
+        
+        self.started_at = time.time()
+        self.stage = 0
+        self.through = 0
+        self.name = ''
+        self.stage_started_at = self.started_at
+        self.done_fraction = 0.0
+        self.closed = False
+        self._seq = 0
+        
+        if channel_id is not None:
+            shared_cache.put_json(SHARED_NAMESPACE, f'{channel_id}:open', self.started_at, ttl=PROGRESS_TTL)
+    
+    def _label(self) -> str:
+        if self.through != self.stage:
+            return f"[Stages {self.stage}-{self.through}/{self.total}]"
+        return f"[Stage {self.stage}/{self.total}]"
+    
+    def _publish(self, status: str, detail: str = '', image=None):
+        # Nothing follows a terminal event (a request failing on its way out
+        # after its pipeline failed)
+        if self.channel_id is None or self.closed:
+            return
+        self.closed = status in TERMINAL_STATUSES
+        
+        now = time.time()
+        elapsed = now - self.started_at
+        fraction = min(self.done_fraction, 1.0)
+        eta = elapsed * (1 - fraction) / fraction if fraction > 0 else None
+        
+        self._seq += 1
+        event = {
+            'id': self._seq,
+            'pipeline': self.pipeline,
+            'stage': self.stage,
+            'through': self.through,
+            'total': self.total,
+            'name': self.name,
+            'status': status,
+            'detail': detail,
+            'elapsed': round(elapsed, 3),
+            'stage_time': round(now - self.stage_started_at, 3),
+            'progress': round(fraction, 4),
+            'eta': round(eta, 2) if eta is not None else None
+        }
+        if image is not None and self.preview:
+            # Overwrites the previous preview (streams have already sent
+            # it); written first, so a reader that sees the event finds it
+            shared_cache.put_json(SHARED_NAMESPACE, f'{self.channel_id}:preview',
+                                  {'id': self._seq, 'data': _preview_data_url(image)}, ttl=PROGRESS_TTL)
+            event['preview'] = True
+        
+        shared_cache.put_json(SHARED_NAMESPACE, _event_key(self.channel_id, self._seq), event, ttl=PROGRESS_TTL)
+    
+    def start(self, stage: int, name: str, through: int = None):
+        self.stage = stage
+        self.through = through or stage
+        self.name = name
+        self.stage_started_at = time.time()
+        log(f"{self._label()} {name}...", DEBUG)
+        self._publish('started')
+    
+    def complete(self, detail: str = '', image=None):
+        self.done_fraction = self.through / self.total
+        stage_time = time.time() - self.stage_started_at
+        STAGE_SECONDS.observe(stage_time, pipeline=self.pipeline, stage=self.name)
+        add_span(self.name, stage_time, 'stage', pipeline=self.pipeline, stage=self.stage, detail=detail)
+        log(f"{self._label()} Complete in {stage_time:.2f}s" + (f" | {detail}" if detail else ''))
+        self._publish('complete', detail, image)
+    
+    def skip(self, reason: str):
+        self.done_fraction = self.through / self.total
+        log(f"{self._label()} Skipped ({reason})")
+        self._publish('skipped', reason)
+    
+    def note(self, message: str):
+        log(f"{self._label()} {message}")
+    
+    def tiles(self, done: int, total: int):
+        """Tile progress inside a tiled stage range"""
+        span = self.through - self.stage + 1
+        self.done_fraction = (self.stage - 1 + span * done / total) / self.total
+        self._publish('tiles', f'{done}/{total} tiles')
+    
+    def finish(self, detail: str = ''):
+        self.done_fraction = 1.0
+        self._publish('finished', detail)
+    
+    def fail(self, error: str):
+        self._publish('failed', error)
+
+
+def read_events(channel_id: str, after: int = 0) -> list:
+    """Events on a channel with id > after"""
+    events = list(shared_cache.scan_json(
+        SHARED_NAMESPACE, prefix=f'{channel_id}:e:', after=_event_key(channel_id, after)
+    ).values())
+    if any(event.get('preview') for event in events):
+        latest = shared_cache.get_json(SHARED_NAMESPACE, f'{channel_id}:preview') or {}
+        for event in events:
+            if event.get('preview'):
+                if event['id'] == latest.get('id'):
+                    event['preview'] = latest['data']
+                else:
+                    del event['preview']
+    return events
+
+
+def channel_opened(channel_id: str) -> bool:
+    return shared_cache.get(SHARED_NAMESPACE, f'{channel_id}:open') is not None
+
+
+def _sse(event: dict, name: str = 'progress') -> str:
+    return f"id: {event['id']}\nevent: {name}\ndata: {json.dumps(event)}\n\n"
+
+
+def stream_events(channel_id: str, after: int = 0, final_status=None, exists=None,
+                  timeout: float = PROGRESS_TTL):
+    """
+    Server-Sent Events body for a channel
+    
+    Args:
+        channel_id: event channel
+        after: last event id the client already has (Last-Event-ID)
+        final_status: optional callable returning a final status (e.g. a
+            job that was cancelled or answered from cache) when the channel
+            will never get a terminal event; the stream then ends with it
+        exists: optional callable - True when something else will open the
+            channel (e.g. a queued job), so the stream keeps waiting
+        timeout: give up after this many seconds
+    """
+    started_at = time.time()
+    deadline = started_at + timeout
+    last_sent = started_at
+    last_event = started_at
+    # Resuming after events means the channel was opened
+    opened = after > 0
+    yield 'retry: 2000\n\n'
+    
+    while time.time() < deadline:
+        events = read_events(channel_id, after)
+        for event in events:
+            yield _sse(event)
+            after = event['id']
+            if event['status'] in TERMINAL_STATUSES:
+                return
+        
+        if events:
+            last_sent = last_event = time.time()
+            opened = True
+        elif final_status is not None:
+            status = final_status()
+            if status is not None:
+                yield _sse({'id': after + 1, 'status': status}, name='end')
+                return
+        
+        if not opened and time.time() - started_at >= PROGRESS_OPEN_WAIT:
+            opened = channel_opened(channel_id) or (exists is not None and exists())
+            if not opened:
+                yield _sse({'id': after + 1, 'status': 'unknown'}, name='end')
+                return
+        
+        if time.time() - last_event >= PROGRESS_STALE:
+            if after > 0 or channel_opened(channel_id):
+                yield _sse({'id': after + 1, 'status': 'unknown'}, name='end')
+                return
+            last_event = time.time()  # Still queued
+        
+        if time.time() - last_sent >= PROGRESS_KEEPALIVE:
+            yield ': keep-alive\n\n'
+            last_sent = time.time()
+        time.sleep(PROGRESS_POLL)
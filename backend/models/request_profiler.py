@@ -0,0 +1,156 @@
+"""
+Request Profiling
+Deterministic per-request profiles returned with the response
+
+Reproducing a slow input locally means getting the exact scan and the
+exact parameters. Instead, a request sent with profile=1 runs under
+cProfile and tracemalloc and the report comes back with the response:
+1. Top functions by cumulative time, with call counts (primitive/total),
+   own time and per-call time - e.g. ultra_fast_restoration stages next
+   to PointChain, ImageFilter and numpy calls
+2. Peak traced memory and the top allocation sites by bytes
+3. The raw pstats data, downloadable for snakeviz / pstats.Stats
+
+Only for admins and debug builds: profiling slows a request several
+times over, and the report exposes file paths.
+
+Caveats:
+- cProfile sees the request thread only - tiles processed in the tile
+  pool and jobs in the job pool are not in the profile
+- tracemalloc sees Python and numpy allocations (of every thread while
+  the request runs); Pillow image buffers are allocated outside it
+- profiler and tracemalloc are process-wide, so profiled requests run
+  one at a time
+
+Configuration (environment):
+    PROFILING_ENABLED - allow profiling without a token (debug builds; default off)
+    ADMIN_TOKEN       - X-Admin-Token that allows profiling (unset = none)
+    PROFILE_TOP       - functions / allocation sites per report (default 30)
+    PROFILE_TTL       - seconds a stored profile is kept (default 3600)
+"""
+
+from .memory_accounting import tracemalloc_lock
+from .shared_cache import shared_cache
+import cProfile
+import hmac
+import marshal
+import os
+import pstats
+import re
+import time
+import tracemalloc
+import uuid
+
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+PROFILE_TOP = int(os.getenv('PROFILE_TOP', 30))
+PROFILE_TTL = int(os.getenv('PROFILE_TTL', 3600))
+
+SHARED_NAMESPACE = 'profiles'
+
+_PROFILE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+def profiling_allowed(headers, debug: bool = False) -> bool:
+    """Debug builds, PROFILING_ENABLED, or a matching X-Admin-Token"""
+    if debug or PROFILING_ENABLED:
+        return True
+    token = headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def _function_name(key: tuple) -> str:
+    filename, line, name = key
+    if filename == '~':
+        return name  # built-in
+    return f"{os.path.relpath(filename) if filename.startswith(os.getcwd()) else filename}:{line}({name})"
+
+
+def _function_report(stats: pstats.Stats) -> list:
+    rows = []
+    for key, (primitive, total, own, cumulative, _) in stats.stats.items():
+        rows.append({
+            'function': _function_name(key),
+            'calls': total,
+            'primitive_calls': primitive,
+            'tottime': round(own, 6),
+            'cumtime': round(cumulative, 6),
+            'percall': round(cumulative / total, 6) if total else 0.0
+        })
+    rows.sort(key=lambda row: row['cumtime'], reverse=True)
+    return rows[:PROFILE_TOP]
+
+
+def _memory_report(snapshot: tracemalloc.Snapshot, peak: int) -> dict:
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, cProfile.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap*>')
+    ))
+    statistics = snapshot.statistics('lineno')
+    return {
+        'peak_bytes': peak,
+        'retained_bytes': sum(stat.size for stat in statistics),
+        'top': [{
+            'site': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            'bytes': stat.size,
+            'count': stat.count
+        } for stat in statistics[:PROFILE_TOP]]
+    }
+
+
+def run_profiled(fn) -> tuple:
+    """
+    Call fn() under cProfile and tracemalloc
+    
+    Returns:
+        (result, report) - the report is also stored under report['id']
+    """
+    with tracemalloc_lock:
+        tracing_before = tracemalloc.is_tracing()
+        if not tracing_before:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        
+        profiler = cProfile.Profile()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        profiler.enable()
+        try:
+            result = fn()
+        finally:
+            profiler.disable()
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            if not tracing_before:
+                tracemalloc.stop()
+    
+    stats = pstats.Stats(profiler)
+    report = {
+        'id': uuid.uuid4().hex,
+        'wall_time': round(wall, 6),
+        'cpu_time': round(cpu, 6),
+        'total_calls': stats.total_calls,
+        'primitive_calls': stats.prim_calls,
+        'functions': _function_report(stats),
+        'memory': _memory_report(snapshot, peak)
+    }
+    shared_cache.put_json(SHARED_NAMESPACE, report['id'], report, ttl=PROFILE_TTL)
+    shared_cache.put(SHARED_NAMESPACE, f"{report['id']}:pstats", marshal.dumps(stats.stats), ttl=PROFILE_TTL)
+    return result, report
+
+
+def load_profile(profile_id: str):
+    """Stored report, or None"""
+    if not _PROFILE_ID.match(profile_id or ''):
+        return None
+    return shared_cache.get_json(SHARED_NAMESPACE, profile_id)
+
+
+def load_pstats(profile_id: str):
+    """Raw pstats data (marshal format, as written by Stats.dump_stats), or None"""
+    if not _PROFILE_ID.match(profile_id or ''):
+        return None
+    return shared_cache.get(SHARED_NAMESPACE, f'{profile_id}:pstats')
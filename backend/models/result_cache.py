@@ -0,0 +1,162 @@
+"""
+Processed-Image Result Cache
+Content-addressed cache for /api/process-image results
+
+Keys: (hash of decoded pixels, process type, mode, quantized intensity, engine version)
+Values: the final encoded image bytes plus the JSON metadata that goes with them
+
+Tiers:
+1. Memory - per worker, LRU evicted by a byte budget (RESULT_CACHE_BYTES)
+2. Shared - the host-wide SQLite tier (models/shared_cache.py, namespace
+            'results'), so a result computed by one gunicorn worker is a
+            hit in all of them
+
+Concurrent identical requests are coalesced: the first caller computes,
+the others wait for its result instead of running the pipeline again.
+"""
+
+from .bounded_cache import BoundedCache
+from .shared_cache import SharedCache, shared_cache
+import json
+import os
+import struct
+import threading
+
+# Bump whenever pipeline output changes so stale results are never served
+ENGINE_VERSION = '3'
+
+RESULT_CACHE_BYTES = int(os.getenv('RESULT_CACHE_BYTES', 256 * 1024 * 1024))
+
+SHARED_NAMESPACE = 'results'
+
+# Intensity is quantized so slider jitter (0.7500001) still hits
+INTENSITY_STEP = 0.01
+
+
+def quantize_intensity(intensity: float) -> float:
+    return round(round(intensity / INTENSITY_STEP) * INTENSITY_STEP, 4)
+
+
+def make_result_key(content_hash: str, process_type: str, mode: str, intensity: float,
+                    engine: str = ENGINE_VERSION, **extra) -> str:
+    """Build a cache key; extra keyword parameters (encoder, ...) are included sorted"""
+    parts = [content_hash, process_type, mode, f'{quantize_intensity(intensity):.2f}', f'v{engine}']
+    parts.extend(f'{name}={extra[name]}' for name in sorted(extra))
+    return ':'.join(parts)
+
+
+def pack_result(metadata: dict, image_bytes: bytes) -> bytes:
+    """Serialize metadata + encoded image into one cache value"""
+    header = json.dumps(metadata).encode()
+    return struct.pack('>I', len(header)) + header + image_bytes
+
+
+def unpack_result(record: bytes) -> tuple:
+    """Inverse of pack_result -> (metadata, image_bytes)"""
+    size = struct.unpack('>I', record[:4])[0]
+    metadata = json.loads(record[4:4 + size])
+    return metadata, record[4 + size:]
+
+
+class ResultCache:
+    """
+    Two-tier (worker memory + host-shared) LRU cache with request coalescing
+    """
+    
+    def __init__(self, max_bytes: int = RESULT_CACHE_BYTES, shared: SharedCache = shared_cache):
+        self.max_bytes = max_bytes
+        self.shared = shared
+        
+        # Memory tier - per worker, LRU by byte budget; every entry is also
+        # in the shared tier, so evictions just drop it
+        self._memory = BoundedCache('results', max_bytes=max_bytes)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        
+        self.stats_counters = {
+            'memory_hits': 0,
+            'shared_hits': 0,
+            'misses': 0,
+            'coalesced': 0
+        }
+    
+    def get(self, key):
+        """Look a key up in memory, then in the shared tier (shared hits are promoted)"""
+        value = self._memory.get(key)
+        if value is not None:
+            with self._lock:
+                self.stats_counters['memory_hits'] += 1
+            return value
+        
+        value = self.shared.get(SHARED_NAMESPACE, key)
+        if value is not None:
+            with self._lock:
+                self.stats_counters['shared_hits'] += 1
+            self._memory.put(key, value)
+        return value
+    
+    def put(self, key, value: bytes):
+        """Store in this worker's memory and write through to the shared tier"""
+        self._memory.put(key, value)
+        self.shared.put(SHARED_NAMESPACE, key, value)
+    
+    def get_or_compute(self, key, compute):
+        """
+        Return (value, status) - status is 'hit', 'coalesced' or 'miss'
+        
+        compute() must return the bytes to cache. If it raises, waiting
+        callers see the same exception.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value, 'hit'
+        
+        with self._lock:
+            waiter = self._inflight.get(key)
+            if waiter is None:
+                waiter = {'event': threading.Event(), 'value': None, 'error': None}
+                self._inflight[key] = waiter
+                owner = True
+            else:
+                self.stats_counters['coalesced'] += 1
+                owner = False
+        
+        if not owner:
+            waiter['event'].wait()
+            if waiter['error'] is not None:
+                raise waiter['error']
+            return waiter['value'], 'coalesced'
+        
+        try:
+            with self._lock:
+                self.stats_counters['misses'] += 1
+            value = compute()
+            self.put(key, value)
+            waiter['value'] = value
+            return value, 'miss'
+        except Exception as e:
+            waiter['error'] = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            waiter['event'].set()
+    
+    def stats(self) -> dict:
+        memory = self._memory.stats()
+        with self._lock:
+            counters = dict(self.stats_counters)
+            lookups = counters['memory_hits'] + counters['shared_hits'] + counters['misses']
+            return {
+                **counters,
+                'evictions': memory['evictions'],
+                'hit_ratio': round((counters['memory_hits'] + counters['shared_hits']) / lookups, 4) if lookups else 0.0,
+                'memory_entries': memory['entries'],
+                'memory_bytes': memory['bytes'],
+                'memory_max_bytes': self.max_bytes,
+                'engine_version': ENGINE_VERSION
+            }
+
+
+# Global instance
+result_cache = ResultCache()
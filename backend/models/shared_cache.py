@@ -0,0 +1,457 @@
+"""
+Shared Cache Tier
+Host-wide cache that every gunicorn worker reads and writes
+
+Each worker process has its own memory caches, so with `gunicorn -w 4` a
+result computed by worker 1 is recomputed by worker 2. This tier lives in
+one SQLite database in WAL mode:
+1. Readers never block writers, so all workers can hit it concurrently
+2. Every put is a single transaction - readers see the old value or the
+   new one, never a partial write
+3. Size is bounded per pool, not across the whole database - a pool's
+   least recently used entries are evicted when a write takes it over its
+   budget, so a burst of large images never pushes out cached results.
+   Byte totals are kept in a one-row-per-pool table updated in the same
+   transaction as the write, so a put never scans the table
+4. Optional per-entry TTL; expired entries are swept in small batches at
+   most every EXPIRY_SWEEP_INTERVAL seconds per process
+5. Values larger than SHARED_CACHE_INLINE_BYTES (image pyramids, scrub
+   sessions - tens of MB) are written to their own file next to the
+   database before the transaction, which only records the file name.
+   SQLite has one writer at a time: copying a 36MB value into the WAL
+   held that lock for seconds under load, and small writes queued behind
+   it ran out of BUSY_TIMEOUT ("database is locked"). Replaced, evicted
+   and expired files are unlinked after the commit; a reader that loses
+   that race sees a miss
+
+Namespaces (pool in brackets):
+    results   - encoded /api/process-image results (ResultCache L2) [results]
+    images    - uploaded images and their pyramids (models/image_handles.py) [images]
+    wikipedia - Wikipedia search and summary responses [general]
+    llm       - Gemini text answers [general]
+    scrub     - intensity scrub sessions (models/intensity_scrub.py) [general]
+    traces    - sampled request traces (models/tracing.py) [general]
+    profiles  - request profiles (models/request_profiler.py) [general]
+    jobs      - job records (models/job_queue.py) [state]
+    progress  - pipeline stage events (models/progress.py) [state]
+    metrics   - per-process metric snapshots (models/metrics.py) [state]
+    samples   - per-process sampled stacks (models/stack_sampler.py) [state]
+
+The state pool is never evicted for size - its records describe live work
+(a queued job, an open progress stream) and are small; they only expire.
+
+Configuration (environment):
+    SHARED_CACHE_PATH          - database file (default processed/cache/shared.db)
+    SHARED_CACHE_BYTES         - general pool budget (default 512MB)
+    SHARED_CACHE_IMAGES_BYTES  - images pool budget (default 1GB)
+    SHARED_CACHE_RESULTS_BYTES - results pool budget (default 512MB)
+    SHARED_CACHE_INLINE_BYTES  - larger values are stored as files (default 256KB)
+"""
+
+from functools import wraps
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+SHARED_CACHE_PATH = os.getenv('SHARED_CACHE_PATH', os.path.join('processed', 'cache', 'shared.db'))
+SHARED_CACHE_BYTES = int(os.getenv('SHARED_CACHE_BYTES', 512 * 1024 * 1024))
+SHARED_CACHE_IMAGES_BYTES = int(os.getenv('SHARED_CACHE_IMAGES_BYTES', 1024 * 1024 * 1024))
+SHARED_CACHE_RESULTS_BYTES = int(os.getenv('SHARED_CACHE_RESULTS_BYTES', 512 * 1024 * 1024))
+SHARED_CACHE_INLINE_BYTES = int(os.getenv('SHARED_CACHE_INLINE_BYTES', 256 * 1024))
+
+# Namespace -> pool; anything not listed is in the general pool
+POOLS = {
+    'results': 'results',
+    'images': 'images',
+    'jobs': 'state',
+    'progress': 'state',
+    'metrics': 'state',
+    'samples': 'state'
+}
+GENERAL_POOL = 'general'
+
+# Reads only refresh the LRU timestamp when it is older than this, so hot
+# keys don't turn every read into a write
+TOUCH_INTERVAL = 60
+
+# Wait this long for another worker's write lock before giving up
+BUSY_TIMEOUT = 5.0
+
+# Writes to pools that are never evicted (state) wait longer: a job record
+# or progress event is not a cache entry - dropping one fails the job. On
+# an overloaded host a lock holder can be descheduled for seconds
+STATE_BUSY_TIMEOUT = 30.0
+
+# Expired entries are swept by a put at most this often (per process), at
+# most EXPIRY_SWEEP_BATCH at a time
+EXPIRY_SWEEP_INTERVAL = 30
+EXPIRY_SWEEP_BATCH = 256
+
+# Databases written with an older layout are dropped and recreated
+SCHEMA_VERSION = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace   TEXT NOT NULL,
+    key         TEXT NOT NULL,
+    pool        TEXT NOT NULL,
+    value       BLOB NOT NULL,
+    file        TEXT,
+    size        INTEGER NOT NULL,
+    expires_at  REAL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_pool_accessed ON entries (pool, accessed_at);
+CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires_at) WHERE expires_at IS NOT NULL;
+CREATE TABLE IF NOT EXISTS totals (
+    pool  TEXT PRIMARY KEY,
+    bytes INTEGER NOT NULL
+);
+"""
+
+
+def pool_of(namespace: str) -> str:
+    return POOLS.get(namespace, GENERAL_POOL)
+
+
+class SharedCache:
+    """
+    SQLite (WAL) key/value store shared by all processes on the host
+    
+    Cache failures never propagate - a locked or broken database behaves
+    like a miss, so requests still succeed without the shared tier.
+    """
+    
+    def __init__(self, path: str = SHARED_CACHE_PATH, budgets: dict = None):
+        """
+        Args:
+            path: database file
+            budgets: pool -> byte budget (None = never evicted for size)
+        """
+        self.path = path
+        self.files = path + '.files'
+        self.budgets = budgets if budgets is not None else {
+            GENERAL_POOL: SHARED_CACHE_BYTES,
+            'images': SHARED_CACHE_IMAGES_BYTES,
+            'results': SHARED_CACHE_RESULTS_BYTES,
+            'state': None
+        }
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+        
+        self.stats_counters = {
+            'hits': 0,
+            'misses': 0,
+            'writes': 0,
+            'evictions': 0,
+            'expired': 0,
+            'errors': 0
+        }
+    
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread, re-opened after a fork"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        if conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            self._migrate(conn)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+    
+    def reopen(self):
+        """Forget open connections - each thread's next call opens a fresh one"""
+        self._local = threading.local()
+    
+    def _migrate(self, conn: sqlite3.Connection):
+        """Recreate the tables (under the write lock, once per database)"""
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+                # It is a cache - older layouts are dropped, not converted
+                conn.execute('DROP TABLE IF EXISTS entries')
+                conn.execute('DROP TABLE IF EXISTS totals')
+                self._unlink(os.listdir(self.files) if os.path.isdir(self.files) else [])
+                for statement in _SCHEMA.split(';'):
+                    if statement.strip():
+                        conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+    
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.stats_counters[name] += amount
+    
+    def _error(self, action: str, error: Exception):
+        # Imported here: tracing stores its traces in this cache
+        from .tracing import log, WARNING
+        self._count('errors')
+        log(f"Shared cache {action} error: {error}", WARNING)
+    
+    def get(self, namespace: str, key: str):
+        """Return the stored bytes, or None on miss/expiry"""
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                'SELECT value, file, expires_at, accessed_at FROM entries WHERE namespace = ? AND key = ?',
+                (namespace, key)
+            ).fetchone()
+            
+            if row is None or (row[2] is not None and row[2] < now):
+                self._count('misses')
+                return None
+            
+            value = row[0] if row[1] is None else self._read_file(row[1])
+            if value is None:
+                self._count('misses')
+                return None
+            
+            if now - row[3] > TOUCH_INTERVAL:
+                conn.execute(
+                    'UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?',
+                    (now, namespace, key)
+                )
+            self._count('hits')
+            return value
+        except (sqlite3.Error, OSError) as e:
+            self._error('read', e)
+            return None
+    
+    def put(self, namespace: str, key: str, value: bytes, ttl: float = None):
+        """Atomically store bytes (replacing any existing value)"""
+        pool = pool_of(namespace)
+        budget = self.budgets.get(pool)
+        if budget is not None and len(value) > budget:
+            return
+        
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        sweep = now >= self._next_sweep
+        if sweep:
+            self._next_sweep = now + EXPIRY_SWEEP_INTERVAL
+        file = None
+        orphans = []
+        try:
+            conn = self._connect()
+            conn.execute(f'PRAGMA busy_timeout = {int(1000 * (STATE_BUSY_TIMEOUT if budget is None else BUSY_TIMEOUT))}')
+            # Written before taking the write lock (see module docstring)
+            if len(value) > SHARED_CACHE_INLINE_BYTES:
+                file = self._write_file(value)
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                old = conn.execute(
+                    'SELECT size, file FROM entries WHERE namespace = ? AND key = ?', (namespace, key)
+                ).fetchone()
+                conn.execute(
+                    'INSERT OR REPLACE INTO entries (namespace, key, pool, value, file, size, expires_at, accessed_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (namespace, key, pool, sqlite3.Binary(b'' if file else value), file, len(value), expires_at, now)
+                )
+                total = self._add_bytes(conn, pool, len(value) - (old[0] if old else 0))
+                expired = self._sweep_expired(conn, now, orphans) if sweep else 0
+                evicted = self._evict(conn, pool, total, orphans) if budget is not None and total > budget else 0
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            if old and old[1]:
+                orphans.append(old[1])
+            self._count('writes')
+            if expired:
+                self._count('expired', expired)
+            if evicted:
+                self._count('evictions', evicted)
+        except (sqlite3.Error, OSError) as e:
+            if file:
+                orphans.append(file)
+            self._error('write', e)
+        self._unlink(orphans)
+    
+    def _read_file(self, name: str):
+        """A large value's bytes - None when it was replaced or evicted since its row was read"""
+        try:
+            with open(os.path.join(self.files, name), 'rb') as stored:
+                return stored.read()
+        except FileNotFoundError:
+            return None
+    
+    def _write_file(self, value: bytes) -> str:
+        """Store a large value in a new file (renamed into place complete) and return its name"""
+        os.makedirs(self.files, exist_ok=True)
+        name = uuid.uuid4().hex
+        partial = os.path.join(self.files, name + '.part')
+        with open(partial, 'wb') as stored:
+            stored.write(value)
+        os.replace(partial, os.path.join(self.files, name))
+        return name
+    
+    def _unlink(self, files: list):
+        for name in files:
+            try:
+                os.unlink(os.path.join(self.files, name))
+            except FileNotFoundError:
+                pass
+    
+    @staticmethod
+    def _add_bytes(conn: sqlite3.Connection, pool: str, delta: int) -> int:
+        """Adjust a pool's running byte total and return it"""
+        conn.execute(
+            'INSERT INTO totals (pool, bytes) VALUES (?, ?) '
+            'ON CONFLICT (pool) DO UPDATE SET bytes = bytes + excluded.bytes',
+            (pool, delta)
+        )
+        return conn.execute('SELECT bytes FROM totals WHERE pool = ?', (pool,)).fetchone()[0]
+    
+    def _delete_rows(self, conn: sqlite3.Connection, rows: list, orphans: list) -> int:
+        """
+        Delete (rowid, pool, size, file) rows and take them off the totals
+        
+        orphans: collects their files, to unlink once the transaction commits
+        """
+        if not rows:
+            return 0
+        conn.executemany('DELETE FROM entries WHERE rowid = ?', [(row[0],) for row in rows])
+        freed = {}
+        for _, pool, size, file in rows:
+            freed[pool] = freed.get(pool, 0) + size
+            if file:
+                orphans.append(file)
+        for pool, size in freed.items():
+            self._add_bytes(conn, pool, -size)
+        return len(rows)
+    
+    def _sweep_expired(self, conn: sqlite3.Connection, now: float, orphans: list) -> int:
+        rows = conn.execute(
+            'SELECT rowid, pool, size, file FROM entries WHERE expires_at IS NOT NULL AND expires_at < ? LIMIT ?',
+            (now, EXPIRY_SWEEP_BATCH)
+        ).fetchall()
+        return self._delete_rows(conn, rows, orphans)
+    
+    def _evict(self, conn: sqlite3.Connection, pool: str, total: int, orphans: list) -> int:
+        """Drop a pool's least recently used entries until it is under budget"""
+        budget = self.budgets[pool]
+        victims = []
+        for rowid, size, file in conn.execute(
+            'SELECT rowid, size, file FROM entries WHERE pool = ? ORDER BY accessed_at', (pool,)
+        ):
+            if total <= budget:
+                break
+            victims.append((rowid, pool, size, file))
+            total -= size
+        return self._delete_rows(conn, victims, orphans)
+    
+    def delete(self, namespace: str, key: str):
+        orphans = []
+        try:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute(
+                    'SELECT rowid, pool, size, file FROM entries WHERE namespace = ? AND key = ?', (namespace, key)
+                ).fetchall()
+                self._delete_rows(conn, rows, orphans)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            self._error('delete', e)
+            return
+        self._unlink(orphans)
+    
+    def get_json(self, namespace: str, key: str):
+        value = self.get(namespace, key)
+        return json.loads(value) if value is not None else None
+    
+    def put_json(self, namespace: str, key: str, value, ttl: float = None):
+        self.put(namespace, key, json.dumps(value).encode(), ttl)
+    
+    def scan_json(self, namespace: str, prefix: str = '', after: str = None) -> dict:
+        """
+        Live entries of a namespace as {key: value}, in key order
+        
+        prefix: only keys starting with it (a range scan on the primary key)
+        after: only keys greater than this one
+        Without a prefix, for small namespaces only.
+        """
+        query = 'SELECT key, value, file FROM entries WHERE namespace = ? AND (expires_at IS NULL OR expires_at >= ?)'
+        parameters = [namespace, time.time()]
+        if prefix:
+            query += ' AND key >= ? AND key < ?'
+            parameters += [prefix, prefix + '\U0010ffff']
+        if after is not None:
+            query += ' AND key > ?'
+            parameters.append(after)
+        try:
+            rows = self._connect().execute(query + ' ORDER BY key', parameters).fetchall()
+            values = {key: value if file is None else self._read_file(file) for key, value, file in rows}
+        except (sqlite3.Error, OSError) as e:
+            self._error('scan', e)
+            return {}
+        return {key: json.loads(value) for key, value in values.items() if value is not None}
+    
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.stats_counters)
+        lookups = counters['hits'] + counters['misses']
+        counters['hit_ratio'] = round(counters['hits'] / lookups, 4) if lookups else 0.0
+        counters['budgets'] = dict(self.budgets)
+        
+        # Host-wide contents (shared by all workers), per pool and namespace
+        try:
+            conn = self._connect()
+            counters['pools'] = dict(conn.execute('SELECT pool, bytes FROM totals').fetchall())
+            counters['bytes'] = sum(counters['pools'].values())
+            rows = conn.execute(
+                'SELECT namespace, COUNT(*), COALESCE(SUM(size), 0) FROM entries GROUP BY namespace'
+            ).fetchall()
+            counters['namespaces'] = {name: {'entries': count, 'bytes': size} for name, count, size in rows}
+        except sqlite3.Error as e:
+            self._error('stats', e)
+        return counters
+
+
+# Global instance
+shared_cache = SharedCache()
+
+
+def shared_memoize(namespace: str, ttl: float = None, cache_if=None, method: bool = False):
+    """
+    Memoize a JSON-serializable function result in the shared tier
+    
+    The key is the JSON of the arguments (self excluded when method=True).
+    cache_if: optional predicate - results failing it (e.g. empty results
+    from a network error) are returned but not stored.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key_args = args[1:] if method else args
+            key = f'{fn.__qualname__}:' + json.dumps([key_args, kwargs], sort_keys=True, default=str)
+            
+            cached = shared_cache.get_json(namespace, key)
+            if cached is not None:
+                return cached
+            
+            value = fn(*args, **kwargs)
+            if cache_if is None or cache_if(value):
+                shared_cache.put_json(namespace, key, value, ttl)
+            return value
+        return wrapper
+    return decorator
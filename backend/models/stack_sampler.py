@@ -0,0 +1,274 @@
+"""
+Stack Sampler
+Always-on statistical profiler with flamegraph export
+
+Request profiles (models/request_profiler.py) explain one request; this
+shows where time goes across real traffic - PIL filters, base64 encoding,
+JSON parsing or waiting on Gemini:
+1. A daemon thread in every process (gunicorn worker, job and tile pool
+   processes) wakes every SAMPLER_INTERVAL and reads the Python stack of
+   each other thread with sys._current_frames() - no signals, so C code
+   and blocking calls are never interrupted
+2. Stacks are folded at function granularity and weighted by the time
+   since the previous sample, so a stretched interval still adds up
+3. The sampler times itself: when a sample costs more than
+   SAMPLER_MAX_OVERHEAD of the interval, the interval grows until it
+   doesn't (a sample holds the GIL, so this bounds the stall on every
+   other thread too)
+4. Threads with no application frame on their stack (gunicorn pollers,
+   idle pool threads waiting for work) are counted as idle and left out
+   of the flamegraph unless asked for
+5. Each process writes its folded stacks to the shared tier (namespace
+   'samples', one key per host:pid) every SAMPLER_FLUSH seconds; exports
+   merge every process on the host
+
+Only Python frames are visible: time inside a C call (a PIL filter, a
+socket read) is charged to the Python function that made the call.
+
+Configuration (environment):
+    SAMPLER_ENABLED      - run the sampler (default on)
+    SAMPLER_INTERVAL     - seconds between samples (default 0.02)
+    SAMPLER_MAX_OVERHEAD - sampling time budget as a fraction of wall time (default 0.01)
+    SAMPLER_MAX_STACKS   - distinct stacks kept per process (default 5000)
+    SAMPLER_FLUSH        - seconds between snapshot writes (default 30)
+    SAMPLER_TTL          - seconds a snapshot outlives its process (default 3600)
+"""
+
+from .shared_cache import shared_cache
+import atexit
+import os
+import socket
+import sys
+import threading
+import time
+
+SAMPLER_ENABLED = os.getenv('SAMPLER_ENABLED', '1').lower() in ('1', 'true', 'yes')
+SAMPLER_INTERVAL = float(os.getenv('SAMPLER_INTERVAL', 0.02))
+SAMPLER_MAX_OVERHEAD = float(os.getenv('SAMPLER_MAX_OVERHEAD', 0.01))
+SAMPLER_MAX_STACKS = int(os.getenv('SAMPLER_MAX_STACKS', 5000))
+SAMPLER_FLUSH = float(os.getenv('SAMPLER_FLUSH', 30))
+SAMPLER_TTL = int(os.getenv('SAMPLER_TTL', 3600))
+
+SHARED_NAMESPACE = 'samples'
+
+# Frames under this directory are application code
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Background threads of our own that are never interesting
+IGNORED_THREADS = ('stack-sampler', 'metrics-flush')
+
+# Stacks past SAMPLER_MAX_STACKS are folded into this one
+OVERFLOW_STACK = '[other stacks]'
+
+
+def _describe(code) -> tuple:
+    """(module:function, is application code) for a code object"""
+    filename = code.co_filename
+    application = False
+    if 'site-packages' + os.sep in filename:
+        module = filename.split('site-packages' + os.sep, 1)[1]
+    elif filename.startswith(APP_ROOT + os.sep):
+        module = os.path.relpath(filename, APP_ROOT)
+        application = True
+    else:
+        module = os.path.basename(filename)
+    if module.endswith('.py'):
+        module = module[:-3]
+    return f"{module.replace(os.sep, '.')}:{code.co_name}", application
+
+
+class StackSampler:
+    """
+    Folded stack weights of this process, sampled by a daemon thread
+    """
+    
+    def __init__(self):
+        self._names = {}  # code object -> (frame name, is application code)
+        self._reset()
+        os.register_at_fork(after_in_child=self._after_fork)
+        atexit.register(self.flush)
+    
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._stacks = {}  # folded stack -> seconds
+        self._idle = {}
+        self._inherited = set()  # ids of frames inherited through fork
+        self._thread = None
+        self._stop = threading.Event()
+        self.key = f'{socket.gethostname()}:{os.getpid()}'
+        self.started = time.time()
+        self.samples = 0
+        self.sample_seconds = 0.0
+        self.interval = SAMPLER_INTERVAL
+    
+    def _after_fork(self):
+        """A forked child (pool process) samples itself from scratch"""
+        running = self._thread is not None
+        self._reset()
+        # The child's main thread still has the forking request's frames
+        # above it; they never return, so they are cut from every stack
+        frame = sys._getframe()
+        while frame is not None:
+            self._inherited.add(id(frame))
+            frame = frame.f_back
+        if running:
+            self.start()
+    
+    def start(self):
+        """Start sampling this process (idempotent)"""
+        if not SAMPLER_ENABLED:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+    
+    def _fold(self, frame) -> tuple:
+        """(folded stack root first, has an application frame)"""
+        names = []
+        application = False
+        while frame is not None and id(frame) not in self._inherited:
+            code = frame.f_code
+            described = self._names.get(code)
+            if described is None:
+                described = self._names[code] = _describe(code)
+            names.append(described[0])
+            application = application or described[1]
+            frame = frame.f_back
+        names.reverse()
+        return ';'.join(names), application
+    
+    def sample(self, weight: float):
+        """Add one sample of every other thread, weighted in seconds"""
+        own = threading.get_ident()
+        ignored = {thread.ident for thread in threading.enumerate() if thread.name in IGNORED_THREADS}
+        folded = [self._fold(frame) for ident, frame in sys._current_frames().items()
+                  if ident != own and ident not in ignored]
+        
+        with self._lock:
+            for stack, application in folded:
+                target = self._stacks if application else self._idle
+                if stack not in target and len(target) >= SAMPLER_MAX_STACKS:
+                    stack = OVERFLOW_STACK
+                target[stack] = target.get(stack, 0.0) + weight
+    
+    def _run(self):
+        last_flush = last_sample = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            start = time.perf_counter()
+            self.sample(start - last_sample)
+            last_sample = end = time.perf_counter()
+            
+            cost = end - start
+            self.samples += 1
+            self.sample_seconds += cost
+            self.interval = max(SAMPLER_INTERVAL, cost / SAMPLER_MAX_OVERHEAD - cost)
+            
+            if end - last_flush >= SAMPLER_FLUSH:
+                self.flush()
+                last_flush = time.perf_counter()
+    
+    def snapshot(self) -> dict:
+        with self._lock:
+            stacks = dict(self._stacks)
+            idle = dict(self._idle)
+        return {
+            'updated_at': time.time(),
+            'started': self.started,
+            'samples': self.samples,
+            'sample_seconds': self.sample_seconds,
+            'interval': self.interval,
+            'stacks': stacks,
+            'idle': idle
+        }
+    
+    def flush(self):
+        """Publish this process's stacks to the shared tier"""
+        if self.samples:
+            shared_cache.put_json(SHARED_NAMESPACE, self.key, self.snapshot(), ttl=SAMPLER_TTL)
+    
+    def merged(self, idle: bool = False) -> tuple:
+        """
+        Folded stacks of every process on the host
+        
+        Returns:
+            (stacks {folded: seconds}, per-process stats)
+        """
+        snapshots = shared_cache.scan_json(SHARED_NAMESPACE)
+        if self.samples:
+            snapshots[self.key] = self.snapshot()  # always current for this process
+        
+        stacks = {}
+        processes = {}
+        for key, snapshot in snapshots.items():
+            sources = [snapshot['stacks'], snapshot['idle']] if idle else [snapshot['stacks']]
+            for source in sources:
+                for stack, seconds in source.items():
+                    stacks[stack] = stacks.get(stack, 0.0) + seconds
+            
+            elapsed = max(snapshot['updated_at'] - snapshot['started'], 1e-9)
+            processes[key] = {
+                'samples': snapshot['samples'],
+                'interval': round(snapshot['interval'], 4),
+                'overhead': round(snapshot['sample_seconds'] / elapsed, 5),
+                'busy_seconds': round(sum(snapshot['stacks'].values()), 3),
+                'idle_seconds': round(sum(snapshot['idle'].values()), 3)
+            }
+        return stacks, processes
+
+
+def collapsed(stacks: dict) -> str:
+    """Brendan Gregg's collapsed format (flamegraph.pl, speedscope, inferno) - weights in ms"""
+    lines = []
+    for stack, seconds in sorted(stacks.items()):
+        milliseconds = round(seconds * 1000)
+        if milliseconds:
+            lines.append(f'{stack} {milliseconds}')
+    return '\n'.join(lines) + '\n'
+
+
+def speedscope(stacks: dict, name: str = 'heri-science') -> dict:
+    """speedscope file format - one 'sampled' profile weighted in seconds"""
+    frames = []
+    frame_index = {}
+    samples = []
+    weights = []
+    for stack, seconds in sorted(stacks.items()):
+        indexes = []
+        for frame in stack.split(';'):
+            if frame not in frame_index:
+                frame_index[frame] = len(frames)
+                module, _, function = frame.rpartition(':')
+                frames.append({'name': function, 'file': module} if module else {'name': frame})
+            indexes.append(frame_index[frame])
+        samples.append(indexes)
+        weights.append(round(seconds, 6))
+    
+    total = sum(weights)
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'heri-science stack sampler',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'seconds',
+            'startValue': 0,
+            'endValue': round(total, 6),
+            'samples': samples,
+            'weights': weights
+        }]
+    }
+
+
+# Global instance
+stack_sampler = StackSampler()
+
+
+def start_sampler():
+    stack_sampler.start()
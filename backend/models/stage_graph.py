@@ -0,0 +1,143 @@
+"""
+Stage Graph
+Pipelines as a DAG of stages with per-stage memoization
+
+Each stage declares the inputs it reads - other stages or named sources
+(the image, individual processing params). Its cache key is a Merkle hash:
+    key(stage) = H(graph, stage, version, key(input 1), key(input 2), ...)
+    key(source) = H(content)  (pixel hash for images)
+
+So a stage's key changes exactly when something upstream of it changes.
+Switching mode reuses the stages the modes share (e.g. the analysis),
+and changing only contrast_factor reuses everything before the contrast
+stage. Evaluation is lazy: when a stage is cached, nothing above it runs.
+
+Stage functions must not modify their inputs in place - cached outputs
+are handed to every later run that shares them.
+
+Configuration (environment):
+    STAGE_CACHE_BYTES - memory for cached stage outputs (default 256MB)
+"""
+
+from .bounded_cache import get_cache, content_key, image_content_hash
+import hashlib
+import os
+
+STAGE_CACHE_BYTES = int(os.getenv('STAGE_CACHE_BYTES', 256 * 1024 * 1024))
+
+# Charged for non-image stage outputs (analysis dicts, ...)
+_SMALL_VALUE_BYTES = 1024
+
+
+def _sizeof(value) -> int:
+    if hasattr(value, 'getbands') and hasattr(value, 'size'):  # PIL Image
+        return value.width * value.height * len(value.getbands())
+    return _SMALL_VALUE_BYTES
+
+
+_stage_cache = get_cache('stage_graph', max_bytes=STAGE_CACHE_BYTES, sizeof=_sizeof)
+
+
+def _hash(*parts) -> str:
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def source_key(value) -> str:
+    """Content hash of a source value"""
+    if hasattr(value, 'getbands') and hasattr(value, 'tobytes'):
+        return image_content_hash(value)
+    return _hash(content_key(value))
+
+
+class Stage:
+    """One node of the graph"""
+    
+    def __init__(self, name: str, fn, inputs: tuple, version: int = 1):
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.version = version
+
+
+class StageGraph:
+    """
+    DAG of pipeline stages with Merkle-keyed memoization
+    
+    Usage:
+        graph = StageGraph('restore')
+        graph.add('analysis', analyze, ('image',))
+        graph.add('denoise', denoise, ('image', 'analysis'))
+        result, report = graph.run('denoise', {'image': image})
+    """
+    
+    def __init__(self, name: str, cache=None):
+        self.name = name
+        self.cache = cache if cache is not None else _stage_cache
+        self.stages = {}
+    
+    def add(self, name: str, fn, inputs: tuple = (), version: int = 1) -> Stage:
+        """
+        Register a stage: fn is called with the values of inputs, in order
+        
+        Inputs must already be registered stages or be source names;
+        bump version when the stage's behaviour changes.
+        """
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' already registered")
+        stage = Stage(name, fn, inputs, version)
+        self.stages[name] = stage
+        return stage
+    
+    def keys(self, targets, sources: dict) -> dict:
+        """Merkle keys for the targets and everything they depend on"""
+        keys = {}
+        
+        def visit(name):
+            if name in keys:
+                return keys[name]
+            if name in self.stages:
+                stage = self.stages[name]
+                keys[name] = _hash(self.name, name, stage.version, *(visit(dep) for dep in stage.inputs))
+            elif name in sources:
+                keys[name] = source_key(sources[name])
+            else:
+                raise KeyError(f"Unknown stage or source '{name}' in graph '{self.name}'")
+            return keys[name]
+        
+        for target in ((targets,) if isinstance(targets, str) else targets):
+            visit(target)
+        return keys
+    
+    def run(self, targets, sources: dict) -> tuple:
+        """
+        Evaluate one target (str) or several (tuple), reusing cached stages
+        
+        Returns:
+            (value or tuple of values, report) - report lists the stages
+            that were computed and the stages served from cache
+        """
+        keys = self.keys(targets, sources)
+        values = {}
+        report = {'computed': [], 'cached': []}
+        
+        def evaluate(name):
+            if name in values:
+                return values[name]
+            if name not in self.stages:
+                values[name] = sources[name]
+                return values[name]
+            
+            value = self.cache.get(keys[name])
+            if value is None:
+                stage = self.stages[name]
+                value = stage.fn(*(evaluate(dep) for dep in stage.inputs))
+                self.cache.put(keys[name], value)
+                report['computed'].append(name)
+            else:
+                report['cached'].append(name)
+            values[name] = value
+            return value
+        
+        if isinstance(targets, str):
+            return evaluate(targets), report
+        return tuple(evaluate(target) for target in targets), report
@@ -0,0 +1,178 @@
+"""
+TILED Multi-Core Processing Engine
+Full-resolution processing for large scans without the 2000px downscale
+
+Splits an image into overlapping tiles, runs a stage chain on each tile
+across a process pool, and stitches the tile cores back together.
+
+Seam-free because:
+1. Every tile carries an overlap margin larger than the receptive field of
+   the stage chain (median, smoothing, unsharp radius, LANCZOS support)
+2. Only the core of each processed tile (margin cropped off) is pasted
+3. Image-global statistics (e.g. the contrast mean) are computed once on the
+   whole image and passed to every tile instead of being measured per tile
+
+Memory: at most 2 tiles per worker are in flight, so intermediates are
+bounded by TILE_SIZE, not by the image size. Only the output canvas is full-size.
+
+Processes: each gunicorn worker has its own tile pool, so by default a
+pool gets its share of the cores (CPU count / WEB_WORKERS) rather than
+all of them. Job pool processes run their tiles inline (run_tiles_inline,
+called by models/job_queue.py) - JOB_WORKERS jobs already occupy that
+many cores, and a tile pool per job process would multiply the process
+count again. Tile processes start from a forkserver, like job processes
+(see models/job_queue.py), and request threads racing to create the pool
+share one (_executor_lock).
+
+Configuration (environment):
+    TILE_SIZE     - core tile edge in source pixels (default 1024)
+    TILE_WORKERS  - worker processes per pool (default: CPU count / WEB_WORKERS)
+    WEB_WORKERS   - gunicorn worker processes (default 4, as in Dockerfile.backend)
+"""
+
+from PIL import Image
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import atexit
+import multiprocessing
+import os
+import threading
+
+TILE_SIZE = int(os.getenv('TILE_SIZE', 1024))
+WEB_WORKERS = int(os.getenv('WEB_WORKERS', 4))
+TILE_WORKERS = int(os.getenv('TILE_WORKERS', 0)) or max(1, (os.cpu_count() or 1) // WEB_WORKERS)
+
+# Default margin in source pixels - comfortably above the ~20px receptive
+# field of the restoration and super-resolution stage chains
+TILE_OVERLAP = 32
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_inline = False
+
+
+def run_tiles_inline():
+    """Never start a tile pool in this process (e.g. a job pool process)"""
+    global _inline
+    _inline = True
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """
+    Lazily create one pool per process (i.e. per gunicorn worker)
+    
+    A pool inherited through fork (e.g. inside a job worker) belongs to the
+    parent and can't be used, so a forked child creates its own.
+    """
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ProcessPoolExecutor(
+                max_workers=TILE_WORKERS,
+                mp_context=multiprocessing.get_context('forkserver')
+            )
+            _executor_pid = os.getpid()
+            atexit.register(_executor.shutdown, wait=True)
+        return _executor
+
+
+def plan_tiles(width: int, height: int, tile_size: int = TILE_SIZE, overlap: int = TILE_OVERLAP) -> list:
+    """
+    Plan tile geometry
+    
+    Returns:
+        list of (core_box, padded_box) in source coordinates
+    """
+    tiles = []
+    for top in range(0, height, tile_size):
+        for left in range(0, width, tile_size):
+            core = (left, top, min(left + tile_size, width), min(top + tile_size, height))
+            padded = (
+                max(core[0] - overlap, 0),
+                max(core[1] - overlap, 0),
+                min(core[2] + overlap, width),
+                min(core[3] + overlap, height)
+            )
+            tiles.append((core, padded))
+    return tiles
+
+
+def needs_tiling(image: Image.Image, tile_size: int = TILE_SIZE) -> bool:
+    """Whether an image is large enough to be worth splitting"""
+    return image.width > tile_size or image.height > tile_size
+
+
+def _run_tile(stage_fn, mode, size, data, args):
+    """Worker entry point - tiles travel as raw bytes"""
+    tile = Image.frombytes(mode, size, data)
+    result = stage_fn(tile, *args)
+    return result.mode, result.size, result.tobytes()
+
+
+def process_tiled(image: Image.Image, stage_fn, args: tuple = (), scale: int = 1,
+                  tile_size: int = TILE_SIZE, overlap: int = TILE_OVERLAP,
+                  workers: int = None, on_tile=None) -> Image.Image:
+    """
+    Run a stage chain over an image tile by tile
+    
+    Args:
+        image: Input PIL Image
+        stage_fn: module-level function (tile, *args) -> Image; must be picklable
+            and must not measure image-global statistics itself
+        args: extra arguments for stage_fn (global stats, intensity, ...)
+        scale: integer output/input size ratio of stage_fn (2 for 2x SR)
+        tile_size: core tile edge in source pixels
+        overlap: margin in source pixels
+        workers: override pool size (1 runs inline, no pool; ignored after
+            run_tiles_inline())
+        on_tile: optional callback(done, total) after each tile is stitched
+    
+    Returns:
+        Stitched output image
+    """
+    tiles = plan_tiles(image.width, image.height, tile_size, overlap)
+    output = None
+    stitched = 0
+    
+    def paste(core, padded, mode, size, data):
+        nonlocal output, stitched
+        result = Image.frombytes(mode, size, data)
+        if output is None:
+            output = Image.new(mode, (image.width * scale, image.height * scale))
+        inner = (
+            (core[0] - padded[0]) * scale,
+            (core[1] - padded[1]) * scale,
+            (core[2] - padded[0]) * scale,
+            (core[3] - padded[1]) * scale
+        )
+        output.paste(result.crop(inner), (core[0] * scale, core[1] * scale))
+        stitched += 1
+        if on_tile:
+            on_tile(stitched, len(tiles))
+    
+    workers = 1 if _inline else (workers or TILE_WORKERS)
+    if workers <= 1 or len(tiles) == 1:
+        for core, padded in tiles:
+            result = stage_fn(image.crop(padded), *args)
+            paste(core, padded, result.mode, result.size, result.tobytes())
+        return output
+    
+    # Bounded submission window keeps peak memory proportional to tile size
+    executor = _get_executor()
+    window = 2 * workers
+    pending = {}
+    queue = list(tiles)
+    
+    while queue or pending:
+        while queue and len(pending) < window:
+            core, padded = queue.pop(0)
+            tile = image.crop(padded)
+            future = executor.submit(_run_tile, stage_fn, tile.mode, tile.size, tile.tobytes(), args)
+            pending[future] = (core, padded)
+        
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            core, padded = pending.pop(future)
+            paste(core, padded, *future.result())
+    
+    return output
@@ -0,0 +1,243 @@
+"""
+Request Tracing
+Spans, Server-Timing headers and leveled, sampled logging
+
+A slow request used to leave only print() lines from every thread mixed
+together. Each request now carries a trace:
+1. span(name) - context manager (or @traced decorator) recording start
+   and duration against the current request's trace; a no-op outside one.
+   The trace lives in a contextvar, so concurrent requests on gunicorn
+   threads never mix
+2. The trace id comes from traceparent / X-Request-ID plus a server
+   generated suffix (or is generated) and is returned as X-Trace-Id; a
+   client can correlate by its id but never pick another request's trace
+   key. A job submitted by the request records its own segment under the
+   same id
+3. Every response gets a Server-Timing header (time per span name) -
+   visible in the browser's network panel
+4. Sampled traces (TRACE_SAMPLE_RATE, or forced with `X-Trace: 1`,
+   `?trace=1` or a sampled traceparent - admins only, see app.py) are
+   kept in the shared tier
+   (namespace 'traces') and exported as Chrome trace-event JSON - load it
+   in chrome://tracing or ui.perfetto.dev
+
+log(message, level) replaces hot-path print():
+- messages below LOG_LEVEL are dropped
+- debug/info lines of unsampled requests are printed for a
+  LOG_SAMPLE_RATE fraction of requests (all or nothing per request);
+  warnings and errors always are
+- lines are prefixed with the trace id and, in sampled traces, recorded
+  as instant events
+
+Configuration (environment):
+    TRACE_SAMPLE_RATE - fraction of requests whose traces are stored (default 0.01)
+    TRACE_TTL         - seconds a stored trace is kept (default 3600)
+    LOG_LEVEL         - debug / info / warning / error (default info)
+    LOG_SAMPLE_RATE   - fraction of requests whose debug/info lines print (default 1.0)
+"""
+
+from contextlib import contextmanager
+from functools import wraps
+from .shared_cache import shared_cache
+import contextvars
+import os
+import random
+import re
+import threading
+import time
+import uuid
+
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', 0.01))
+TRACE_TTL = int(os.getenv('TRACE_TTL', 3600))
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 1.0))
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR}
+LOG_LEVEL = LEVELS.get(os.getenv('LOG_LEVEL', 'info').lower(), INFO)
+
+_LEVEL_PREFIX = {WARNING: '[WARN] ', ERROR: '[ERROR] '}
+
+SHARED_NAMESPACE = 'traces'
+
+# Server-Timing entries per response (the rest are summed into 'other')
+SERVER_TIMING_LIMIT = 20
+
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+_TRACE_ID = re.compile(r'^[A-Za-z0-9_-]{8,80}$')
+_TRACEPARENT = re.compile(r'^[0-9a-f]{2}-([0-9a-f]{32})-[0-9a-f]{16}-([0-9a-f]{2})$')
+_TOKEN_UNSAFE = re.compile(r'[^A-Za-z0-9_.-]+')
+
+_current = contextvars.ContextVar('trace', default=None)
+
+# A forked pool process must not keep appending to the parent's trace
+os.register_at_fork(after_in_child=lambda: _current.set(None))
+
+
+class Trace:
+    """
+    Spans and log events of one request (or one job segment of it)
+    """
+    
+    def __init__(self, trace_id: str, name: str, sampled: bool, segment: str = 'request'):
+        self.trace_id = trace_id
+        self.name = name
+        self.sampled = sampled
+        self.segment = segment
+        self.log_sampled = sampled or random.random() < LOG_SAMPLE_RATE
+        
+        self.started = time.perf_counter()
+        self.wall_started = time.time()
+        self.events = []
+        self._lock = threading.Lock()
+    
+    def add(self, name: str, category: str, start: float, end: float, args: dict = None):
+        event = [name, category, start - self.started, end - start, threading.get_ident(), args or None]
+        with self._lock:
+            self.events.append(event)
+    
+    def server_timing(self) -> str:
+        """Server-Timing header value: total plus time per span name"""
+        totals = {}
+        for name, category, _, duration, _, _ in self.events:
+            if category != 'log':
+                totals[name] = totals.get(name, 0.0) + duration
+        
+        entries = [f'total;dur={(time.perf_counter() - self.started) * 1000:.1f}']
+        names = list(totals)
+        for index, name in enumerate(names[:SERVER_TIMING_LIMIT]):
+            token = _TOKEN_UNSAFE.sub('-', name).strip('-')[:32] or 'span'
+            description = name.replace('\\', '').replace('"', "'")
+            entries.append(f'{index}-{token};desc="{description}";dur={totals[name] * 1000:.1f}')
+        if len(names) > SERVER_TIMING_LIMIT:
+            rest = sum(totals[name] for name in names[SERVER_TIMING_LIMIT:])
+            entries.append(f'other;dur={rest * 1000:.1f}')
+        return ', '.join(entries)
+    
+    def chrome_events(self) -> list:
+        """Chrome trace-event records (timestamps in wall-clock microseconds)"""
+        pid = os.getpid()
+        origin = self.wall_started * 1e6
+        threads = {}
+        records = [{
+            'name': 'process_name', 'ph': 'M', 'pid': pid,
+            'args': {'name': f'{self.segment} (pid {pid})'}
+        }]
+        with self._lock:
+            events = list(self.events)
+        for name, category, offset, duration, thread, args in events:
+            tid = threads.setdefault(thread, len(threads) + 1)
+            record = {'name': name, 'cat': category, 'pid': pid, 'tid': tid, 'ts': round(origin + offset * 1e6, 1)}
+            if category == 'log':
+                record.update({'ph': 'i', 's': 't'})
+            else:
+                record.update({'ph': 'X', 'dur': round(duration * 1e6, 1)})
+            if args:
+                record['args'] = args
+            records.append(record)
+        return records
+
+
+def _server_suffixed(client_id: str) -> str:
+    return f'{client_id}-{uuid.uuid4().hex[:12]}'
+
+
+def trace_context_from_headers(headers, args=None) -> tuple:
+    """
+    (trace_id, forced) from traceparent / X-Request-ID / X-Trace / ?trace=1
+    
+    A client supplied id gets a server generated suffix. forced is only a
+    request - the caller decides whether the client may force sampling.
+    """
+    match = _TRACEPARENT.match(headers.get('traceparent', ''))
+    if match:
+        return _server_suffixed(match.group(1)), bool(int(match.group(2), 16) & 1)
+    
+    forced = headers.get('X-Trace') == '1' or (args is not None and args.get('trace') == '1')
+    request_id = headers.get('X-Request-ID', '')
+    return (_server_suffixed(request_id) if _REQUEST_ID.match(request_id) else None), forced
+
+
+def start_trace(name: str, trace_id: str = None, sampled: bool = None, segment: str = 'request') -> Trace:
+    """Begin a trace in the current context (sampled=None -> TRACE_SAMPLE_RATE)"""
+    if sampled is None:
+        sampled = random.random() < TRACE_SAMPLE_RATE
+    trace = Trace(trace_id or uuid.uuid4().hex, name, sampled, segment)
+    _current.set(trace)
+    return trace
+
+
+def end_trace(trace: Trace):
+    """Close the root span and store the trace if it is sampled"""
+    trace.add(trace.name, trace.segment, trace.started, time.perf_counter())
+    if _current.get() is trace:
+        _current.set(None)
+    if trace.sampled:
+        key = trace.trace_id if trace.segment == 'request' else f'{trace.trace_id}:{trace.segment}'
+        shared_cache.put_json(SHARED_NAMESPACE, key, trace.chrome_events(), ttl=TRACE_TTL)
+
+
+def current_trace():
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, category: str = 'app', **args):
+    """Record the enclosed block as a span of the current trace"""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, category, start, time.perf_counter(), args)
+
+
+def add_span(name: str, duration: float, category: str = 'app', **args):
+    """Record a span that just ended (for code that times itself, like pipeline stages)"""
+    trace = _current.get()
+    if trace is not None:
+        end = time.perf_counter()
+        trace.add(name, category, end - duration, end, args)
+
+
+def traced(name: str = None, category: str = 'app'):
+    """Decorator form of span() - the span is named after the function by default"""
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+        
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name, category):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def log(message: str, level: int = INFO):
+    """Leveled, per-request sampled replacement for print()"""
+    if level < LOG_LEVEL:
+        return
+    trace = _current.get()
+    if trace is None:
+        print(_LEVEL_PREFIX.get(level, '') + message)
+        return
+    
+    if trace.sampled:
+        now = time.perf_counter()
+        trace.add(message[:200], 'log', now, now, {'level': level})
+    if level >= WARNING or trace.log_sampled:
+        print(f"[{trace.trace_id[:8]}] {_LEVEL_PREFIX.get(level, '')}{message}")
+
+
+def load_chrome_trace(trace_id: str):
+    """Stored trace (request segment plus any job segment) as Chrome trace JSON, or None"""
+    if not _TRACE_ID.match(trace_id or ''):
+        return None
+    events = []
+    for key in (trace_id, f'{trace_id}:job'):
+        events.extend(shared_cache.get_json(SHARED_NAMESPACE, key) or [])
+    if not events:
+        return None
+    return {'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': {'trace_id': trace_id}}
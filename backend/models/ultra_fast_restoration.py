@@ -4,67 +4,67 @@ High-quality adaptive pipeline
 """
 
 from PIL import Image, ImageEnhance, ImageFilter, ImageStat
+from .fused_point_ops import PointChain
+from .tile_engine import needs_tiling, process_tiled
+from .progress import ProgressReporter, QUIET
+from .tracing import log, DEBUG
 import time
 
-def restore_artifact_image(image, intensity=0.75, mode='auto'):
+TOTAL_STAGES = 8
+
+def analyze_restoration_input(image):
     """
-    PROFESSIONAL Restoration with intelligent adaptive processing
+    Stage 1 analysis - image-global statistics shared by every tile
     """
-    start = time.time()
-    print("\n" + "="*60)
-    print("[RESTORATION] Professional Pipeline Starting...")
-    print("="*60)
-    
-    # Step 1: Pre-processing and analysis
-    print("[Stage 1/8] Image Analysis...")
-    stage_start = time.time()
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
-    
-    # Resize if too large
-    max_size = 2000
-    if image.width > max_size or image.height > max_size:
-        ratio = min(max_size / image.width, max_size / image.height)
-        new_size = (int(image.width * ratio), int(image.height * ratio))
-        image = image.resize(new_size, Image.Resampling.LANCZOS)
-    
-    # Analyze image characteristics
     gray = image.convert('L')
     stat = ImageStat.Stat(gray)
     brightness = stat.mean[0]
     variance = stat.var[0]
     
-    is_dark = brightness < 110
-    is_bright = brightness > 170
-    is_noisy = variance > 2500
-    is_low_contrast = variance < 800
-    
-    print(f"[Stage 1/8] Complete in {time.time()-stage_start:.2f}s")
-    print(f"  Analysis: Brightness={brightness:.1f}, Variance={variance:.1f}")
-    print(f"  Flags: Dark={is_dark}, Bright={is_bright}, Noisy={is_noisy}, LowContrast={is_low_contrast}")
-    
+    return {
+        'brightness': brightness,
+        'variance': variance,
+        'is_dark': brightness < 110,
+        'is_bright': brightness > 170,
+        'is_noisy': variance > 2500,
+        'is_low_contrast': variance < 800
+    }
+
+def denoise_stage(image, analysis, progress=QUIET):
+    """
+    Stage 2 - the only stage that does not depend on intensity
+    """
     result = image
     
     # Step 2: Adaptive denoising
-    print("[Stage 2/8] Adaptive Denoising...")
-    stage_start = time.time()
-    if is_noisy:
+    progress.start(2, 'Adaptive Denoising')
+    if analysis['is_noisy']:
         result = result.filter(ImageFilter.MedianFilter(size=3))
         result = result.filter(ImageFilter.SMOOTH_MORE)
-        print(f"[Stage 2/8] Complete in {time.time()-stage_start:.2f}s | Denoised (noisy image detected)")
+        progress.complete('Denoised (noisy image detected)', result)
     else:
-        print(f"[Stage 2/8] Skipped (clean image)")
+        progress.skip('clean image')
+    
+    return result
+
+def restore_intensity_stages(image, intensity, analysis, progress=QUIET):
+    """
+    Stages 3-8 - everything that depends on intensity
+    """
+    is_dark = analysis['is_dark']
+    is_bright = analysis['is_bright']
+    is_low_contrast = analysis['is_low_contrast']
+    
+    result = image
     
     # Step 3: Edge-preserving sharpening
-    print("[Stage 3/8] Edge-Preserving Sharpening...")
-    stage_start = time.time()
+    progress.start(3, 'Edge-Preserving Sharpening')
     sharpness = 1.7 + (intensity * 1.0)
     result = ImageEnhance.Sharpness(result).enhance(sharpness)
-    print(f"[Stage 3/8] Complete in {time.time()-stage_start:.2f}s | Sharpness: {sharpness:.2f}x")
+    progress.complete(f"Sharpness: {sharpness:.2f}x", result)
     
     # Step 4: Adaptive contrast restoration
-    print("[Stage 4/8] Adaptive Contrast Restoration...")
-    stage_start = time.time()
+    progress.start(4, 'Adaptive Contrast Restoration')
     if is_low_contrast:
         contrast = 1.4 + (intensity * 0.5)
     elif is_dark:
@@ -74,65 +74,104 @@ def restore_artifact_image(image, intensity=0.75, mode='auto'):
     else:
         contrast = 1.2 + (intensity * 0.3)
     
-    result = ImageEnhance.Contrast(result).enhance(contrast)
-    print(f"[Stage 4/8] Complete in {time.time()-stage_start:.2f}s | Contrast: {contrast:.2f}x (Adaptive)")
+    # Contrast pivots on the mean of this image, as ImageEnhance does - or,
+    # for tiles, on the fixed pivot every tile shares
+    tone_ops = PointChain().contrast(contrast, mean=analysis.get('contrast_pivot'))
+    progress.complete(f"Planned - Contrast: {contrast:.2f}x (Adaptive)")
     
-    # Step 5: Color restoration
-    print("[Stage 5/8] Color Restoration...")
-    stage_start = time.time()
+    # Step 5: Color restoration (fused with stage 4 into a single pass)
+    progress.start(5, 'Color Restoration')
     color = 1.2 + (intensity * 0.3)
-    result = ImageEnhance.Color(result).enhance(color)
-    print(f"[Stage 5/8] Complete in {time.time()-stage_start:.2f}s | Color: {color:.2f}x")
+    result = tone_ops.color(color).apply(result)
+    progress.complete(f"Color: {color:.2f}x", result)
     
     # Step 6: Detail enhancement with unsharp mask
-    print("[Stage 6/8] Detail Enhancement...")
-    stage_start = time.time()
+    progress.start(6, 'Detail Enhancement')
     if intensity > 0.5:
         radius = 1.5 + (intensity * 1.0)
         percent = int(120 + intensity * 80)
         result = result.filter(ImageFilter.UnsharpMask(radius=radius, percent=percent, threshold=2))
-        print(f"[Stage 6/8] Complete in {time.time()-stage_start:.2f}s | Unsharp: radius={radius:.1f}, percent={percent}")
+        progress.complete(f"Unsharp: radius={radius:.1f}, percent={percent}", result)
     else:
-        print(f"[Stage 6/8] Skipped (low intensity)")
+        progress.skip('low intensity')
     
     # Step 7: Adaptive brightness correction
-    print("[Stage 7/8] Adaptive Brightness Correction...")
-    stage_start = time.time()
+    progress.start(7, 'Adaptive Brightness Correction')
     if is_dark:
         brightness_factor = 1.15 + (intensity * 0.15)
-        result = ImageEnhance.Brightness(result).enhance(brightness_factor)
-        print(f"[Stage 7/8] Complete in {time.time()-stage_start:.2f}s | Brightened: {brightness_factor:.2f}x")
+        result = PointChain().brightness(brightness_factor).apply(result)
+        progress.complete(f"Brightened: {brightness_factor:.2f}x", result)
     elif is_bright:
         brightness_factor = 0.90 + (intensity * 0.05)
-        result = ImageEnhance.Brightness(result).enhance(brightness_factor)
-        print(f"[Stage 7/8] Complete in {time.time()-stage_start:.2f}s | Dimmed: {brightness_factor:.2f}x")
+        result = PointChain().brightness(brightness_factor).apply(result)
+        progress.complete(f"Dimmed: {brightness_factor:.2f}x", result)
     else:
-        print(f"[Stage 7/8] Skipped (optimal brightness)")
+        progress.skip('optimal brightness')
     
     # Step 8: Final polish
-    print("[Stage 8/8] Final Polish...")
-    stage_start = time.time()
+    progress.start(8, 'Final Polish')
     if intensity > 0.8:
         result = result.filter(ImageFilter.EDGE_ENHANCE)
-        print(f"[Stage 8/8] Complete in {time.time()-stage_start:.2f}s | Edge enhancement applied")
+        progress.complete('Edge enhancement applied', result)
+    else:
+        progress.skip('low intensity')
+    
+    return result
+
+def restore_stages(image, intensity, analysis, progress=QUIET):
+    """
+    Stages 2-8 on an image or tile (no global measurements in here)
+    """
+    result = denoise_stage(image, analysis, progress)
+    return restore_intensity_stages(result, intensity, analysis, progress)
+
+def restore_artifact_image(image, intensity=0.75, mode='auto', progress=None):
+    """
+    PROFESSIONAL Restoration with intelligent adaptive processing
+    
+    progress: optional ProgressReporter publishing stage events
+    """
+    progress = progress or ProgressReporter(total_stages=TOTAL_STAGES, pipeline='restoration')
+    start = time.time()
+    log("[RESTORATION] Professional Pipeline Starting...", DEBUG)
+    
+    # Step 1: Pre-processing and analysis
+    progress.start(1, 'Image Analysis')
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    
+    # Analyze image characteristics (whole image, full resolution)
+    analysis = analyze_restoration_input(image)
+    
+    progress.complete()
+    log(f"  Analysis: Brightness={analysis['brightness']:.1f}, Variance={analysis['variance']:.1f}", DEBUG)
+    log(f"  Flags: Dark={analysis['is_dark']}, Bright={analysis['is_bright']}, Noisy={analysis['is_noisy']}, LowContrast={analysis['is_low_contrast']}", DEBUG)
+    
+    # Stages 2-8: inline for normal images, tiled across cores for large scans
+    if needs_tiling(image):
+        # Tiles can't measure the sharpened image's mean, so they all pivot
+        # on the input's (the inline path measures it, as before tiling)
+        tile_analysis = dict(analysis, contrast_pivot=int(analysis['brightness'] + 0.5))
+        progress.start(2, f"Tiled processing at full resolution ({image.width}x{image.height})", through=TOTAL_STAGES)
+        result = process_tiled(image, restore_stages, (intensity, tile_analysis), on_tile=progress.tiles)
+        progress.complete(image=result)
     else:
-        print(f"[Stage 8/8] Skipped")
+        result = restore_stages(image, intensity, analysis, progress)
     
+    flags = [analysis['is_dark'], analysis['is_bright'], analysis['is_noisy'], analysis['is_low_contrast']]
     total = time.time() - start
-    print("="*60)
-    print(f"[RESTORATION] COMPLETE in {total:.2f}s")
-    print(f"Adaptive Processing: {sum([is_dark, is_bright, is_noisy, is_low_contrast])} conditions addressed")
-    print("="*60 + "\n")
+    log(f"[RESTORATION] COMPLETE in {total:.2f}s | Adaptive Processing: {sum(flags)} conditions addressed")
+    progress.finish(f'{total:.2f}s')
     
     return result, {
         'processing_time': f'{total:.2f}s',
         'algorithm': 'Professional 8-Stage Adaptive Restoration',
         'quality': 'High',
         'adaptive_flags': {
-            'dark': is_dark,
-            'bright': is_bright,
-            'noisy': is_noisy,
-            'low_contrast': is_low_contrast
+            'dark': analysis['is_dark'],
+            'bright': analysis['is_bright'],
+            'noisy': analysis['is_noisy'],
+            'low_contrast': analysis['is_low_contrast']
         },
         'status': 'SUCCESS'
     }
@@ -3,83 +3,124 @@ PROFESSIONAL Super-Resolution
 High-quality multi-stage pipeline
 """
 
-from PIL import Image, ImageEnhance, ImageFilter
+from PIL import Image, ImageEnhance, ImageFilter, ImageStat
+from .fused_point_ops import PointChain
+from .tile_engine import needs_tiling, process_tiled
+from .progress import ProgressReporter, QUIET
+from .tracing import log, DEBUG
 import time
 
-def enhance_super_resolution(image, intensity=0.75, mode='auto'):
+SCALE_FACTOR = 2
+TOTAL_STAGES = 6
+
+def input_luma_mean(image):
     """
-    PROFESSIONAL Super-Resolution with advanced techniques
+    Whole-image luma mean (LANCZOS + sharpening roughly preserve it) - the
+    contrast pivot shared by every tile
+    """
+    return int(ImageStat.Stat(image.convert('L')).mean[0] + 0.5)
+
+def upscale_stage(image, progress=QUIET):
+    """
+    Stage 2 - the only stage that does not depend on intensity
     """
-    start = time.time()
-    print("\n" + "="*60)
-    print("[SUPER-RESOLUTION] Professional Pipeline Starting...")
-    print("="*60)
-    
-    # Step 1: Pre-processing - Optimize input
-    print("[Stage 1/6] Pre-processing...")
-    stage_start = time.time()
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
-    
-    # Resize if too large (for speed, but keep reasonable quality)
-    max_size = 2000
-    if image.width > max_size or image.height > max_size:
-        ratio = min(max_size / image.width, max_size / image.height)
-        new_size = (int(image.width * ratio), int(image.height * ratio))
-        image = image.resize(new_size, Image.Resampling.LANCZOS)
-    print(f"[Stage 1/6] Complete in {time.time()-stage_start:.2f}s | Input: {image.width}x{image.height}")
-    
     # Step 2: Initial upscale with LANCZOS (high quality)
-    print("[Stage 2/6] LANCZOS 2x Upscaling...")
-    stage_start = time.time()
-    new_size = (image.width * 2, image.height * 2)
+    progress.start(2, 'LANCZOS 2x Upscaling')
+    new_size = (image.width * SCALE_FACTOR, image.height * SCALE_FACTOR)
     result = image.resize(new_size, Image.Resampling.LANCZOS)
-    print(f"[Stage 2/6] Complete in {time.time()-stage_start:.2f}s | Output: {result.width}x{result.height}")
+    progress.complete(f"Output: {result.width}x{result.height}", result)
+    return result
+
+def enhance_intensity_stages(image, intensity, mean=None, progress=QUIET):
+    """
+    Stages 3-6 on the upscaled image - everything that depends on intensity
+    
+    mean: contrast pivot for tiles (None = this image's own mean, as
+    ImageEnhance.Contrast measures it)
+    """
+    result = image
     
     # Step 3: Edge-preserving sharpening
-    print("[Stage 3/6] Edge-Preserving Sharpening...")
-    stage_start = time.time()
+    progress.start(3, 'Edge-Preserving Sharpening')
     sharpness = 1.6 + (intensity * 0.9)
     result = ImageEnhance.Sharpness(result).enhance(sharpness)
-    print(f"[Stage 3/6] Complete in {time.time()-stage_start:.2f}s | Sharpness: {sharpness:.2f}x")
+    progress.complete(f"Sharpness: {sharpness:.2f}x", result)
     
     # Step 4: Adaptive contrast enhancement
-    print("[Stage 4/6] Adaptive Contrast Enhancement...")
-    stage_start = time.time()
+    progress.start(4, 'Adaptive Contrast Enhancement')
     contrast = 1.15 + (intensity * 0.3)
-    result = ImageEnhance.Contrast(result).enhance(contrast)
-    print(f"[Stage 4/6] Complete in {time.time()-stage_start:.2f}s | Contrast: {contrast:.2f}x")
+    result = PointChain().contrast(contrast, mean=mean).apply(result)
+    progress.complete(f"Contrast: {contrast:.2f}x", result)
     
     # Step 5: Unsharp masking for detail recovery
-    print("[Stage 5/6] Unsharp Masking (Detail Recovery)...")
-    stage_start = time.time()
+    progress.start(5, 'Unsharp Masking (Detail Recovery)')
     radius = 2.0 + (intensity * 0.5)
     percent = int(150 + intensity * 100)
     result = result.filter(ImageFilter.UnsharpMask(radius=radius, percent=percent, threshold=3))
-    print(f"[Stage 5/6] Complete in {time.time()-stage_start:.2f}s | Radius: {radius:.1f}, Percent: {percent}")
+    progress.complete(f"Radius: {radius:.1f}, Percent: {percent}", result)
     
     # Step 6: Final color and brightness optimization
-    print("[Stage 6/6] Final Optimization...")
-    stage_start = time.time()
+    progress.start(6, 'Final Optimization')
+    final_ops = PointChain()
     if intensity > 0.6:
         # Boost color saturation
         color = 1.1 + (intensity - 0.6) * 0.3
-        result = ImageEnhance.Color(result).enhance(color)
-        print(f"[Stage 6/6] Color enhanced: {color:.2f}x")
+        final_ops.color(color)
+        progress.note(f"Color enhanced: {color:.2f}x")
     
     if intensity > 0.7:
         # Fine brightness adjustment
         brightness = 1.0 + (intensity - 0.7) * 0.15
-        result = ImageEnhance.Brightness(result).enhance(brightness)
-        print(f"[Stage 6/6] Brightness: {brightness:.2f}x")
+        final_ops.brightness(brightness)
+        progress.note(f"Brightness: {brightness:.2f}x")
+    
+    # Color + brightness fused into one pass over the 2x output
+    result = final_ops.apply(result)
+    progress.complete(image=result)
+    
+    return result
+
+def enhance_stages(image, intensity, mean=None, progress=QUIET):
+    """
+    Stages 2-6 on an image or tile (no global measurements in here)
+    
+    mean: contrast pivot for tiles (None = measured inline)
+    """
+    return enhance_intensity_stages(upscale_stage(image, progress), intensity, mean, progress)
+
+def enhance_super_resolution(image, intensity=0.75, mode='auto', progress=None):
+    """
+    PROFESSIONAL Super-Resolution with advanced techniques
+    
+    progress: optional ProgressReporter publishing stage events
+    """
+    progress = progress or ProgressReporter(total_stages=TOTAL_STAGES, pipeline='super-resolution')
+    start = time.time()
+    log("[SUPER-RESOLUTION] Professional Pipeline Starting...", DEBUG)
+    
+    # Step 1: Pre-processing - Optimize input
+    progress.start(1, 'Pre-processing')
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    
+    progress.complete(f"Input: {image.width}x{image.height}")
     
-    print(f"[Stage 6/6] Complete in {time.time()-stage_start:.2f}s")
+    # Stages 2-6: inline for normal images, tiled across cores for large scans
+    if needs_tiling(image):
+        # Tiles can't measure the sharpened output's mean, so they all pivot
+        # on the input's (the inline path measures it, as before tiling)
+        mean = input_luma_mean(image)
+        progress.start(2, f"Tiled processing at full resolution ({image.width}x{image.height})", through=TOTAL_STAGES)
+        result = process_tiled(image, enhance_stages, (intensity, mean), scale=SCALE_FACTOR,
+                               on_tile=progress.tiles)
+        progress.complete(image=result)
+    else:
+        result = enhance_stages(image, intensity, progress=progress)
     
     total = time.time() - start
-    print("="*60)
-    print(f"[SUPER-RESOLUTION] COMPLETE in {total:.2f}s")
-    print(f"Resolution: {image.width}x{image.height} -> {result.width}x{result.height} (2x)")
-    print("="*60 + "\n")
+    log(f"[SUPER-RESOLUTION] COMPLETE in {total:.2f}s | "
+        f"Resolution: {image.width}x{image.height} -> {result.width}x{result.height} (2x)")
+    progress.finish(f'{total:.2f}s')
     
     return result, {
         'processing_time': f'{total:.2f}s',
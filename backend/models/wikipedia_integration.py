@@ -1,11 +1,26 @@
 """
 Wikipedia Integration for Heri-Science
 Fetches accurate historical information from Wikipedia
+
+Requests go through models/outbound.py, which can record and replay them.
+
+Configuration (environment):
+    WIKIPEDIA_API_URL   MediaWiki api.php endpoint (default en.wikipedia.org;
+                        the load-test stub in benchmarks/stubs.py serves
+                        /w/api.php)
 """
 
-import requests
+import os
 import re
 from typing import Dict, Optional, List
+from .metrics import track_external
+from .outbound import outbound
+from .shared_cache import shared_memoize
+from .tracing import log, traced, WARNING
+
+# Wikipedia responses are shared by all workers for a week
+WIKIPEDIA_CACHE_TTL = 7 * 24 * 3600
+WIKIPEDIA_API_URL = os.getenv('WIKIPEDIA_API_URL', 'https://en.wikipedia.org/w/api.php')
 
 class WikipediaIntegration:
     """
@@ -13,9 +28,11 @@ class WikipediaIntegration:
     """
     
     def __init__(self):
-        self.base_url = "https://en.wikipedia.org/w/api.php"
+        self.base_url = WIKIPEDIA_API_URL
         self.user_agent = "Heri-Science/1.0 (Educational Archaeological Platform)"
     
+    @traced('WikipediaIntegration.search_wikipedia', 'model')
+    @shared_memoize('wikipedia', ttl=WIKIPEDIA_CACHE_TTL, cache_if=bool, method=True)
     def search_wikipedia(self, query: str, limit: int = 5) -> List[Dict]:
         """
         Search Wikipedia for relevant articles
@@ -33,9 +50,10 @@ class WikipediaIntegration:
         }
         
         try:
-            response = requests.get(self.base_url, params=params, headers=headers, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            with track_external('wikipedia', 'search'):
+                response = outbound.get('wikipedia', 'search', self.base_url, params=params, headers=headers, timeout=10)
+                response.raise_for_status()
+                data = response.json()
             
             # Parse OpenSearch format: [query, [titles], [descriptions], [urls]]
             titles = data[1] if len(data) > 1 else []
@@ -52,9 +70,11 @@ class WikipediaIntegration:
             
             return results
         except Exception as e:
-            print(f"Wikipedia search error: {e}")
+            log(f"Wikipedia search error: {e}", WARNING)
             return []
     
+    @traced('WikipediaIntegration.get_article_summary', 'model')
+    @shared_memoize('wikipedia', ttl=WIKIPEDIA_CACHE_TTL, cache_if=bool, method=True)
     def get_article_summary(self, title: str) -> Optional[Dict]:
         """
         Get detailed summary of a Wikipedia article
@@ -75,9 +95,10 @@ class WikipediaIntegration:
         }
         
         try:
-            response = requests.get(self.base_url, params=params, headers=headers, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            with track_external('wikipedia', 'summary'):
+                response = outbound.get('wikipedia', 'summary', self.base_url, params=params, headers=headers, timeout=10)
+                response.raise_for_status()
+                data = response.json()
             
             pages = data.get('query', {}).get('pages', {})
             if not pages:
@@ -97,7 +118,7 @@ class WikipediaIntegration:
                 'thumbnail': page.get('thumbnail', {}).get('source', '')
             }
         except Exception as e:
-            print(f"Wikipedia article fetch error: {e}")
+            log(f"Wikipedia article fetch error: {e}", WARNING)
             return None
     
     def get_artifact_info(self, artifact_name: str, civilization: str = None) -> Dict:
@@ -0,0 +1,18 @@
+"""
+Test setup - run from backend/ with `python -m pytest -q`
+
+The models read their settings at import time, and the app writes its
+uploads, stores and shared cache relative to the working directory, so
+the session runs in a scratch directory with its own shared cache.
+"""
+
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+WORKDIR = tempfile.mkdtemp(prefix='heri-tests-')
+os.chdir(WORKDIR)
+os.environ['SHARED_CACHE_PATH'] = os.path.join(WORKDIR, 'cache', 'shared.db')
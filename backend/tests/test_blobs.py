@@ -0,0 +1,59 @@
+import io
+
+import pytest
+from PIL import Image
+
+from app import app, AI_MODELS_LOADED
+from models.blob_store import upload_store
+
+
+@pytest.fixture(scope='module')
+def client():
+    return app.test_client()
+
+
+def encoded(image_format: str) -> bytes:
+    buffered = io.BytesIO()
+    Image.new('RGB', (64, 48), (90, 120, 150)).save(buffered, format=image_format)
+    return buffered.getvalue()
+
+
+def test_upload_is_stored_as_its_content_type(client):
+    response = client.post('/api/blobs', data=encoded('PNG'), content_type='image/jpeg')
+
+    assert response.status_code == 201
+    assert response.get_json()['id'].endswith('.png')
+
+
+def test_corrupt_upload_is_rejected(client):
+    response = client.post('/api/blobs', data=encoded('JPEG')[:40], content_type='image/jpeg')
+
+    assert response.status_code == 400
+
+
+def test_unsupported_content_is_rejected(client):
+    response = client.post('/api/blobs', data=encoded('ICO'), content_type='image/png')
+
+    assert response.status_code == 415
+
+
+@pytest.fixture(scope='module')
+def corrupt_blob_id():
+    """Stored before upload verification existed, or damaged on disk"""
+    return upload_store.put(encoded('JPEG')[:200], '.jpg')
+
+
+def test_thumbnail_of_corrupt_blob_is_unprocessable(client, corrupt_blob_id):
+    response = client.get(f'/blobs/{corrupt_blob_id}/thumbnail')
+
+    assert response.status_code == 422
+    assert 'error' in response.get_json()
+    assert 'ETag' not in response.headers
+
+
+@pytest.mark.skipif(not AI_MODELS_LOADED, reason='analysis models not loaded')
+def test_analysis_of_corrupt_blob_is_unprocessable(client, corrupt_blob_id):
+    response = client.get(f'/blobs/{corrupt_blob_id}/analysis/heat_map')
+
+    assert response.status_code == 422
+    assert 'error' in response.get_json()
@@ -0,0 +1,66 @@
+import io
+
+import pytest
+from PIL import Image
+
+from app import app
+from models.job_queue import job_queue
+
+
+@pytest.fixture(scope='module')
+def client():
+    return app.test_client()
+
+
+@pytest.fixture(scope='module')
+def blob_id(client):
+    buffered = io.BytesIO()
+    Image.new('RGB', (320, 240), (140, 110, 80)).save(buffered, format='JPEG')
+    response = client.post('/api/blobs', data=buffered.getvalue(), content_type='image/jpeg')
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def revalidate(client, url: str):
+    """(first response, response to a conditional repeat)"""
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    return first, client.get(url, headers={'If-None-Match': etag})
+
+
+def test_blob_revalidates_with_304(client, blob_id):
+    first, repeat = revalidate(client, f'/blobs/{blob_id}')
+
+    assert first.data
+    assert repeat.status_code == 304
+    assert repeat.data == b''
+
+
+def test_thumbnail_revalidates_with_304(client, blob_id):
+    first, repeat = revalidate(client, f'/blobs/{blob_id}/thumbnail?edge=64')
+
+    assert first.mimetype == 'image/jpeg'
+    assert repeat.status_code == 304
+    assert repeat.headers['ETag'] == first.headers['ETag']
+
+
+def test_thumbnail_etag_depends_on_edge(client, blob_id):
+    small = client.get(f'/blobs/{blob_id}/thumbnail?edge=64')
+    large = client.get(f'/blobs/{blob_id}/thumbnail?edge=128')
+
+    assert small.headers['ETag'] != large.headers['ETag']
+
+
+def test_finished_job_revalidates_with_304(client):
+    job = job_queue.create(status='done', result_key='test-result')
+    _, repeat = revalidate(client, f"/api/jobs/{job['id']}")
+
+    assert repeat.status_code == 304
+
+
+def test_stale_etag_gets_the_full_response(client, blob_id):
+    response = client.get(f'/blobs/{blob_id}', headers={'If-None-Match': '"not-this-one"'})
+
+    assert response.status_code == 200
+    assert response.data
@@ -0,0 +1,33 @@
+import io
+
+import pytest
+from PIL import Image
+
+from app import decode_rgb
+from models.image_decode import decode_scaled, EXIF_ORIENTATION
+
+
+@pytest.fixture(scope='module')
+def sideways_jpeg():
+    """A 600x400 sensor image of a portrait shot: rotate 90 degrees to display"""
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = 6
+    buffered = io.BytesIO()
+    Image.new('RGB', (600, 400), (200, 80, 40)).save(buffered, format='JPEG', exif=exif)
+    return buffered.getvalue()
+
+
+@pytest.mark.parametrize('max_edge', [None, 150])
+def test_decode_scaled_applies_the_orientation(sideways_jpeg, max_edge):
+    image = decode_scaled(sideways_jpeg, max_edge)
+
+    assert image.width < image.height
+    assert max(image.size) == (max_edge or 600)
+    assert image.info['source_size'] == (400, 600)
+
+
+def test_decode_rgb_applies_the_orientation(sideways_jpeg):
+    image = decode_rgb(sideways_jpeg)
+
+    assert image.size == (400, 600)
+    assert image.mode == 'RGB'
@@ -0,0 +1,104 @@
+import time
+
+import pytest
+
+from models.job_queue import JobQueue, JobQueueFull, FINAL_STATES
+
+
+def hold(seconds: float, value: str) -> str:
+    """Pool job - sleeps, then returns a value (None would mean 'cancelled')"""
+    time.sleep(seconds)
+    return value
+
+
+def tiles_inline() -> str:
+    """Pool job - whether this process was set up to run tiles inline"""
+    from models import tile_engine
+    return str(tile_engine._inline)
+
+
+def wait_final(queue: JobQueue, job_id: str, timeout: float = 30.0) -> dict:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in FINAL_STATES:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'job {job_id} did not finish')
+
+
+def wait_running(queue: JobQueue, job_id: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while queue.get(job_id)['status'] != 'running':
+        assert time.time() < deadline, f'job {job_id} never started'
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def queue():
+    queue = JobQueue(workers=1, queue_limit=4)
+    yield queue
+    queue.drain()
+
+
+def test_job_runs_and_reports_its_result(queue):
+    results = []
+    job = queue.submit(hold, (0.0, 'restored'), on_done=results.append)
+
+    assert wait_final(queue, job['id'])['status'] == 'done'
+    assert results == ['restored']
+
+
+def test_job_processes_run_their_tiles_inline(queue):
+    results = []
+    job = queue.submit(tiles_inline, (), on_done=results.append)
+
+    assert wait_final(queue, job['id'])['status'] == 'done'
+    assert results == ['True']
+
+
+def test_queued_job_is_cancelled_immediately(queue):
+    running = queue.submit(hold, (1.0, 'first'))
+    queued = queue.submit(hold, (0.0, 'second'))
+
+    assert queue.cancel(queued['id'])['status'] == 'cancelled'
+    assert wait_final(queue, running['id'])['status'] == 'done'
+    assert queue.get(queued['id'])['status'] == 'cancelled'
+
+
+def test_running_job_is_flagged_and_its_result_discarded(queue):
+    results = []
+    job = queue.submit(hold, (1.0, 'late'), on_done=results.append)
+    wait_running(queue, job['id'])
+
+    assert queue.cancel(job['id'])['cancel_requested'] is True
+    final = wait_final(queue, job['id'])
+    assert final['status'] == 'cancelled'
+    assert results == []
+
+
+def test_drain_finishes_running_jobs_and_cancels_queued_ones(queue):
+    running = queue.submit(hold, (1.0, 'first'))
+    queued = [queue.submit(hold, (0.0, f'queued-{index}')) for index in range(3)]
+    wait_running(queue, running['id'])
+
+    started = time.time()
+    queue.drain()
+
+    assert time.time() - started < 10
+    assert queue.get(running['id'])['status'] == 'done'
+    for job in queued:
+        record = queue.get(job['id'])
+        assert record['status'] == 'cancelled'
+        assert 'resubmit' in record['error']
+    with pytest.raises(JobQueueFull):
+        queue.submit(hold, (0.0, 'too late'))
+
+
+def test_full_queue_rejects_submissions(queue):
+    jobs = [queue.submit(hold, (0.5, f'job-{index}')) for index in range(5)]
+
+    with pytest.raises(JobQueueFull):
+        queue.submit(hold, (0.0, 'one too many'))
+    for job in jobs:
+        queue.cancel(job['id'])
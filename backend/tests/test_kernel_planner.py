@@ -0,0 +1,57 @@
+"""
+Composite kernels must stay within rounding of the sequential chain, also
+where the sequential chain clips (see models/kernel_planner.py)
+"""
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from models.kernel_planner import _apply_sequential, apply_linear_chain, blend_op, plan_linear_chain, sharpness_op
+
+CHAINS = {
+    'super-resolution-ultra': (blend_op('EDGE_ENHANCE'), blend_op('DETAIL', 0.4),
+                               blend_op('SHARPEN', 0.3), sharpness_op(1.1)),
+    'restoration-ultra': (blend_op('DETAIL', 0.5), blend_op('SHARPEN', 0.4), blend_op('EDGE_ENHANCE'),
+                          sharpness_op(1.1), blend_op('SMOOTH')),
+    'advanced-finish': (blend_op('SHARPEN', 0.36), sharpness_op(1.28), blend_op('SMOOTH')),
+    'smooth-then-sharpen': (blend_op('SMOOTH', 0.5), sharpness_op(1.3), blend_op('SHARPEN')),
+}
+
+
+@pytest.fixture(scope='module')
+def page():
+    """Dark strokes on bright paper - every sharpening step clips on it"""
+    rng = np.random.default_rng(11)
+    pixels = np.full((120, 160, 3), 240, dtype=np.uint8)
+    for _ in range(80):
+        y, x = rng.integers(0, 118), rng.integers(0, 150)
+        pixels[y:y + 2, x:x + 10] = 8
+    return Image.fromarray(pixels, 'RGB')
+
+
+@pytest.mark.parametrize('name', sorted(CHAINS))
+def test_chain_matches_sequential_within_rounding(page, name):
+    ops = tuple(op for op in CHAINS[name] if op[1] != 0.0)
+
+    planned = np.asarray(apply_linear_chain(page, ops)).astype(int)
+    sequential = np.asarray(_apply_sequential(page, ops)).astype(int)
+
+    # Rounding only - a later sharpening gain can stretch one level to two;
+    # clipping differences would be tens of levels
+    assert np.abs(planned - sequential).max() <= 2
+
+
+def test_blended_sharpening_is_not_fused():
+    passes = plan_linear_chain((blend_op('SMOOTH', 0.5), blend_op('SHARPEN', 0.4), blend_op('SMOOTH')))
+
+    assert [kernel is None for kernel, _ in passes] == [False, True, False]
+
+
+def test_group_closes_after_an_overshooting_kernel():
+    passes = plan_linear_chain((blend_op('SMOOTH', 0.5), blend_op('SHARPEN'), blend_op('SMOOTH')))
+
+    assert [group for _, group in passes] == [
+        (blend_op('SMOOTH', 0.5), blend_op('SHARPEN')),
+        (blend_op('SMOOTH'),),
+    ]
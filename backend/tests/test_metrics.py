@@ -0,0 +1,32 @@
+import pytest
+import requests
+
+from models.metrics import REGISTRY, track_external
+from models.outbound import ReplayedResponse
+
+
+def error_lines(operation: str) -> list:
+    return [
+        line for line in REGISTRY.render().splitlines()
+        if line.startswith('heri_external_errors_total{') and f'operation="{operation}"' in line
+    ]
+
+
+def test_non_2xx_response_counts_as_an_error_with_its_status():
+    with pytest.raises(requests.HTTPError):
+        with track_external('wikipedia', 'status-test'):
+            ReplayedResponse(503, '').raise_for_status()
+
+    assert error_lines('status-test') == [
+        'heri_external_errors_total{service="wikipedia",operation="status-test",reason="503"} 1'
+    ]
+
+
+def test_other_failures_are_labelled_with_the_exception_type():
+    with pytest.raises(TimeoutError):
+        with track_external('gemini', 'timeout-test'):
+            raise TimeoutError('read timed out')
+
+    assert error_lines('timeout-test') == [
+        'heri_external_errors_total{service="gemini",operation="timeout-test",reason="TimeoutError"} 1'
+    ]
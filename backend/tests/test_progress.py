@@ -0,0 +1,54 @@
+import json
+import uuid
+
+import pytest
+
+from models import progress
+from models.progress import ProgressReporter, stream_events
+
+
+@pytest.fixture(autouse=True)
+def fast_streams(monkeypatch):
+    monkeypatch.setattr(progress, 'PROGRESS_POLL', 0.01)
+    monkeypatch.setattr(progress, 'PROGRESS_OPEN_WAIT', 0.2)
+    monkeypatch.setattr(progress, 'PROGRESS_STALE', 0.2)
+
+
+def stream(channel_id: str, **kwargs) -> list:
+    """(event name, data) pairs of a whole stream"""
+    events = []
+    for chunk in stream_events(channel_id, timeout=10, **kwargs):
+        lines = dict(line.split(': ', 1) for line in chunk.splitlines() if line.startswith(('event', 'data')))
+        if 'event' in lines:
+            events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def test_stream_ends_on_the_terminal_event():
+    reporter = ProgressReporter(uuid.uuid4().hex, total_stages=1)
+    reporter.start(1, 'Denoise')
+    reporter.complete()
+    reporter.finish()
+
+    statuses = [data['status'] for _, data in stream(reporter.channel_id)]
+    assert statuses == ['started', 'complete', 'finished']
+
+
+def test_channel_that_goes_quiet_ends_as_unknown():
+    reporter = ProgressReporter(uuid.uuid4().hex, total_stages=2)
+    reporter.start(1, 'Denoise')  # ...and the process dies
+
+    events = stream(reporter.channel_id)
+    assert events[-1] == ('end', {'id': 2, 'status': 'unknown'})
+
+
+def test_queued_channel_waits_past_the_stale_limit():
+    channel_id = uuid.uuid4().hex
+    polls = []
+
+    def final_status():
+        polls.append(1)
+        return 'cancelled' if len(polls) > 40 else None
+
+    events = stream(channel_id, final_status=final_status, exists=lambda: True)
+    assert events == [('end', {'id': 1, 'status': 'cancelled'})]
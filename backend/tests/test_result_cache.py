@@ -0,0 +1,121 @@
+import threading
+import time
+
+import pytest
+
+from models.result_cache import ResultCache, make_result_key, pack_result, unpack_result
+from models.shared_cache import SharedCache
+
+KB = 1024
+
+
+@pytest.fixture
+def shared(tmp_path):
+    return SharedCache(str(tmp_path / 'shared.db'))
+
+
+@pytest.fixture
+def cache(shared):
+    return ResultCache(max_bytes=100 * KB, shared=shared)
+
+
+def test_key_quantizes_intensity_and_sorts_extras():
+    key = make_result_key('abc', 'restoration', 'auto', 0.7500001, format='webp', preset='fast')
+
+    assert key == make_result_key('abc', 'restoration', 'auto', 0.75, preset='fast', format='webp')
+    assert key != make_result_key('abc', 'restoration', 'auto', 0.76, format='webp', preset='fast')
+
+
+def test_pack_round_trip():
+    metadata, image_bytes = unpack_result(pack_result({'format': 'jpeg'}, b'\xff\xd8jpeg'))
+
+    assert metadata == {'format': 'jpeg'}
+    assert image_bytes == b'\xff\xd8jpeg'
+
+
+def test_memory_tier_evicts_least_recently_used_by_bytes(cache):
+    for index in range(4):
+        cache.put(f'result-{index}', b'x' * (30 * KB))
+    cache.get('result-1')
+    cache.put('result-4', b'x' * (30 * KB))
+
+    stats = cache.stats()
+    assert stats['memory_bytes'] <= 100 * KB
+    assert stats['evictions'] == 2
+    assert cache._memory.get('result-0') is None
+    assert cache._memory.get('result-1') is not None
+
+
+def test_hits_misses_and_ratio_are_counted(cache):
+    assert cache.get_or_compute('key', lambda: b'value') == (b'value', 'miss')
+    assert cache.get_or_compute('key', lambda: b'other') == (b'value', 'hit')
+
+    stats = cache.stats()
+    assert (stats['misses'], stats['memory_hits'], stats['shared_hits']) == (1, 1, 0)
+    assert stats['hit_ratio'] == 0.5
+
+
+def test_other_workers_hit_the_shared_tier(shared):
+    computed_by = ResultCache(max_bytes=100 * KB, shared=shared)
+    computed_by.get_or_compute('key', lambda: b'value')
+
+    other_worker = ResultCache(max_bytes=100 * KB, shared=shared)
+    assert other_worker.get_or_compute('key', lambda: b'recomputed') == (b'value', 'hit')
+    assert other_worker.stats()['shared_hits'] == 1
+
+    # Promoted into that worker's memory tier
+    other_worker.get('key')
+    assert other_worker.stats()['memory_hits'] == 1
+
+
+def test_concurrent_identical_requests_compute_once(cache):
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return b'result'
+
+    statuses = []
+    threads = [
+        threading.Thread(target=lambda: statuses.append(cache.get_or_compute('key', compute)[1]))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    while cache.stats()['coalesced'] < 3:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(statuses) == ['coalesced', 'coalesced', 'coalesced', 'miss']
+
+
+def test_waiters_see_the_owners_error_and_nothing_is_cached(cache):
+    release = threading.Event()
+    errors = []
+
+    def compute():
+        release.wait(5)
+        raise ValueError('pipeline failed')
+
+    def request():
+        try:
+            cache.get_or_compute('key', compute)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=request) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    while cache.stats()['coalesced'] < 1:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert errors == ['pipeline failed', 'pipeline failed']
+    assert cache.get('key') is None
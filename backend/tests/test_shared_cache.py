@@ -0,0 +1,96 @@
+import os
+import time
+
+import pytest
+
+from models.shared_cache import SharedCache, SHARED_CACHE_INLINE_BYTES
+
+KB = 1024
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SharedCache(
+        str(tmp_path / 'shared.db'),
+        budgets={'general': 100 * KB, 'images': 1000 * KB, 'results': 100 * KB, 'state': None}
+    )
+
+
+def pool_bytes(cache: SharedCache, pool: str) -> int:
+    return cache.stats()['pools'].get(pool, 0)
+
+
+def test_pool_over_budget_evicts_its_least_recently_used(cache):
+    for index in range(4):
+        cache.put('llm', f'answer-{index}', b'x' * (30 * KB))
+        time.sleep(0.01)
+
+    assert cache.get('llm', 'answer-0') is None
+    assert all(cache.get('llm', f'answer-{index}') is not None for index in (1, 2, 3))
+    assert pool_bytes(cache, 'general') == 90 * KB
+    assert cache.stats()['evictions'] == 1
+
+
+def test_pools_are_evicted_independently(cache):
+    cache.put('images', 'scan', b'i' * (500 * KB))
+    for index in range(10):
+        cache.put('wikipedia', f'page-{index}', b'w' * (30 * KB))
+
+    assert cache.get('images', 'scan') is not None
+    assert pool_bytes(cache, 'images') == 500 * KB
+    assert pool_bytes(cache, 'general') <= 100 * KB
+
+
+def test_state_pool_is_never_evicted_for_size(cache):
+    for index in range(50):
+        cache.put('jobs', f'job-{index}', b'j' * (10 * KB))
+
+    assert all(cache.get('jobs', f'job-{index}') is not None for index in range(50))
+    assert pool_bytes(cache, 'state') == 500 * KB
+    assert cache.stats()['evictions'] == 0
+
+
+def test_value_larger_than_its_budget_is_not_stored(cache):
+    cache.put('results', 'huge', b'r' * (200 * KB))
+
+    assert cache.get('results', 'huge') is None
+    assert pool_bytes(cache, 'results') == 0
+
+
+def test_running_totals_follow_replace_and_delete(cache):
+    cache.put('llm', 'answer', b'a' * (10 * KB))
+    cache.put('llm', 'answer', b'a' * (4 * KB))
+    assert pool_bytes(cache, 'general') == 4 * KB
+
+    cache.delete('llm', 'answer')
+    assert pool_bytes(cache, 'general') == 0
+
+
+def test_large_values_live_in_files_that_go_with_their_entry(cache):
+    large = os.urandom(SHARED_CACHE_INLINE_BYTES + 1)
+    cache.put('images', 'scan', large)
+    assert cache.get('images', 'scan') == large
+    assert len(os.listdir(cache.files)) == 1
+
+    cache.put('images', 'scan', large[::-1])
+    assert cache.get('images', 'scan') == large[::-1]
+    assert len(os.listdir(cache.files)) == 1
+
+    cache.delete('images', 'scan')
+    assert os.listdir(cache.files) == []
+
+
+def test_expired_entries_are_misses(cache):
+    cache.put('llm', 'answer', b'a', ttl=0.01)
+    time.sleep(0.05)
+
+    assert cache.get('llm', 'answer') is None
+
+
+def test_scan_json_reads_a_key_range_in_order(cache):
+    for seq in (3, 1, 2):
+        cache.put_json('progress', f'channel:e:{seq:06d}', {'id': seq})
+    cache.put_json('progress', 'channel-2:e:000001', {'id': 99})
+
+    events = cache.scan_json('progress', prefix='channel:e:', after='channel:e:000001')
+    assert [event['id'] for event in events.values()] == [2, 3]
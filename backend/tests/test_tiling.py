@@ -0,0 +1,67 @@
+"""
+Tiled processing must match the inline pipeline exactly, given the same
+image-global statistics (see models/tile_engine.py)
+"""
+
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from models import tile_engine
+from models.tile_engine import process_tiled
+from models.ultra_fast_restoration import analyze_restoration_input, restore_stages
+from models.ultra_fast_super_resolution import enhance_stages, input_luma_mean, SCALE_FACTOR
+
+
+@pytest.fixture(scope='module')
+def scan():
+    """A noisy, textured scan - seams would show on it"""
+    rng = np.random.default_rng(7)
+    y, x = np.mgrid[0:300, 0:420]
+    base = np.stack([x * 0.4 + 40, y * 0.5 + 60, (x + y) * 0.2 + 30], axis=-1)
+    noise = rng.normal(0, 12, base.shape)
+    return Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8), 'RGB')
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_tiled_restoration_equals_inline(scan, workers):
+    analysis = analyze_restoration_input(scan)
+    analysis['contrast_pivot'] = int(analysis['brightness'] + 0.5)
+
+    inline = restore_stages(scan, 0.75, analysis)
+    tiled = process_tiled(scan, restore_stages, (0.75, analysis), tile_size=128, workers=workers)
+
+    assert tiled.size == inline.size
+    assert np.array_equal(np.asarray(tiled), np.asarray(inline))
+
+
+def test_tiled_super_resolution_equals_inline(scan):
+    mean = input_luma_mean(scan)
+
+    inline = enhance_stages(scan, 0.75, mean)
+    tiled = process_tiled(scan, enhance_stages, (0.75, mean), scale=SCALE_FACTOR, tile_size=128, workers=1)
+
+    assert tiled.size == (scan.width * SCALE_FACTOR, scan.height * SCALE_FACTOR)
+    assert np.array_equal(np.asarray(tiled), np.asarray(inline))
+
+
+def test_racing_threads_share_one_pool(monkeypatch):
+    monkeypatch.setattr(tile_engine, '_executor', None)
+    pools = []
+    start = threading.Barrier(8)
+
+    def get_pool():
+        start.wait()
+        pools.append(tile_engine._get_executor())
+
+    threads = [threading.Thread(target=get_pool) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(pools) == 8
+    assert len(set(map(id, pools))) == 1
+    pools[0].shutdown()
@@ -0,0 +1,35 @@
+import pytest
+
+from app import app
+from models import request_profiler
+
+ADMIN = {'X-Admin-Token': 'test-admin-token'}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(request_profiler, 'ADMIN_TOKEN', ADMIN['X-Admin-Token'])
+    monkeypatch.setattr(request_profiler, 'PROFILING_ENABLED', False)
+    return app.test_client()
+
+
+def test_client_request_id_gets_a_server_suffix(client):
+    first = client.get('/api/cache/stats', headers={'X-Request-ID': 'client-request-1'})
+    second = client.get('/api/cache/stats', headers={'X-Request-ID': 'client-request-1'})
+
+    assert first.headers['X-Trace-Id'].startswith('client-request-1-')
+    assert first.headers['X-Trace-Id'] != second.headers['X-Trace-Id']
+
+
+def test_admin_can_force_and_read_a_trace(client):
+    trace_id = client.get('/api/cache/stats', headers={**ADMIN, 'X-Trace': '1'}).headers['X-Trace-Id']
+
+    assert client.get(f'/api/traces/{trace_id}', headers=ADMIN).status_code == 200
+    assert client.get(f'/api/traces/{trace_id}').status_code == 403
+
+
+def test_anonymous_clients_cannot_force_sampling(client, monkeypatch):
+    monkeypatch.setattr('models.tracing.TRACE_SAMPLE_RATE', 0.0)
+    trace_id = client.get('/api/cache/stats?trace=1', headers={'X-Trace': '1'}).headers['X-Trace-Id']
+
+    assert client.get(f'/api/traces/{trace_id}', headers=ADMIN).status_code == 404
@@ -1,12 +1,20 @@
 /** @type {import('next').NextConfig} */
+const apiUrl = new URL(process.env.NEXT_PUBLIC_API_URL || 'http://localhost:5000');
+
 const nextConfig = {
   reactStrictMode: true,
   images: {
     domains: ['firebasestorage.googleapis.com'],
+    // Uploads, results and thumbnails served by the backend blob store
+    remotePatterns: [
+      {
+        protocol: apiUrl.protocol.replace(':', ''),
+        hostname: apiUrl.hostname,
+        port: apiUrl.port,
+        pathname: '/blobs/**',
+      },
+    ],
   },
 }
 
 module.exports = nextConfig
-
-
-
@@ -11,14 +11,17 @@ import {
   addMessageToProcessingSession,
   ProcessingSession 
 } from '@/lib/firestore';
-import { uploadImage } from '@/lib/storage';
+import { uploadImage, downloadUrl } from '@/lib/storage';
 import ImageUpload from '@/components/chatbot/ImageUpload';
 import ImageComparison from '@/components/chatbot/ImageComparison';
 import ProgressBar from '@/components/chatbot/ProgressBar';
+import IntensitySlider from '@/components/chatbot/IntensitySlider';
 import ProtectedRoute from '@/components/ProtectedRoute';
 import { Download, Zap, RefreshCw, Send, Sparkles, Save, Loader } from 'lucide-react';
 import toast from 'react-hot-toast';
 import { useGalleryRefresh } from '@/hooks/useGalleryRefresh';
+import { useStageProgress } from '@/hooks/useStageProgress';
+import { useIntensityScrub } from '@/hooks/useIntensityScrub';
 
 
 const ChatbotPageContent = () => {
@@ -33,8 +36,11 @@ const ChatbotPageContent = () => {
   const [currentImageUrl, setCurrentImageUrl] = useState<string | null>(null);
   const [processedImageUrl, setProcessedImageUrl] = useState<string | null>(null);
   const [processing, setProcessing] = useState(false);
-  const [progress, setProgress] = useState(0);
-  const [progressStatus, setProgressStatus] = useState('');
+  const { progress: stageProgress, track: trackProgress, reset: resetProgress } = useStageProgress();
+  const { startScrub, renderScrub, resetScrub, previewUrl: scrubPreviewUrl } = useIntensityScrub();
+  const [intensity, setIntensity] = useState(75);
+  const [processType, setProcessType] = useState<'super-resolution' | 'restoration'>('super-resolution');
+  const [scrubbing, setScrubbing] = useState(false);
   const [messages, setMessages] = useState<Array<{role: 'user' | 'assistant', content: string}>>([
     { role: 'assistant', content: 'What can I help with?' }
   ]);
@@ -177,6 +183,7 @@ const ChatbotPageContent = () => {
     const imageUrl = URL.createObjectURL(file);
     setCurrentImageUrl(imageUrl);
     setProcessedImageUrl(null);
+    resetScrub();
     
     // Add message when image is received
     setMessages(prev => [...prev, { 
@@ -188,41 +195,36 @@ const ChatbotPageContent = () => {
     
     // AUTO-ANALYZE IMAGE AND GET WIKIPEDIA INFO
     try {
-      const reader = new FileReader();
-      reader.onloadend = async () => {
-        const base64data = reader.result;
+      // Raw image body - no base64 round trip, decoded once on the server
+      const response = await fetch('http://localhost:5000/api/auto-analyze', {
+        method: 'POST',
+        headers: { 'Content-Type': file.type || 'application/octet-stream' },
+        body: file
+      });
+      
+      const data = await response.json();
+      
+      if (data.success && data.analysis) {
+        // Add automatic analysis to chat - only if there's meaningful info
+        let autoMessage = '';
         
-        const response = await fetch('http://localhost:5000/api/auto-analyze', {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ image: base64data })
-        });
+        if (data.analysis.detected_type) {
+          autoMessage += `🔍 Detected: ${data.analysis.detected_type}\n\n`;
+        }
         
-        const data = await response.json();
+        if (data.analysis.wikipedia_info) {
+          const wiki = data.analysis.wikipedia_info;
+          autoMessage += `📚 **${wiki.title}**\n\n`;
+          autoMessage += `${wiki.summary}\n\n`;
+          autoMessage += `🔗 [Read more](${wiki.url})`;
+        }
         
-        if (data.success && data.analysis) {
-          // Add automatic analysis to chat - only if there's meaningful info
-          let autoMessage = '';
-          
-          if (data.analysis.detected_type) {
-            autoMessage += `🔍 Detected: ${data.analysis.detected_type}\n\n`;
-          }
-          
-          if (data.analysis.wikipedia_info) {
-            const wiki = data.analysis.wikipedia_info;
-            autoMessage += `📚 **${wiki.title}**\n\n`;
-            autoMessage += `${wiki.summary}\n\n`;
-            autoMessage += `🔗 [Read more](${wiki.url})`;
-          }
-          
-          // Only add message if there's content
-          if (autoMessage.trim()) {
-            setMessages(prev => [...prev, { role: 'assistant', content: autoMessage }]);
-            toast.success('Analysis complete!');
-          }
+        // Only add message if there's content
+        if (autoMessage.trim()) {
+          setMessages(prev => [...prev, { role: 'assistant', content: autoMessage }]);
+          toast.success('Analysis complete!');
         }
-      };
-      reader.readAsDataURL(file);
+      }
     } catch (error) {
       console.error('Auto-analysis error:', error);
       toast.error('Auto-analysis failed. You can still enhance the image!');
@@ -233,10 +235,11 @@ const ChatbotPageContent = () => {
     setSelectedFile(null);
     setCurrentImageUrl(null);
     setProcessedImageUrl(null);
+    resetScrub();
     toast.success('Ready for new image');
   };
 
-  const handleSuperResolution = async () => {
+  const handleSuperResolution = async (value: number = intensity, fromSlider: boolean = false) => {
     if (!selectedFile || !user) {
       toast.error('Please upload an image first');
       return;
@@ -245,27 +248,23 @@ const ChatbotPageContent = () => {
     setProcessing(true);
     const toastId = toast.loading('Enhancing with Super-Resolution...');
 
-    // Progress tracking for 6-stage pipeline
-    setProgress(0);
-    setProgressStatus('Initializing...');
-    
-    setTimeout(() => { setProgress(16); setProgressStatus('Stage 1/6: Pre-processing...'); }, 100);
-    setTimeout(() => { setProgress(33); setProgressStatus('Stage 2/6: LANCZOS 2x Upscaling...'); }, 400);
-    setTimeout(() => { setProgress(50); setProgressStatus('Stage 3/6: Edge-Preserving Sharpening...'); }, 900);
-    setTimeout(() => { setProgress(66); setProgressStatus('Stage 4/6: Adaptive Contrast...'); }, 1400);
-    setTimeout(() => { setProgress(83); setProgressStatus('Stage 5/6: Unsharp Masking (Detail)...'); }, 1900);
-    setTimeout(() => { setProgress(95); setProgressStatus('Stage 6/6: Final Optimization...'); }, 2500);
-
-    const result = await processImage(selectedFile, 'super-resolution', 75);
+    // Real stage progress streamed from the 6-stage pipeline
+    const progressId = trackProgress();
+
+    const result = await processImage(selectedFile, 'super-resolution', value, progressId);
     
-    setProgress(100);
-    setProgressStatus('Complete!');
-    setTimeout(() => { setProgress(0); setProgressStatus(''); }, 1000);
+    setTimeout(resetProgress, 1000);
     setProcessing(false);
+    setScrubbing(false);
 
     if (result) {
       toast.success('Super-Resolution complete!', { id: toastId });
       setProcessedImageUrl(result.processedImageUrl);
+      if (!fromSlider) {
+        // Prepare live slider previews for this result
+        setProcessType('super-resolution');
+        startScrub(selectedFile, 'super-resolution', value);
+      }
       
       // Show save notification
       setTimeout(() => {
@@ -291,7 +290,7 @@ const ChatbotPageContent = () => {
     }
   };
 
-  const handleRestoration = async () => {
+  const handleRestoration = async (value: number = intensity, fromSlider: boolean = false) => {
     if (!selectedFile || !user) {
       toast.error('Please upload an image first');
       return;
@@ -300,29 +299,23 @@ const ChatbotPageContent = () => {
     setProcessing(true);
     const toastId = toast.loading('Restoring image...');
 
-    // Progress tracking for 8-stage pipeline
-    setProgress(0);
-    setProgressStatus('Initializing...');
-    
-    setTimeout(() => { setProgress(12); setProgressStatus('Stage 1/8: Image Analysis...'); }, 100);
-    setTimeout(() => { setProgress(25); setProgressStatus('Stage 2/8: Adaptive Denoising...'); }, 400);
-    setTimeout(() => { setProgress(37); setProgressStatus('Stage 3/8: Edge-Preserving Sharpening...'); }, 800);
-    setTimeout(() => { setProgress(50); setProgressStatus('Stage 4/8: Adaptive Contrast...'); }, 1200);
-    setTimeout(() => { setProgress(62); setProgressStatus('Stage 5/8: Color Restoration...'); }, 1600);
-    setTimeout(() => { setProgress(75); setProgressStatus('Stage 6/8: Detail Enhancement...'); }, 2000);
-    setTimeout(() => { setProgress(87); setProgressStatus('Stage 7/8: Brightness Correction...'); }, 2400);
-    setTimeout(() => { setProgress(95); setProgressStatus('Stage 8/8: Final Polish...'); }, 2800);
-
-    const result = await processImage(selectedFile, 'restoration', 75);
+    // Real stage progress streamed from the 8-stage pipeline
+    const progressId = trackProgress();
+
+    const result = await processImage(selectedFile, 'restoration', value, progressId);
     
-    setProgress(100);
-    setProgressStatus('Complete!');
-    setTimeout(() => { setProgress(0); setProgressStatus(''); }, 1000);
+    setTimeout(resetProgress, 1000);
     setProcessing(false);
+    setScrubbing(false);
 
     if (result) {
       toast.success('Restoration complete!', { id: toastId });
       setProcessedImageUrl(result.processedImageUrl);
+      if (!fromSlider) {
+        // Prepare live slider previews for this result
+        setProcessType('restoration');
+        startScrub(selectedFile, 'restoration', value);
+      }
       
       // Show save notification
       setTimeout(() => {
@@ -348,11 +341,28 @@ const ChatbotPageContent = () => {
     }
   };
 
+  // Slider dragged - cheap preview renders from the scrub session
+  const handleIntensityChange = (value: number) => {
+    setIntensity(value);
+    setScrubbing(true);
+    renderScrub(value);
+  };
+
+  // Slider released - run the full pipeline at the chosen intensity
+  const handleIntensityCommit = (value: number) => {
+    if (processing) return; // One full render at a time - results must not land out of order
+    if (processType === 'super-resolution') {
+      handleSuperResolution(value, true);
+    } else {
+      handleRestoration(value, true);
+    }
+  };
+
   const handleDownload = () => {
     if (!processedImageUrl) return;
     
     const link = document.createElement('a');
-    link.href = processedImageUrl;
+    link.href = downloadUrl(processedImageUrl); // cross-origin blob URLs ignore link.download
     link.download = `heri-science-enhanced-${Date.now()}.jpg`;
     document.body.appendChild(link);
     link.click();
@@ -553,21 +563,29 @@ const ChatbotPageContent = () => {
             </p>
 
             {/* Progress Bar */}
-            {progress > 0 && progress < 100 && (
+            {processing && stageProgress.percent < 100 && (
               <div className="mb-8 glass-effect p-6 rounded-lg border-2 border-primary/40">
                 <div className="flex items-center gap-3 mb-4">
                   <div className="w-4 h-4 bg-primary rounded-full animate-pulse"></div>
                   <h3 className="text-lg font-bold text-primary">Processing with Professional Algorithms</h3>
                 </div>
                 <ProgressBar
-                  progress={progress}
-                  status={progressStatus}
+                  progress={stageProgress.percent}
+                  status={stageProgress.status}
+                  eta={stageProgress.eta}
                   color="primary"
                 />
                 <div className="mt-4 flex items-center justify-between text-sm">
                   <span className="text-gray-400">Python multi-stage pipeline running...</span>
-                  <span className="text-primary font-mono font-bold">{progress}%</span>
+                  <span className="text-primary font-mono font-bold">{stageProgress.percent}%</span>
                 </div>
+                {stageProgress.previewUrl && (
+                  <img
+                    src={stageProgress.previewUrl}
+                    alt="Intermediate stage preview"
+                    className="mt-4 mx-auto max-h-48 rounded border border-primary/30"
+                  />
+                )}
               </div>
             )}
 
@@ -576,7 +594,7 @@ const ChatbotPageContent = () => {
               
               {/* OPTION 1: SUPER RESOLUTION */}
               <button
-                onClick={handleSuperResolution}
+                onClick={() => handleSuperResolution()}
                 disabled={processing}
                 className="relative p-10 bg-gradient-to-br from-primary/30 to-primary/10 hover:from-primary/40 hover:to-primary/20 border-4 border-primary rounded-2xl transition-all duration-300 shadow-2xl hover:shadow-glow-lg hover:scale-105 disabled:opacity-50 disabled:cursor-not-allowed"
               >
@@ -620,7 +638,7 @@ const ChatbotPageContent = () => {
 
               {/* OPTION 2: RESTORATION */}
               <button
-                onClick={handleRestoration}
+                onClick={() => handleRestoration()}
                 disabled={processing}
                 className="relative p-10 bg-gradient-to-br from-secondary/30 to-secondary/10 hover:from-secondary/40 hover:to-secondary/20 border-4 border-secondary rounded-2xl transition-all duration-300 shadow-2xl hover:shadow-glow-lg hover:scale-105 disabled:opacity-50 disabled:cursor-not-allowed"
               >
@@ -678,9 +696,24 @@ const ChatbotPageContent = () => {
               Step 3: Compare & Download
             </h2>
             
+            {/* Intensity - needs the uploaded file (not a reloaded session) */}
+            {selectedFile && (
+              <div className="mb-6">
+                <IntensitySlider
+                  key={processType}
+                  initialIntensity={intensity}
+                  onIntensityChange={handleIntensityChange}
+                  onIntensityCommit={handleIntensityCommit}
+                  description={processing
+                    ? 'Rendering full resolution...'
+                    : 'Drag for a live preview - release to render at full resolution'}
+                />
+              </div>
+            )}
+
             <ImageComparison
               originalImage={currentImageUrl}
-              processedImage={processedImageUrl}
+              processedImage={(scrubbing && scrubPreviewUrl) || processedImageUrl}
               onDownload={handleDownload}
             />
 
@@ -18,6 +18,7 @@ import {
 } from 'lucide-react';
 import toast from 'react-hot-toast';
 import { useRouter } from 'next/navigation';
+import { getImageHandle } from '@/lib/imageHandles';
 
 interface Message {
   id: string;
@@ -194,9 +195,12 @@ Feel free to upload an image or just start chatting! How can I help you today?`;
     setIsLoading(true);
 
     try {
-      // Convert image to base64 if needed
+      // Upload once, then refer to the image by handle on every turn
+      const imageHandle = uploadedImage ? await getImageHandle(uploadedImage) : null;
+
+      // Convert image to base64 if needed (no handle available)
       let imageUrlForAnalysis = uploadedImage;
-      if (uploadedImage && !uploadedImage.startsWith('data:')) {
+      if (uploadedImage && !imageHandle && !uploadedImage.startsWith('data:')) {
         console.log('Converting image to base64 for Gemini analysis...');
         const base64Image = await convertImageToBase64(uploadedImage);
         if (base64Image) {
@@ -211,7 +215,8 @@ Feel free to upload an image or just start chatting! How can I help you today?`;
         message: inputMessage.trim(),
         context: {
           hasImage: !!uploadedImage,
-          imageUrl: imageUrlForAnalysis,
+          imageHandle: imageHandle || undefined,
+          imageUrl: imageHandle ? undefined : imageUrlForAnalysis,
           imageMode: imageMode,
           processingType: processingType,
           sessionName: sessionName,
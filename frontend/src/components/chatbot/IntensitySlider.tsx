@@ -5,6 +5,7 @@ import { Sliders, Info } from 'lucide-react';
 
 interface IntensitySliderProps {
   onIntensityChange: (intensity: number) => void;
+  onIntensityCommit?: (intensity: number) => void; // Slider released - run the full pipeline
   initialIntensity?: number;
   min?: number;
   max?: number;
@@ -14,6 +15,7 @@ interface IntensitySliderProps {
 
 const IntensitySlider: React.FC<IntensitySliderProps> = ({
   onIntensityChange,
+  onIntensityCommit,
   initialIntensity = 75,
   min = 0,
   max = 100,
@@ -28,6 +30,16 @@ const IntensitySlider: React.FC<IntensitySliderProps> = ({
     onIntensityChange(value);
   };
 
+  const handleCommit = () => {
+    onIntensityCommit?.(intensity);
+  };
+
+  const applyPreset = (value: number) => {
+    setIntensity(value);
+    onIntensityChange(value);
+    onIntensityCommit?.(value);
+  };
+
   const getIntensityColor = (value: number) => {
     if (value <= 30) return 'from-secondary to-secondary-dark';
     if (value <= 60) return 'from-copper to-primary';
@@ -68,6 +80,8 @@ const IntensitySlider: React.FC<IntensitySliderProps> = ({
           max={max}
           value={intensity}
           onChange={handleChange}
+          onPointerUp={handleCommit}
+          onKeyUp={handleCommit}
           className="w-full h-3 bg-dark-lighter rounded-full appearance-none cursor-pointer slider-thumb"
           style={{
             background: `linear-gradient(to right, rgb(255 153 51) 0%, rgb(212 175 55) ${intensity}%, rgb(42 31 26) ${intensity}%, rgb(42 31 26) 100%)`
@@ -102,19 +116,19 @@ const IntensitySlider: React.FC<IntensitySliderProps> = ({
       {/* Quick Presets */}
       <div className="flex gap-2">
         <button
-          onClick={() => { setIntensity(30); onIntensityChange(30); }}
+          onClick={() => applyPreset(30)}
           className="flex-1 px-3 py-1.5 text-xs bg-secondary/20 hover:bg-secondary/30 border border-secondary/30 rounded-lg transition-colors"
         >
           Light
         </button>
         <button
-          onClick={() => { setIntensity(60); onIntensityChange(60); }}
+          onClick={() => applyPreset(60)}
           className="flex-1 px-3 py-1.5 text-xs bg-copper/20 hover:bg-copper/30 border border-copper/30 rounded-lg transition-colors"
         >
           Balanced
         </button>
         <button
-          onClick={() => { setIntensity(85); onIntensityChange(85); }}
+          onClick={() => applyPreset(85)}
           className="flex-1 px-3 py-1.5 text-xs bg-primary/20 hover:bg-primary/30 border border-primary/30 rounded-lg transition-colors"
         >
           Intense
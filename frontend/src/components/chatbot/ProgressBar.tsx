@@ -8,13 +8,15 @@ interface ProgressBarProps {
   status?: string;
   showPercentage?: boolean;
   color?: 'primary' | 'secondary' | 'copper';
+  eta?: number | null; // seconds remaining, from the progress stream
 }
 
 const ProgressBar: React.FC<ProgressBarProps> = ({
   progress,
   status = 'Processing...',
   showPercentage = true,
-  color = 'primary'
+  color = 'primary',
+  eta = null
 }) => {
   const colorClasses = {
     primary: 'bg-primary',
@@ -36,9 +38,14 @@ const ProgressBar: React.FC<ProgressBarProps> = ({
           <Loader className="w-4 h-4 animate-spin text-primary" />
           <span className="text-wheat/80 font-medium">{status}</span>
         </div>
-        {showPercentage && (
-          <span className="text-primary font-bold">{Math.round(progress)}%</span>
-        )}
+        <div className="flex items-center gap-3">
+          {eta !== null && progress < 100 && (
+            <span className="text-wheat/60 text-xs">~{eta < 1 ? '<1' : Math.round(eta)}s left</span>
+          )}
+          {showPercentage && (
+            <span className="text-primary font-bold">{Math.round(progress)}%</span>
+          )}
+        </div>
       </div>
 
       {/* Progress Bar Track */}
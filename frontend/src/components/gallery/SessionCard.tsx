@@ -4,6 +4,7 @@ import React from 'react';
 import { motion } from 'framer-motion';
 import Image from 'next/image';
 import { Play, Sparkles, Zap, RefreshCw, BookOpen, Trash2, Download } from 'lucide-react';
+import { thumbnailUrl } from '@/lib/storage';
 
 interface SessionCardProps {
   session: any;
@@ -49,7 +50,7 @@ const SessionCard: React.FC<SessionCardProps> = ({
         {/* Image */}
         <div className="relative cursor-pointer aspect-square sm:aspect-[4/3]" onClick={() => onSessionClick(session)}>
           <Image
-            src={getSessionImage(session)}
+            src={thumbnailUrl(getSessionImage(session))}
             alt={getSessionName(session)}
             fill
             className="object-cover"
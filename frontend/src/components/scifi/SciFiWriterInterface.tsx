@@ -25,6 +25,7 @@ import {
 } from 'lucide-react';
 import toast from 'react-hot-toast';
 import { useRouter } from 'next/navigation';
+import { getImageHandle } from '@/lib/imageHandles';
 
 interface SciFiWriterInterfaceProps {
   sessionId?: string;
@@ -196,13 +197,15 @@ const SciFiWriterInterface: React.FC<SciFiWriterInterfaceProps> = ({ sessionId }
 
       // Generate story idea using AI with genre and customization
       const genresText = selectedGenres.map(g => genres.find(genre => genre.value === g)?.label).join(', ');
+      const imageHandle = imageUrl ? await getImageHandle(imageUrl) : null;
       const response = await fetch('http://localhost:5000/api/scifi-story-generate', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
         body: JSON.stringify({
-          imageUrl: imageUrl,
+          imageHandle: imageHandle || undefined,
+          imageUrl: imageHandle ? undefined : imageUrl,
           sessionId: currentSessionId,
           genres: selectedGenres,
           customization: customization.trim() || undefined,
@@ -257,7 +260,8 @@ const SciFiWriterInterface: React.FC<SciFiWriterInterfaceProps> = ({ sessionId }
         await addMessageToSciFiSession(session.id, userMessage);
       }
 
-      // Get AI response
+      // Get AI response - the image goes by handle once uploaded
+      const imageHandle = uploadedImage ? await getImageHandle(uploadedImage) : null;
       const response = await fetch('http://localhost:5000/api/scifi-chat', {
         method: 'POST',
         headers: {
@@ -268,7 +272,8 @@ const SciFiWriterInterface: React.FC<SciFiWriterInterfaceProps> = ({ sessionId }
           sessionId: session?.id,
           context: {
             hasImage: !!uploadedImage,
-            imageUrl: uploadedImage,
+            imageHandle: imageHandle || undefined,
+            imageUrl: imageHandle ? undefined : uploadedImage,
             previousMessages: messages.slice(-5) // Last 5 messages for context
           }
         }),
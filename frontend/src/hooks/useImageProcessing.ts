@@ -16,7 +16,8 @@ export const useImageProcessing = () => {
   const processImage = async (
     file: File,
     processType: 'super-resolution' | 'restoration',
-    intensity: number = 0.75
+    intensity: number = 0.75,
+    progressId?: string // channel opened with useStageProgress().track()
   ): Promise<ProcessingResult | null> => {
     setLoading(true);
     setError(null);
@@ -26,6 +27,10 @@ export const useImageProcessing = () => {
       formData.append('image', file);
       formData.append('process_type', processType);
       formData.append('intensity', (intensity / 100).toString()); // Convert 0-100 to 0.0-1.0
+      formData.append('response', 'url'); // short /blobs/<id> URL instead of a base64 data URL
+      if (progressId) {
+        formData.append('progress_id', progressId);
+      }
 
       console.log(`[API] Processing ${processType} with intensity ${intensity}%...`);
       console.log(`[API] Sending request to ${API_URL}/api/process-image`);
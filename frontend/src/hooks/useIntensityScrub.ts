@@ -0,0 +1,113 @@
+import { useRef, useState } from 'react';
+import axios from 'axios';
+
+const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:5000';
+
+export interface ScrubSession {
+  sessionId: string;
+  anchors: number[];
+  previewSize: string;
+  originalSize: string;
+}
+
+/**
+ * Live intensity previews while the slider is dragged.
+ *
+ * startScrub() prepares the image once on the backend; renderScrub() is then
+ * cheap enough to call on every slider change. Only one render is in flight
+ * at a time - moves made meanwhile collapse into the latest value.
+ * Run the full /api/process-image when the slider is released.
+ */
+export const useIntensityScrub = () => {
+  const [session, setSession] = useState<ScrubSession | null>(null);
+  const [previewUrl, setPreviewUrl] = useState<string | null>(null);
+  const [error, setError] = useState<string | null>(null);
+
+  const inFlight = useRef(false);
+  const pending = useRef<number | null>(null);
+
+  const startScrub = async (
+    file: File,
+    processType: 'super-resolution' | 'restoration',
+    intensity: number = 75
+  ): Promise<ScrubSession | null> => {
+    setError(null);
+
+    try {
+      const formData = new FormData();
+      formData.append('image', file);
+      formData.append('process_type', processType);
+      formData.append('intensity', (intensity / 100).toString()); // Convert 0-100 to 0.0-1.0
+
+      const response = await axios.post(`${API_URL}/api/scrub/start`, formData, {
+        headers: {
+          'Content-Type': 'multipart/form-data',
+        },
+        timeout: 60000,
+      });
+
+      const started: ScrubSession = {
+        sessionId: response.data.session_id,
+        anchors: response.data.anchors,
+        previewSize: response.data.preview_size,
+        originalSize: response.data.original_size,
+      };
+      console.log(`[SCRUB] Session ${response.data.session} in ${response.data.setup_time}`);
+
+      setSession(started);
+      setPreviewUrl(response.data.processedImageUrl);
+      return started;
+    } catch (err: any) {
+      setError(err.response?.data?.error || 'Failed to start intensity preview');
+      return null;
+    }
+  };
+
+  const renderScrub = async (intensity: number): Promise<void> => {
+    if (!session) return;
+
+    if (inFlight.current) {
+      pending.current = intensity;
+      return;
+    }
+
+    inFlight.current = true;
+    try {
+      const response = await axios.post(`${API_URL}/api/scrub/render`, {
+        session_id: session.sessionId,
+        intensity: intensity / 100,
+      });
+      setPreviewUrl(response.data.processedImageUrl);
+    } catch (err: any) {
+      if (err.response?.status === 404) {
+        setSession(null); // Session expired - caller restarts with startScrub()
+      }
+      setError(err.response?.data?.error || 'Failed to render preview');
+    } finally {
+      inFlight.current = false;
+    }
+
+    if (pending.current !== null) {
+      const next = pending.current;
+      pending.current = null;
+      await renderScrub(next);
+    }
+  };
+
+  // New image - drop the old session so it can't render stale previews
+  const resetScrub = () => {
+    pending.current = null;
+    setSession(null);
+    setPreviewUrl(null);
+    setError(null);
+  };
+
+  return {
+    startScrub,
+    renderScrub,
+    resetScrub,
+    session,
+    previewUrl,
+    error,
+  };
+};
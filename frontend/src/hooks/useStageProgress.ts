@@ -0,0 +1,65 @@
+import { useRef, useState } from 'react';
+
+const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:5000';
+
+export interface StageProgress {
+  percent: number; // 0-100
+  status: string;
+  eta: number | null; // seconds remaining
+  previewUrl: string | null;
+}
+
+const IDLE: StageProgress = { percent: 0, status: '', eta: null, previewUrl: null };
+
+/**
+ * Real pipeline progress over Server-Sent Events.
+ *
+ * track() opens /api/progress/<id> and returns the id to send as the
+ * progress_id form field of /api/process-image (or pass a job id to follow
+ * a job). Each stage event updates percent, status, ETA and preview; the
+ * stream closes itself on 'finished' / 'failed' / 'end'.
+ */
+export const useStageProgress = () => {
+  const [progress, setProgress] = useState<StageProgress>(IDLE);
+  const source = useRef<EventSource | null>(null);
+
+  const stop = () => {
+    source.current?.close();
+    source.current = null;
+  };
+
+  const track = (channelId?: string): string => {
+    stop();
+    const id = channelId || `${Date.now().toString(36)}${Math.random().toString(36).slice(2, 10)}`;
+    setProgress({ ...IDLE, status: 'Initializing...' });
+
+    const events = new EventSource(`${API_URL}/api/progress/${id}`);
+    events.addEventListener('progress', (message) => {
+      const event = JSON.parse((message as MessageEvent).data);
+      const label = event.through !== event.stage
+        ? `Stages ${event.stage}-${event.through}/${event.total}`
+        : `Stage ${event.stage}/${event.total}`;
+
+      setProgress((previous) => ({
+        percent: Math.round(event.progress * 100),
+        status: event.status === 'finished' ? 'Complete!' : `${label}: ${event.name}${event.detail ? ` (${event.detail})` : ''}`,
+        eta: event.eta,
+        previewUrl: event.preview || previous.previewUrl,
+      }));
+
+      if (event.status === 'finished' || event.status === 'failed') {
+        stop();
+      }
+    });
+    events.addEventListener('end', stop);
+    source.current = events;
+    return id;
+  };
+
+  const reset = () => {
+    stop();
+    setProgress(IDLE);
+  };
+
+  return { progress, track, stop, reset };
+};
@@ -0,0 +1,38 @@
+const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:5000';
+
+const handles = new Map<string, Promise<string | null>>();
+
+/**
+ * Upload an image to /api/images once and reuse its handle.
+ *
+ * The backend stores the decoded image (plus a small resolution pyramid)
+ * under a content-addressed handle, so chat turns and processing requests
+ * can send `imageHandle` instead of the pixels. Resolves to null when the
+ * upload fails - callers then fall back to sending the image itself.
+ */
+export const getImageHandle = (imageUrl: string): Promise<string | null> => {
+  let handle = handles.get(imageUrl);
+  if (!handle) {
+    handle = (async () => {
+      try {
+        const blob = await (await fetch(imageUrl)).blob();
+        const response = await fetch(`${API_URL}/api/images`, {
+          method: 'POST',
+          headers: { 'Content-Type': blob.type || 'application/octet-stream' },
+          body: blob,
+        });
+        if (!response.ok) {
+          throw new Error(`Ingest failed with status ${response.status}`);
+        }
+        const data = await response.json();
+        return data.handle as string;
+      } catch (error) {
+        console.error('Error uploading image for a handle:', error);
+        handles.delete(imageUrl); // retry on the next call
+        return null;
+      }
+    })();
+    handles.set(imageUrl, handle);
+  }
+  return handle;
+};
@@ -1,21 +1,53 @@
 import { ref, uploadBytes, getDownloadURL, deleteObject } from 'firebase/storage';
 import { storage } from './firebase';
 
-export const uploadImage = async (
-  file: File,
-  userId: string,
-  folder: string = 'artifacts'
-): Promise<string> => {
-  // Always use local data URL storage - no Firebase Storage needed
-  return new Promise((resolve) => {
+const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:5000';
+
+const readAsDataURL = (file: File): Promise<string> =>
+  new Promise((resolve) => {
     const reader = new FileReader();
     reader.onloadend = () => {
       resolve(reader.result as string);
     };
     reader.readAsDataURL(file);
   });
+
+export const uploadImage = async (
+  file: File,
+  userId: string,
+  folder: string = 'artifacts'
+): Promise<string> => {
+  // Store the file in the backend blob store and keep its short URL -
+  // no Firebase Storage needed, and gallery entries stay small.
+  // Falls back to a data URL when the backend is unreachable.
+  try {
+    const response = await fetch(`${API_URL}/api/blobs`, {
+      method: 'POST',
+      headers: { 'Content-Type': file.type || 'application/octet-stream' },
+      body: file,
+    });
+    if (!response.ok) {
+      throw new Error(`Blob upload failed with status ${response.status}`);
+    }
+    const data = await response.json();
+    return data.url as string;
+  } catch (error) {
+    console.error('Error uploading image, keeping it inline:', error);
+    return readAsDataURL(file);
+  }
 };
 
+/**
+ * Small cached rendition of a stored image for cards and strips. Blob
+ * URLs are content-addressed, so the browser keeps the thumbnail for good.
+ */
+export const thumbnailUrl = (imageUrl: string, edge: number = 320): string =>
+  imageUrl && imageUrl.includes('/blobs/') ? `${imageUrl}/thumbnail?edge=${edge}` : imageUrl;
+
+/** URL that downloads a stored image instead of opening it */
+export const downloadUrl = (imageUrl: string): string =>
+  imageUrl.startsWith('data:') ? imageUrl : `${imageUrl}?download=1`;
+
 export const deleteImage = async (imagePath: string): Promise<void> => {
   const imageRef = ref(storage, imagePath);
   await deleteObject(imageRef);